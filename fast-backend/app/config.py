@@ -2,9 +2,15 @@
 Configuration settings for Rxplain Medical AI Assistant
 """
 
-import os
-from typing import List
-from pydantic import BaseSettings
+from pathlib import Path
+from typing import Dict, List
+try:
+    from pydantic_settings import BaseSettings
+except ImportError:  # pydantic v1
+    from pydantic import BaseSettings
+
+# fast-backend/, whose .env is read wherever the server is started from
+BACKEND_DIR = Path(__file__).resolve().parent.parent
 
 class Settings(BaseSettings):
     """Application settings"""
@@ -29,6 +35,30 @@ class Settings(BaseSettings):
     # Logging
     LOG_LEVEL: str = "INFO"
     
+    # Startup (see the lifespan hook in app/main.py)
+    STARTUP_WARMUP_ENABLED: bool = False  # Send each provider a minimal request and start image workers
+    STARTUP_WARMUP_TIMEOUT_SECONDS: float = 10.0
+    
+    # Metrics
+    METRICS_ENABLED: bool = True  # Request metrics and the Prometheus /metrics endpoint
+    
+    # Tracing and Profiling
+    TRACING_ENABLED: bool = True  # Server-Timing headers and a JSON log line per request
+    PROFILING_ENABLED: bool = False  # Profile a random sample of requests with cProfile
+    PROFILING_SAMPLE_RATE: float = 0.01
+    PROFILING_ADMIN_TOKEN: str = ""  # X-Profile header value that forces profiling and allows downloads
+    PROFILING_MAX_REPORTS: int = 20  # Most recent profile reports kept in memory
+    
+    # Client Rate Limiting (applied before request bodies are read)
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_PER_MINUTE: float = 30  # Sustained requests per client (0 disables)
+    RATE_LIMIT_BURST: int = 10  # Requests a client may make at once
+    RATE_LIMIT_PATHS: List[str] = ["/api/chat"]  # Path prefixes that are limited
+    RATE_LIMIT_MAX_CLIENTS: int = 50000  # Tracked clients before the least recent are evicted
+    RATE_LIMIT_TRUST_FORWARDED: bool = False  # Key clients by X-Forwarded-For (behind a proxy)
+    RATE_LIMIT_API_KEYS: List[str] = []  # Known client keys, limited per key rather than per address
+    MAX_CONCURRENT_REQUESTS: int = 64  # In-flight limited requests per worker (0 disables)
+    
     # Medical Assistant Settings
     MAX_RESPONSE_LENGTH: int = 2000
     SAFETY_WARNINGS_ENABLED: bool = True
@@ -40,8 +70,91 @@ class Settings(BaseSettings):
     GPT_MAX_TOKENS: int = 1000
     GPT_TEMPERATURE: float = 0.7
     
+    # LLM Routing (providers with an API key are routed by moving latency)
+    LLM_PROVIDERS: List[str] = ["gemini", "gpt"]
+    LLM_HEDGE_ENABLED: bool = False  # Race the next provider when the first is slow
+    LLM_HEDGE_MIN_SAMPLES: int = 20  # Latency samples needed to use the p95 as hedge delay
+    LLM_HEDGE_DEFAULT_DELAY_SECONDS: float = 10.0
+    LLM_FAILURE_PENALTY_SECONDS: float = 30.0  # Latency a failed call counts as
+    
+    # Upstream Concurrency
+    GEMINI_MAX_CONCURRENCY: int = 8  # Max in-flight Gemini calls per worker
+    GPT_MAX_CONCURRENCY: int = 8  # Max in-flight OpenAI calls per worker
+    
+    # Upstream Quotas (per worker; 0 disables the limit)
+    GEMINI_RPM_LIMIT: int = 0
+    GEMINI_TPM_LIMIT: int = 0
+    GPT_RPM_LIMIT: int = 0
+    GPT_TPM_LIMIT: int = 0
+    UPSTREAM_QUEUE_MAX: int = 32  # Requests waiting for quota before rejecting with 429
+    UPSTREAM_QUEUE_MAX_WAIT_SECONDS: float = 10.0
+    CIRCUIT_BREAKER_FAILURE_THRESHOLD: int = 5  # Consecutive failures that open the circuit (0 disables)
+    CIRCUIT_BREAKER_RESET_SECONDS: float = 30.0  # Open time before a half-open probe
+    SINGLE_FLIGHT_ENABLED: bool = True  # Share one call among identical concurrent requests
+    
+    # Priority Scheduling of upstream calls by query class (see classify_medical_query)
+    PRIORITY_SCHEDULER_ENABLED: bool = True
+    PRIORITY_MAX_CONCURRENCY: int = 8  # Concurrent upstream calls before requests queue
+    PRIORITY_WEIGHTS: Dict[str, float] = {
+        "emergency": 100,
+        "medication": 50,
+        "symptom": 20,
+        "condition": 20,
+        "general_health": 10,
+        "summary": 1
+    }
+    PRIORITY_QUEUE_MAX: int = 64  # Queued requests before the lowest priority ones are shed
+    PRIORITY_QUEUE_MAX_WAIT_SECONDS: float = 15.0
+    
+    # Fake LLM for offline load testing (LLM_PROVIDERS=["fake"])
+    FAKE_LLM_LATENCY_MEDIAN_MS: float = 800.0
+    FAKE_LLM_LATENCY_P99_MS: float = 3000.0  # Log-normal tail; equal to the median for a fixed delay
+    FAKE_LLM_OUTPUT_WORDS: int = 200
+    FAKE_LLM_STREAM_CHUNK_WORDS: int = 8
+    FAKE_LLM_ERROR_RATE: float = 0.0  # Fraction of calls that fail
+    FAKE_LLM_SEED: int = 0
+    
+    # Traffic Recording of sanitized /api/chat request shapes for replay
+    TRAFFIC_RECORDING_ENABLED: bool = False
+    TRAFFIC_RECORDING_PATH: str = "traffic/trace-{pid}.jsonl.gz"  # {pid}: one trace per worker
+    TRAFFIC_RECORDING_SAMPLE_RATE: float = 1.0  # Fraction of conversations recorded
+    
+    # Gemini Context Caching of the static system prompt (model/size permitting)
+    GEMINI_CONTEXT_CACHE_ENABLED: bool = False
+    GEMINI_CONTEXT_CACHE_TTL_SECONDS: int = 3600
+    
+    # Response Cache (context-free queries only)
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_MAX_ENTRIES: int = 1024
+    RESPONSE_CACHE_TTL_SECONDS: int = 3600
+    
+    # Conversation Storage
+    CONVERSATION_STORE: str = "memory"  # "memory" or "sqlite"
+    CONVERSATION_DB_PATH: str = "rxplain_conversations.db"
+    CONVERSATION_MAX_COUNT: int = 100
+    CONVERSATION_MEMORY_BUDGET_MB: int = 256  # In-memory store only
+    
+    # Conversation Context
+    CONTEXT_TOKEN_BUDGET: int = 1500  # Estimated tokens of history per prompt
+    CONTEXT_SUMMARY_ENABLED: bool = True
+    CONTEXT_SUMMARY_MIN_MESSAGES: int = 4  # Older turns needed before (re)summarizing
+    CHAT_HISTORY_MODE: str = "prompt"  # "prompt" (flattened text) or "turns" (native multi-turn)
+    
+    # Batch Chat
+    BATCH_MAX_PROMPTS: int = 20
+    BATCH_MAX_CONCURRENCY: int = 5  # Per batch; GEMINI_MAX_CONCURRENCY still applies
+    
+    # Image Uploads
+    IMAGE_MAX_UPLOAD_MB: int = 5
+    IMAGE_PREPROCESS_ENABLED: bool = True
+    IMAGE_MAX_DIMENSION: int = 1536  # Longest side after downscaling
+    IMAGE_FORMAT: str = "JPEG"  # JPEG or WEBP
+    IMAGE_QUALITY: int = 85
+    IMAGE_PROCESS_WORKERS: int = 2  # 0 runs preprocessing in a thread instead
+    
     class Config:
-        env_file = ".env"
+        # The only place .env is read; a .env in the working directory takes precedence
+        env_file = (str(BACKEND_DIR / ".env"), ".env")
         case_sensitive = True
 
 # Global settings instance
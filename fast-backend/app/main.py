@@ -1,17 +1,65 @@
+from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
+from app.config import settings
+from app.middleware import BodyLimitMiddleware, MetricsMiddleware, RateLimitMiddleware, TracingMiddleware
 from app.routes.chat import router as chat_router
+from app.routes.metrics import router as metrics_router
+from app.routes.profiles import router as profiles_router
+from app.services.image_pipeline import shutdown_image_pool, warm_image_pool
+from app.services.llm_provider import get_llm_router
+from app.services.traffic_recorder import get_traffic_recorder
 from fastapi import FastAPI
-from dotenv import load_dotenv
-import os
+import asyncio
+import logging
+import time
 
-load_dotenv()
+logging.basicConfig(level=settings.LOG_LEVEL)
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Construct upstream clients before the worker takes traffic (and
+    optionally warm them up), then stop background workers on shutdown
+    """
+    started = time.perf_counter()
+    startup = [get_llm_router().start(
+        warm_up=settings.STARTUP_WARMUP_ENABLED,
+        timeout=settings.STARTUP_WARMUP_TIMEOUT_SECONDS
+    )]
+    if settings.STARTUP_WARMUP_ENABLED:
+        startup.append(warm_image_pool())
+    await asyncio.gather(*startup)
+    logger.info("Startup completed in %.0f ms", (time.perf_counter() - started) * 1000)
+
+    yield
+
+    shutdown_image_pool()
+    get_traffic_recorder().close()
 
 app = FastAPI(
     title="Rxplain Backend",
     description="Backend API for Rx-plain application",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# Reject oversized uploads while they are received, before they are spooled
+app.add_middleware(BodyLimitMiddleware)
+
+# Reject over-limit clients before request bodies are read
+# (added before CORS so that 429 responses still carry CORS headers)
+if settings.RATE_LIMIT_ENABLED:
+    app.add_middleware(RateLimitMiddleware)
+
+# Request counters and durations, including rate-limited requests
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+# Per-request stage timings (Server-Timing header and log line) and profiling
+if settings.TRACING_ENABLED:
+    app.add_middleware(TracingMiddleware)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -24,6 +72,13 @@ app.add_middleware(
 # Include chat router
 app.include_router(chat_router, prefix="/api", tags=["chat"])
 
+# Prometheus scrape endpoint
+if settings.METRICS_ENABLED:
+    app.include_router(metrics_router, tags=["metrics"])
+
+# Profile report downloads
+app.include_router(profiles_router, prefix="/api", tags=["profiling"])
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to Rxplain API. Use /api/chat for chat endpoints."}
\ No newline at end of file
@@ -0,0 +1,22 @@
+"""
+Middleware for Rxplain Medical AI Assistant
+"""
+
+from .body_limit import BodyLimitMiddleware
+from .metrics import MetricsMiddleware, mark_request_error, set_query_class
+from .rate_limit import ClientRateLimiter, RateLimitMiddleware, charge_request, client_key, get_rate_limiter
+from .tracing import TracingMiddleware, is_profiling_admin
+
+__all__ = [
+    'BodyLimitMiddleware',
+    'MetricsMiddleware',
+    'mark_request_error',
+    'set_query_class',
+    'ClientRateLimiter',
+    'RateLimitMiddleware',
+    'charge_request',
+    'client_key',
+    'get_rate_limiter',
+    'TracingMiddleware',
+    'is_profiling_admin'
+]
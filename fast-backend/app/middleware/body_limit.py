@@ -0,0 +1,76 @@
+"""
+Body Limit Middleware for Rxplain Medical AI Assistant
+Rejects oversized uploads with 413 before the multipart parser spools them
+"""
+
+from typing import List, Optional
+
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+
+# Allowance for the prompt, other form fields and multipart headers
+FORM_OVERHEAD_BYTES = 256 * 1024
+
+def max_body_bytes() -> int:
+    """Largest accepted request body: the image size limit plus the form fields"""
+    return settings.IMAGE_MAX_UPLOAD_MB * 1024 * 1024 + FORM_OVERHEAD_BYTES
+
+def _body_too_large() -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"Image size must be less than {settings.IMAGE_MAX_UPLOAD_MB}MB"
+    )
+
+class BodyLimitMiddleware:
+    """
+    ASGI middleware bounding request bodies under `paths`.
+
+    A declared Content-Length over the limit is rejected before any of the
+    body is read. Otherwise the bytes are counted as they are received, and
+    the request fails with 413 as soon as it passes the limit, while the
+    form is still being parsed. read_upload still checks the image itself.
+    """
+
+    def __init__(self, app: ASGIApp, max_bytes: Optional[int] = None, paths: Optional[List[str]] = None):
+        self.app = app
+        self.max_bytes = max_body_bytes() if max_bytes is None else max_bytes
+        self.paths = tuple(["/api/chat"] if paths is None else paths)
+
+    def _is_limited(self, path: str) -> bool:
+        return any(path == prefix or path.startswith(prefix + "/") for prefix in self.paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not self._is_limited(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        for key, value in scope.get("headers", ()):
+            if key == b"content-length":
+                try:
+                    declared = int(value)
+                except ValueError:
+                    break
+                if declared > self.max_bytes:
+                    error = _body_too_large()
+                    response = JSONResponse({"detail": error.detail}, status_code=error.status_code)
+                    await response(scope, receive, send)
+                    return
+                break
+
+        received = 0
+
+        async def counting_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Raised inside form parsing; FastAPI re-raises HTTPExceptions
+                    # from the body reader instead of reporting a parse error
+                    raise _body_too_large()
+            return message
+
+        await self.app(scope, counting_receive, send)
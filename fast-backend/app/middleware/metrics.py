@@ -0,0 +1,73 @@
+"""
+Metrics Middleware for Rxplain Medical AI Assistant
+Counts requests, errors and durations by route and query class
+"""
+
+import time
+
+from starlette.requests import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.services.metrics import IN_FLIGHT, REQUEST_DURATION, REQUEST_ERRORS, REQUESTS
+
+def set_query_class(request: Request, query_class: str):
+    """Label the request's metrics with its medical query class"""
+    request.state.query_class = query_class
+
+def mark_request_error(request: Request):
+    """Count a request answered with a fallback (or error event) as an error"""
+    request.state.request_error = True
+
+def route_label(scope: Scope) -> str:
+    """Path template of the matched route, including any router prefix"""
+    route_path = getattr(scope.get("route"), "path", None)
+    if route_path is None:
+        return "other"
+    # Some FastAPI versions expose included routes without their prefix;
+    # each template segment matches one path segment, so the leading
+    # segments not covered by the template are the prefix
+    segments = scope["path"].split("/")
+    prefix = "/".join(segments[:max(0, len(segments) - route_path.count("/"))])
+    return prefix + route_path
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording request counts, errors, durations and the
+    in-flight gauge. Routes are labelled by their path template; requests
+    that match no route (including those rejected before routing) are
+    labelled "other" to keep label cardinality bounded.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # Shared with request.state so handlers can add labels
+        state = scope.setdefault("state", {})
+        status_code = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            state["request_error"] = True
+            raise
+        finally:
+            IN_FLIGHT.dec()
+            route_path = route_label(scope)
+            query_class = state.get("query_class", "none")
+            REQUESTS.labels(route_path, query_class, str(status_code)).inc()
+            if status_code >= 500 or state.get("request_error"):
+                REQUEST_ERRORS.labels(route_path, query_class).inc()
+            REQUEST_DURATION.labels(route_path).observe(time.perf_counter() - start)
@@ -0,0 +1,236 @@
+"""
+Rate Limit Middleware for Rxplain Medical AI Assistant
+Per-client token buckets and a global concurrency cap, applied before the request body is read
+"""
+
+import hashlib
+import math
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.config import settings
+
+# Buckets dropped per request while sweeping idle clients
+EXPIRY_SWEEP_LIMIT = 16
+
+KeyFunc = Callable[[Scope], Optional[str]]
+
+def _get_header(scope: Scope, name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers", ()):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+def _digest(credential: str) -> str:
+    # Keep a digest rather than the key itself
+    return hashlib.blake2b(credential.encode(), digest_size=12).hexdigest()
+
+# Credentials of known clients (RATE_LIMIT_API_KEYS), as digests
+_known_key_digests = frozenset(_digest(key) for key in settings.RATE_LIMIT_API_KEYS if key)
+
+def client_key(scope: Scope) -> Optional[str]:
+    """
+    Identify the client by API key header if it is one of RATE_LIMIT_API_KEYS,
+    otherwise by IP address. Returning None exempts the request from
+    per-client limits.
+
+    Unrecognized keys are ignored: keying by them would let a client get a
+    fresh bucket with every new header value.
+    """
+    api_key = _get_header(scope, b"x-api-key")
+    if not api_key:
+        authorization = _get_header(scope, b"authorization")
+        if authorization and authorization.lower().startswith("bearer "):
+            api_key = authorization[7:].strip()
+    if api_key:
+        digest = _digest(api_key)
+        if digest in _known_key_digests:
+            return "key:" + digest
+
+    if settings.RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = _get_header(scope, b"x-forwarded-for")
+        if forwarded:
+            return "ip:" + forwarded.split(",")[0].strip()
+
+    client = scope.get("client")
+    return "ip:" + client[0] if client else None
+
+class ClientRateLimiter:
+    """
+    Token bucket per client plus a cap on concurrent requests.
+
+    Buckets are kept in least recently seen order, so idle clients are
+    expired from the front in O(1) per bucket. A bucket idle long enough
+    to have refilled is indistinguishable from a new one, which makes that
+    the expiry time; `max_clients` bounds memory under a flood of new keys.
+    """
+
+    def __init__(self, per_minute: float, burst: int, max_concurrency: int = 0, max_clients: int = 50000):
+        self.rate = per_minute / 60.0
+        self.burst = float(max(1, burst))
+        self.idle_expiry = self.burst / self.rate if self.rate > 0 else 0.0
+        self.max_concurrency = max_concurrency
+        self.max_clients = max_clients
+        # client key -> [tokens, last seen]
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected_rate_limited = 0
+        self.rejected_concurrency = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def _expire(self, now: float):
+        buckets = self._buckets
+        for _ in range(EXPIRY_SWEEP_LIMIT):
+            if not buckets:
+                return
+            key = next(iter(buckets))
+            if now - buckets[key][1] < self.idle_expiry:
+                return
+            del buckets[key]
+            self.expired += 1
+
+    def check(self, client: str) -> float:
+        """Take a token for the client; return 0 if admitted, else seconds until one is available"""
+        if self.rate <= 0:
+            return 0.0
+
+        now = time.monotonic()
+        self._expire(now)
+
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            if len(self._buckets) >= self.max_clients:
+                self._buckets.popitem(last=False)
+                self.evicted += 1
+            bucket = self._buckets[client] = [self.burst, now]
+        else:
+            self._buckets.move_to_end(client)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+
+        if bucket[0] >= 1.0:
+            bucket[0] -= 1.0
+            return 0.0
+        self.rejected_rate_limited += 1
+        return (1.0 - bucket[0]) / self.rate
+
+    def charge(self, client: str, tokens: float):
+        """
+        Take extra tokens for an admitted request that does more than one
+        request's work (e.g. a batch). The bucket may go negative; the client
+        is then rejected until it has refilled.
+        """
+        if self.rate <= 0 or tokens <= 0:
+            return
+        now = time.monotonic()
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = self._buckets[client] = [self.burst, now]
+        else:
+            self._buckets.move_to_end(client)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        bucket[0] -= tokens
+
+    def try_enter(self) -> bool:
+        """Claim a concurrency slot"""
+        if self.max_concurrency > 0 and self.in_flight >= self.max_concurrency:
+            self.rejected_concurrency += 1
+            return False
+        self.in_flight += 1
+        self.admitted += 1
+        return True
+
+    def leave(self):
+        self.in_flight -= 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get admission statistics"""
+        return {
+            "tracked_clients": len(self._buckets),
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "admitted": self.admitted,
+            "rejected_rate_limited": self.rejected_rate_limited,
+            "rejected_concurrency": self.rejected_concurrency,
+            "expired_clients": self.expired,
+            "evicted_clients": self.evicted
+        }
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware rejecting over-limit requests with 429 before any
+    routing, form parsing or upload reading happens. Only paths under
+    `paths` are limited; `key_func` maps a request scope to a client key.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        limiter: Optional[ClientRateLimiter] = None,
+        key_func: KeyFunc = client_key,
+        paths: Optional[List[str]] = None
+    ):
+        self.app = app
+        self.limiter = limiter or get_rate_limiter()
+        self.key_func = key_func
+        self.paths = tuple(settings.RATE_LIMIT_PATHS if paths is None else paths)
+
+    def _is_limited(self, path: str) -> bool:
+        return any(path == prefix or path.startswith(prefix + "/") for prefix in self.paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not self._is_limited(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        key = self.key_func(scope)
+        # For charge_request, via request.state
+        scope.setdefault("state", {})["rate_limit_key"] = key
+        if key is not None:
+            retry_after = self.limiter.check(key)
+            if retry_after > 0:
+                await self._reject("Too many requests, please slow down", retry_after, scope, receive, send)
+                return
+
+        if not self.limiter.try_enter():
+            await self._reject("The server is busy, please retry shortly", 1.0, scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.limiter.leave()
+
+    @staticmethod
+    async def _reject(detail: str, retry_after: float, scope: Scope, receive: Receive, send: Send):
+        response = JSONResponse(
+            {"detail": detail},
+            status_code=429,
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+        await response(scope, receive, send)
+
+# Global rate limiter instance
+rate_limiter = ClientRateLimiter(
+    settings.RATE_LIMIT_PER_MINUTE,
+    settings.RATE_LIMIT_BURST,
+    max_concurrency=settings.MAX_CONCURRENT_REQUESTS,
+    max_clients=settings.RATE_LIMIT_MAX_CLIENTS
+)
+
+def get_rate_limiter() -> ClientRateLimiter:
+    """Get the global rate limiter instance"""
+    return rate_limiter
+
+def charge_request(request: Request, tokens: float):
+    """Charge the request's client extra tokens, if the request was rate limited"""
+    key = getattr(request.state, "rate_limit_key", None)
+    if key is not None:
+        get_rate_limiter().charge(key, tokens)
@@ -0,0 +1,92 @@
+"""
+Tracing Middleware for Rxplain Medical AI Assistant
+Server-Timing headers, structured request logs and sampled profiling
+"""
+
+import cProfile
+import hmac
+import json
+import logging
+import random
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+from app.middleware.metrics import route_label
+from app.services.tracing import ProfileReport, get_profile_store, start_trace
+
+logger = logging.getLogger(__name__)
+
+# Header that forces profiling of a request when it carries PROFILING_ADMIN_TOKEN
+PROFILE_HEADER = "x-profile"
+
+def is_profiling_admin(headers: Headers) -> bool:
+    """Whether the request carries the profiling admin token"""
+    token = settings.PROFILING_ADMIN_TOKEN
+    supplied = headers.get(PROFILE_HEADER)
+    return bool(token and supplied and hmac.compare_digest(supplied, token))
+
+class TracingMiddleware:
+    """
+    Starts a RequestTrace for each request, returns its stage timings in
+    a Server-Timing header and logs one JSON line when the request ends.
+
+    A request is profiled with cProfile when it carries the admin token in
+    the X-Profile header, or at random with PROFILING_SAMPLE_RATE when
+    PROFILING_ENABLED is set. Reports are kept in the profile store.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    def _should_profile(self, scope: Scope) -> bool:
+        if get_profile_store().active:
+            return False
+        if settings.PROFILING_ADMIN_TOKEN and is_profiling_admin(Headers(scope=scope)):
+            return True
+        return settings.PROFILING_ENABLED and random.random() < settings.PROFILING_SAMPLE_RATE
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = start_trace()
+        status_code = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                # Stages after this point (e.g. while streaming) are only logged
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", trace.server_timing().encode("latin-1")))
+                message["headers"] = headers
+            await send(message)
+
+        profile = None
+        store = get_profile_store()
+        if self._should_profile(scope):
+            profile = cProfile.Profile()
+            store.active = True
+            profile.enable()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if profile is not None:
+                profile.disable()
+                store.active = False
+            duration = trace.elapsed()
+            route = route_label(scope)
+            if profile is not None:
+                store.add(ProfileReport(profile, route, duration, trace.annotations))
+            logger.info(json.dumps({
+                "event": "request",
+                "method": scope["method"],
+                "route": route,
+                "status": status_code,
+                "duration_ms": round(duration * 1000, 1),
+                "stages_ms": {stage: round(seconds * 1000, 1) for stage, seconds in trace.stages.items()},
+                **trace.annotations
+            }, default=str))
@@ -3,5 +3,7 @@ API Routes for Rxplain Medical AI Assistant
 """
 
 from .chat import router as chat_router
+from .metrics import router as metrics_router
+from .profiles import router as profiles_router
 
-__all__ = ['chat_router'] 
\ No newline at end of file
+__all__ = ['chat_router', 'metrics_router', 'profiles_router'] 
\ No newline at end of file
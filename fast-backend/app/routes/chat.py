@@ -1,16 +1,53 @@
 from fastapi import APIRouter, HTTPException, status, Request, UploadFile, File, Form
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
-from app.services.gemini import query_gemini, validate_medical_query
+from typing import Optional, List, Dict, Any, AsyncIterator, FrozenSet, Tuple
+from app.config import settings
+from app.services.gemini import (
+    get_query_class,
+    query_gemini,
+    stream_gemini,
+    validate_medical_query,
+    get_query_warnings,
+    MEDICAL_DISCLAIMER
+)
+from app.middleware import charge_request, get_rate_limiter, mark_request_error, set_query_class
+from app.services.llm_provider import get_llm_router, get_usage_stats
+from app.services.metrics import track_stage
+from app.services.tracing import annotate_trace
+from app.services.response_cache import get_response_cache
+from app.services.priority_scheduler import get_priority_scheduler
+from app.services.single_flight import get_single_flight
+from app.utils.medical_prompts import classify_medical_query, extract_medical_features
 from app.services.conversation_memory import (
+    ConversationStore,
     get_conversation_memory, 
-    create_context_prompt, 
-    extract_medical_context
+    get_context_prompt_stats,
+    create_context_prompt,
+    run_store_call
 )
+from app.services.context_summary import schedule_summary_refresh
+from app.services.chat_turns import get_chat_turn_cache
+from app.services.image_pipeline import preprocess_image, read_upload
+from app.services.traffic_recorder import get_traffic_recorder
+import asyncio
+import time
 import uuid
+import json
 
 router = APIRouter()
 
+TECHNICAL_ERROR_RESPONSE = """I apologize, but I'm experiencing technical difficulties. 
+
+For medical questions, please:
+1. **Contact your healthcare provider** for immediate medical advice
+2. **Visit reliable medical websites** like Mayo Clinic, WebMD, or MedlinePlus
+3. **Call emergency services** if you're experiencing a medical emergency
+
+⚠️ **Important**: Never delay seeking professional medical help due to technical issues with AI assistants.
+
+Your health and safety are the top priority."""
+
 class ChatResponse(BaseModel):
     response: str
     error: Optional[str] = None
@@ -18,12 +55,144 @@ class ChatResponse(BaseModel):
     conversation_id: str
     medical_context: Dict[str, Any] = {}
 
+class BatchChatRequest(BaseModel):
+    prompts: List[str]
+    conversation_id: Optional[str] = None
+    max_concurrency: Optional[int] = None
+    stream: bool = False
+
+class BatchChatResult(BaseModel):
+    index: int
+    prompt: str
+    response: Optional[str] = None
+    error: Optional[str] = None
+    is_medical_query: bool = False
+
+class BatchChatResponse(BaseModel):
+    results: List[BatchChatResult]
+    conversation_id: Optional[str] = None
+    medical_context: Dict[str, Any] = {}
+
+async def _read_image(image: Optional[UploadFile]) -> Optional[bytes]:
+    """Validate, read and preprocess an uploaded image"""
+    if not image:
+        return None
+    
+    # Validate image file
+    if not image.content_type.startswith('image/'):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="File must be an image"
+        )
+    
+    # Read image data, aborting as soon as it exceeds the size limit
+    try:
+        with track_stage("upload_read"):
+            image_data = await read_upload(image)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Error reading image: {str(e)}"
+        )
+    
+    # Downscale and re-encode without metadata, off the event loop
+    with track_stage("image_preprocess"):
+        return await preprocess_image(image_data)
+
+def _build_context(
+    memory: ConversationStore,
+    conversation_id: str,
+    prompt: str,
+    pending_query: bool = True
+) -> Tuple[str, Optional[List[Dict[str, Any]]], bool]:
+    """
+    Build the Gemini query for the current user message, which is already
+    stored unless pending_query is False
+    
+    Returns the query text, structured history turns (native multi-turn mode
+    only) and whether the response cache may be used.
+    """
+    context_summary = memory.get_context_summary(conversation_id)
+    
+    if settings.CHAT_HISTORY_MODE == "turns":
+        history = get_chat_turn_cache().get_history(
+            conversation_id, memory, summary=context_summary.text, pending_query=pending_query
+        )
+        return prompt, history, not history
+    
+    conversation_history = memory.get_conversation_history(conversation_id, max_messages=6)
+    if len(conversation_history) <= (1 if pending_query else 0) and not context_summary.text:
+        # Standalone query: the only context would be the query itself (and
+        # an upload note), so send it as is and let it share cached answers
+        return prompt, None, True
+    context_prompt = create_context_prompt(conversation_history, prompt, summary=context_summary.text)
+    return context_prompt, None, False
+
+def _store_user_message(
+    memory: ConversationStore,
+    conversation_id: str,
+    content: str,
+    is_medical_query: bool
+) -> Dict[str, Any]:
+    """Store the user's message; returns the conversation summary from before it"""
+    conversation = memory.get_conversation_summary(conversation_id)
+    memory.add_message(
+        conversation_id=conversation_id,
+        role="user",
+        content=content,
+        model=conversation.get("model", "gemini"),
+        is_medical_query=is_medical_query
+    )
+    return conversation
+
+def _update_medical_context(memory: ConversationStore, conversation_id: str) -> Dict[str, Any]:
+    """Save the medical context of the conversation's tracked messages, and return it"""
+    medical_context = memory.get_medical_context(conversation_id)
+    memory.update_medical_context(conversation_id, medical_context)
+    return medical_context
+
+def _record_traffic(
+    endpoint: str,
+    arrival: float,
+    prompt: str,
+    image: Optional[UploadFile],
+    conversation_id: str,
+    conversation: Dict[str, Any],
+    features: Optional[FrozenSet[str]] = None
+):
+    """Record the request's shape for replay when traffic recording is enabled"""
+    if not settings.TRAFFIC_RECORDING_ENABLED:
+        return
+    get_traffic_recorder().record(
+        endpoint,
+        arrival,
+        prompt_chars=len(prompt),
+        query_class=classify_medical_query(prompt, features),
+        image_bytes=(image.size or 0) if image else 0,
+        conversation_id=conversation_id,
+        position=conversation.get("message_count", 0)
+    )
+
+def _sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format a server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 @router.post("/chat", response_model=ChatResponse)
 async def chat_with_ai(
+    request: Request,
     prompt: str = Form(...),
     conversation_id: Optional[str] = Form(None),
     image: Optional[UploadFile] = File(None)
 ):
+    arrival = time.time()
+    # Scan the prompt once; reused by every medical classifier in this request
+    query_features = extract_medical_features(prompt)
+    query_class = get_query_class(prompt, image is not None, query_features)
+    set_query_class(request, query_class)
+    annotate_trace(query_class=query_class)
+    
     try:
         # Validate input
         if not prompt.strip():
@@ -33,42 +202,23 @@ async def chat_with_ai(
             )
 
         # Handle image upload
-        image_data = None
-        if image:
-            # Validate image file
-            if not image.content_type.startswith('image/'):
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="File must be an image"
-                )
-            
-            # Read image data
-            try:
-                image_data = await image.read()
-                # Limit image size (5MB)
-                if len(image_data) > 5 * 1024 * 1024:
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail="Image size must be less than 5MB"
-                    )
-            except Exception as e:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"Error reading image: {str(e)}"
-                )
-
+        image_data = await _read_image(image)
 
         # Get conversation memory
         memory = get_conversation_memory()
 
         # Handle conversation ID and history
         if not conversation_id:
-            conversation_id = memory.create_conversation(
-                title=prompt[:50] + "..." if len(prompt) > 50 else prompt
-            )
+            with track_stage("memory"):
+                conversation_id = await run_store_call(
+                    memory.create_conversation,
+                    title=prompt[:50] + "..." if len(prompt) > 50 else prompt
+                )
+
+        annotate_trace(conversation_id=conversation_id)
 
         # Check if this is a medical query
-        is_medical_query = validate_medical_query(prompt)
+        is_medical_query = validate_medical_query(prompt, query_features)
 
         # Add user message to conversation
         user_message = prompt
@@ -76,36 +226,44 @@ async def chat_with_ai(
             user_message += f" [Image uploaded: {image.filename}]"
 
         # Get model for conversation (default to 'gemini')
-        conversation = memory.get_conversation(conversation_id)
-        model = conversation.model if conversation else "gemini"
-
-        memory.add_message(
-            conversation_id=conversation_id,
-            role="user",
-            content=user_message,
-            model=model,
-            is_medical_query=is_medical_query
-        )
+        with track_stage("memory"):
+            conversation = await run_store_call(
+                _store_user_message, memory, conversation_id, user_message, is_medical_query
+            )
+            model = conversation.get("model", "gemini")
+        _record_traffic("chat", arrival, prompt, image, conversation_id, conversation, query_features)
 
         # Create context-aware prompt
-        conversation_history = memory.get_conversation_history(conversation_id, max_messages=6)
-        context_prompt = create_context_prompt(conversation_history, prompt)
-
-        # Generate response using Gemini
-        response = await query_gemini(context_prompt, image_data)
+        with track_stage("prompt_build"):
+            context_prompt, history, use_cache = await run_store_call(
+                _build_context, memory, conversation_id, prompt
+            )
 
-        memory.add_message(
-            conversation_id=conversation_id,
-            role="assistant",
-            content=response,
-            model=model,
-            is_medical_query=is_medical_query
+        # Generate response using Gemini; only standalone queries may be served from cache
+        response = await query_gemini(
+            context_prompt,
+            image_data,
+            use_cache=use_cache,
+            history=history,
+            query_class=query_class
         )
 
-        # Extract and update medical context
-        all_messages = memory.get_conversation_history(conversation_id, max_messages=50)
-        medical_context = extract_medical_context(all_messages)
-        memory.update_medical_context(conversation_id, medical_context)
+        with track_stage("memory"):
+            await run_store_call(
+                memory.add_message,
+                conversation_id=conversation_id,
+                role="assistant",
+                content=response,
+                model=model,
+                is_medical_query=is_medical_query
+            )
+
+        # Update medical context from the incrementally tracked messages
+        with track_stage("context_extraction"):
+            medical_context = await run_store_call(_update_medical_context, memory, conversation_id)
+        
+        # Fold turns that left the context window into the rolling summary
+        schedule_summary_refresh(conversation_id)
 
         return ChatResponse(
             response=response,
@@ -117,24 +275,16 @@ async def chat_with_ai(
     except HTTPException as he:
         raise he
     except Exception as e:
+        mark_request_error(request)
         # Provide helpful error message for medical queries
-        if validate_medical_query(prompt):
-                            return ChatResponse(
-                    response="""I apologize, but I'm experiencing technical difficulties. 
-
-For medical questions, please:
-1. **Contact your healthcare provider** for immediate medical advice
-2. **Visit reliable medical websites** like Mayo Clinic, WebMD, or MedlinePlus
-3. **Call emergency services** if you're experiencing a medical emergency
-
-⚠️ **Important**: Never delay seeking professional medical help due to technical issues with AI assistants.
-
-Your health and safety are the top priority.""",
-                    error="Technical error occurred",
-                    is_medical_query=True,
-                    conversation_id=conversation_id or "error",
-                    medical_context={}
-                )
+        if validate_medical_query(prompt, query_features):
+            return ChatResponse(
+                response=TECHNICAL_ERROR_RESPONSE,
+                error="Technical error occurred",
+                is_medical_query=True,
+                conversation_id=conversation_id or "error",
+                medical_context={}
+            )
         
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -142,6 +292,262 @@ Your health and safety are the top priority.""",
         )
 
 
+@router.post("/chat/stream")
+async def chat_with_ai_stream(
+    request: Request,
+    prompt: str = Form(...),
+    conversation_id: Optional[str] = Form(None),
+    image: Optional[UploadFile] = File(None)
+):
+    """
+    Streaming variant of /chat using server-sent events.
+    
+    Emits a `start` event, query-dependent `warning` events, `token` events as
+    Gemini generates text, and a final `done` event once the full message has
+    been stored in conversation memory.
+    """
+    arrival = time.time()
+    # Validate input
+    if not prompt.strip():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Prompt cannot be empty"
+        )
+    
+    query_class = get_query_class(prompt, image is not None)
+    set_query_class(request, query_class)
+    annotate_trace(query_class=query_class)
+    
+    image_data = await _read_image(image)
+    has_image = image_data is not None
+    
+    memory = get_conversation_memory()
+    if not conversation_id:
+        conversation_id = await run_store_call(
+            memory.create_conversation,
+            title=prompt[:50] + "..." if len(prompt) > 50 else prompt
+        )
+    
+    annotate_trace(conversation_id=conversation_id)
+    
+    is_medical_query = validate_medical_query(prompt)
+    
+    user_message = prompt
+    if image:
+        user_message += f" [Image uploaded: {image.filename}]"
+    
+    conversation = await run_store_call(
+        _store_user_message, memory, conversation_id, user_message, is_medical_query
+    )
+    model = conversation.get("model", "gemini")
+    _record_traffic("stream", arrival, prompt, image, conversation_id, conversation)
+    
+    context_prompt, history, use_cache = await run_store_call(_build_context, memory, conversation_id, prompt)
+    
+    async def event_stream() -> AsyncIterator[str]:
+        yield _sse_event("start", {
+            "conversation_id": conversation_id,
+            "is_medical_query": is_medical_query
+        })
+        
+        # Query-dependent warnings are known before generation starts
+        context_features = extract_medical_features(context_prompt)
+        warnings = get_query_warnings(context_prompt, has_image, context_features)
+        for warning in warnings:
+            yield _sse_event("warning", {"text": warning})
+        
+        chunks: List[str] = []
+        try:
+            async for text in stream_gemini(
+                context_prompt,
+                image_data,
+                use_cache=use_cache,
+                features=context_features,
+                history=history,
+                query_class=query_class
+            ):
+                chunks.append(text)
+                yield _sse_event("token", {"text": text})
+        except HTTPException as he:
+            error = {"error": f"An error occurred: {he.detail}", "response": TECHNICAL_ERROR_RESPONSE}
+            if he.headers and "Retry-After" in he.headers:
+                error["retry_after"] = int(he.headers["Retry-After"])
+            mark_request_error(request)
+            yield _sse_event("error", error)
+            return
+        except Exception as e:
+            mark_request_error(request)
+            yield _sse_event("error", {
+                "error": f"An error occurred: {str(e)}",
+                "response": TECHNICAL_ERROR_RESPONSE
+            })
+            return
+        
+        response = "".join(chunks)
+        if "⚠️ **Important**:" not in response:
+            yield _sse_event("disclaimer", {"text": MEDICAL_DISCLAIMER})
+            response += "\n\n" + MEDICAL_DISCLAIMER
+        if warnings:
+            response = "\n\n".join(warnings) + "\n\n" + response
+        
+        await run_store_call(
+            memory.add_message,
+            conversation_id=conversation_id,
+            role="assistant",
+            content=response,
+            model=model,
+            is_medical_query=is_medical_query
+        )
+        medical_context = await run_store_call(_update_medical_context, memory, conversation_id)
+        
+        # Fold turns that left the context window into the rolling summary
+        schedule_summary_refresh(conversation_id)
+        
+        yield _sse_event("done", {
+            "conversation_id": conversation_id,
+            "response": response,
+            "medical_context": medical_context
+        })
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.post("/chat/batch", response_model=BatchChatResponse)
+async def chat_batch(request: BatchChatRequest, http_request: Request):
+    """
+    Answer several prompts concurrently, e.g. one per medication on a list.
+    
+    Prompts share the conversation's context (if bound to one) but not each
+    other's answers. Results are returned in prompt order, or with
+    `stream: true` as server-sent `result` events in completion order,
+    followed by a `done` event. Failed prompts carry an `error` instead of
+    failing the whole batch.
+    """
+    prompts = request.prompts
+    if not prompts:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Prompts cannot be empty"
+        )
+    if len(prompts) > settings.BATCH_MAX_PROMPTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"A batch may contain at most {settings.BATCH_MAX_PROMPTS} prompts"
+        )
+    for index, prompt in enumerate(prompts):
+        if not prompt.strip():
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Prompt {index} cannot be empty"
+            )
+    
+    # The rate limiter took one request's token; each further prompt is another upstream call
+    charge_request(http_request, len(prompts) - 1)
+    
+    memory = get_conversation_memory()
+    conversation_id = request.conversation_id
+    annotate_trace(conversation_id=conversation_id)
+    if conversation_id and not await run_store_call(memory.get_conversation_summary, conversation_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Conversation not found"
+        )
+    
+    max_concurrency = settings.BATCH_MAX_CONCURRENCY
+    if request.max_concurrency:
+        max_concurrency = min(request.max_concurrency, max_concurrency)
+    batch_semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    
+    async def run_prompt(index: int, prompt: str) -> BatchChatResult:
+        is_medical_query = validate_medical_query(prompt)
+        async with batch_semaphore:
+            try:
+                if conversation_id:
+                    context_prompt, history, use_cache = await run_store_call(
+                        _build_context, memory, conversation_id, prompt, pending_query=False
+                    )
+                else:
+                    context_prompt, history, use_cache = prompt, None, True
+                response = await query_gemini(
+                    context_prompt,
+                    use_cache=use_cache,
+                    history=history,
+                    query_class=get_query_class(prompt, False)
+                )
+            except Exception as e:
+                detail = e.detail if isinstance(e, HTTPException) else str(e)
+                return BatchChatResult(
+                    index=index,
+                    prompt=prompt,
+                    error=f"An error occurred: {detail}",
+                    is_medical_query=is_medical_query
+                )
+        return BatchChatResult(
+            index=index,
+            prompt=prompt,
+            response=response,
+            is_medical_query=is_medical_query
+        )
+    
+    def append_results(results: List[BatchChatResult]) -> Dict[str, Any]:
+        """Append answered prompts to the bound conversation, in prompt order"""
+        model = memory.get_conversation_summary(conversation_id).get("model", "gemini")
+        for result in results:
+            if result.response is None:
+                continue
+            memory.add_message(conversation_id, "user", result.prompt, model, result.is_medical_query)
+            memory.add_message(conversation_id, "assistant", result.response, model, result.is_medical_query)
+        return _update_medical_context(memory, conversation_id)
+    
+    async def store_results(results: List[BatchChatResult]) -> Dict[str, Any]:
+        if not conversation_id:
+            return {}
+        medical_context = await run_store_call(append_results, results)
+        schedule_summary_refresh(conversation_id)
+        return medical_context
+    
+    tasks = [asyncio.ensure_future(run_prompt(index, prompt)) for index, prompt in enumerate(prompts)]
+    
+    if not request.stream:
+        try:
+            results = await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+        return BatchChatResponse(
+            results=results,
+            conversation_id=conversation_id,
+            medical_context=await store_results(results)
+        )
+    
+    async def event_stream() -> AsyncIterator[str]:
+        results: List[Optional[BatchChatResult]] = [None] * len(tasks)
+        try:
+            for finished in asyncio.as_completed(tasks):
+                result = await finished
+                results[result.index] = result
+                yield _sse_event("result", result.model_dump())
+        finally:
+            # The client disconnected before every prompt finished
+            for task in tasks:
+                task.cancel()
+        
+        medical_context = await store_results(results)
+        yield _sse_event("done", {
+            "conversation_id": conversation_id,
+            "medical_context": medical_context
+        })
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 
 @router.get("/health")
 async def health_check():
@@ -151,9 +557,19 @@ async def health_check():
         "service": "Rxplain Medical AI Assistant",
         "version": "1.0.0",
         "models": {
-            "gemini": "Available",
-            "gpt": "Available (requires API key)"
-        }
+            provider.name: "Available" if provider.is_available() else "Not configured (requires API key)"
+            for provider in get_llm_router().providers
+        },
+        "llm_routing": get_llm_router().get_stats(),
+        "response_cache": get_response_cache().get_stats(),
+        "single_flight": get_single_flight().get_stats(),
+        "priority_scheduler": get_priority_scheduler().get_stats(),
+        "rate_limit": get_rate_limiter().get_stats(),
+        "conversation_store": await run_store_call(get_conversation_memory().get_stats),
+        "context_prompt": get_context_prompt_stats().get_stats(),
+        "upstream_usage": get_usage_stats().get_stats(),
+        "chat_turns": get_chat_turn_cache().get_stats(),
+        "traffic_recording": get_traffic_recorder().get_stats()
     }
 
 @router.get("/medical-keywords")
@@ -177,13 +593,13 @@ async def get_medical_keywords():
 async def get_conversations():
     """Get all conversations for the sidebar"""
     memory = get_conversation_memory()
-    return memory.get_all_conversations()
+    return await run_store_call(memory.get_all_conversations)
 
 @router.get("/conversations/{conversation_id}")
 async def get_conversation(conversation_id: str):
     """Get a specific conversation with all messages"""
     memory = get_conversation_memory()
-    conversation = memory.get_conversation(conversation_id)
+    conversation = await run_store_call(memory.get_conversation, conversation_id)
     
     if not conversation:
         raise HTTPException(
@@ -207,14 +623,20 @@ async def get_conversation(conversation_id: str):
         "created_at": conversation.created_at.isoformat(),
         "updated_at": conversation.updated_at.isoformat(),
         "model": conversation.model,
-        "medical_context": conversation.medical_context
+        "medical_context": conversation.medical_context,
+        "summary": conversation.summary
     }
 
+def _delete_conversation(conversation_id: str) -> bool:
+    """Delete a conversation and its cached turns"""
+    success = get_conversation_memory().delete_conversation(conversation_id)
+    get_chat_turn_cache().discard(conversation_id)
+    return success
+
 @router.delete("/conversations/{conversation_id}")
 async def delete_conversation(conversation_id: str):
     """Delete a conversation"""
-    memory = get_conversation_memory()
-    success = memory.delete_conversation(conversation_id)
+    success = await run_store_call(_delete_conversation, conversation_id)
     
     if not success:
         raise HTTPException(
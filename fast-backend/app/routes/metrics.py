@@ -0,0 +1,106 @@
+"""
+Metrics Route for Rxplain Medical AI Assistant
+Prometheus scrape endpoint
+"""
+
+from typing import Any, Dict
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.middleware import get_rate_limiter
+from app.services.chat_turns import get_chat_turn_cache
+from app.services.conversation_memory import get_conversation_memory, run_store_call
+from app.services.llm_provider import get_usage_stats
+from app.services.metrics import CallbackMetric, Labels, get_metrics_registry
+from app.services.response_cache import get_response_cache
+from app.services.single_flight import get_single_flight
+
+router = APIRouter()
+
+# Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def _upstream_tokens() -> Dict[Labels, float]:
+    samples: Dict[Labels, float] = {}
+    for provider, totals in get_usage_stats().get_stats()["by_provider"].items():
+        samples[(provider, "input")] = totals["prompt_tokens"]
+        samples[(provider, "cached")] = totals["cached_tokens"]
+        samples[(provider, "output")] = totals["output_tokens"]
+    return samples
+
+def _cache_hit_ratios() -> Dict[Labels, float]:
+    return {
+        ("response",): get_response_cache().get_stats()["hit_ratio"],
+        ("single_flight",): get_single_flight().get_stats()["saved_ratio"],
+        ("chat_turns",): get_chat_turn_cache().get_stats()["reuse_ratio"]
+    }
+
+def _cache_entries() -> Dict[Labels, float]:
+    return {
+        ("response",): get_response_cache().get_stats()["size"],
+        ("chat_turns",): get_chat_turn_cache().get_stats()["conversations"]
+    }
+
+# Conversation store statistics, fetched by each scrape before rendering
+_store_stats: Dict[str, Any] = {}
+
+def _conversation_store() -> Dict[Labels, float]:
+    stats = _store_stats
+    if not stats:
+        return {}
+    return {
+        (stats["backend"], key): stats[key]
+        for key in ("conversations", "messages", "bytes")
+        if key in stats
+    }
+
+def _rate_limited() -> Dict[Labels, float]:
+    stats = get_rate_limiter().get_stats()
+    return {
+        ("client_rate",): stats["rejected_rate_limited"],
+        ("concurrency",): stats["rejected_concurrency"]
+    }
+
+registry = get_metrics_registry()
+registry.register(CallbackMetric(
+    "rxplain_upstream_tokens_total",
+    "Tokens reported in upstream model usage metadata",
+    ("provider", "type"),
+    _upstream_tokens,
+    type_name="counter"
+))
+registry.register(CallbackMetric(
+    "rxplain_cache_hit_ratio",
+    "Fraction of lookups served without new upstream work",
+    ("cache",),
+    _cache_hit_ratios
+))
+registry.register(CallbackMetric(
+    "rxplain_cache_entries",
+    "Entries held by each cache",
+    ("cache",),
+    _cache_entries
+))
+registry.register(CallbackMetric(
+    "rxplain_conversation_store_size",
+    "Size of the conversation store (conversations, messages and bytes)",
+    ("backend", "unit"),
+    _conversation_store
+))
+registry.register(CallbackMetric(
+    "rxplain_rate_limited_total",
+    "Requests rejected by the rate limit middleware",
+    ("reason",),
+    _rate_limited,
+    type_name="counter"
+))
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics"""
+    global _store_stats
+    # Only the store query runs off the event loop (SQLite may block);
+    # rendering stays on the loop, where request handlers add labelled series
+    _store_stats = await run_store_call(get_conversation_memory().get_stats)
+    return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
@@ -0,0 +1,48 @@
+"""
+Profile Routes for Rxplain Medical AI Assistant
+Download sampled request profiles
+"""
+
+from fastapi import APIRouter, HTTPException, Request, status
+from fastapi.responses import PlainTextResponse, Response
+
+from app.config import settings
+from app.middleware import is_profiling_admin
+from app.services.tracing import get_profile_store
+
+router = APIRouter()
+
+def _check_access(request: Request):
+    """
+    Profiles are served only to admins, so never without PROFILING_ADMIN_TOKEN:
+    they expose code paths, timings and request annotations
+    """
+    if not settings.PROFILING_ADMIN_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile downloads are disabled")
+    if not is_profiling_admin(request.headers):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Profiling admin token required")
+
+@router.get("/profiles")
+async def list_profiles(request: Request):
+    """List stored profile reports, most recent first"""
+    _check_access(request)
+    return {"profiles": get_profile_store().list()}
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str, request: Request, format: str = "text"):
+    """
+    Download a profile report: `format=text` for the top functions by
+    cumulative time, `format=prof` for the raw pstats file (e.g. for snakeviz)
+    """
+    _check_access(request)
+    report = get_profile_store().get(profile_id)
+    if report is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+
+    if format == "prof":
+        return Response(
+            report.data,
+            media_type="application/octet-stream",
+            headers={"Content-Disposition": f'attachment; filename="rxplain-{report.id}.prof"'}
+        )
+    return PlainTextResponse(report.text)
@@ -0,0 +1,140 @@
+"""
+Chat Turns Service for Rxplain Medical AI Assistant
+Keeps conversation history as structured Gemini turns, cached between requests
+"""
+
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.services.conversation_memory import (
+    CONTEXT_WINDOW_MESSAGES,
+    ConversationStore,
+    Message,
+    estimate_tokens,
+    strip_boilerplate
+)
+
+# Conversation roles map onto Gemini content roles
+GEMINI_ROLES = {"user": "user", "assistant": "model"}
+
+class ConversationTurns:
+    """Encoded turns of one conversation, newest last"""
+
+    __slots__ = ("turns", "tokens", "last_seq")
+
+    def __init__(self):
+        # (role, text, estimated tokens)
+        self.turns: Deque[Tuple[str, str, int]] = deque()
+        self.tokens = 0
+        self.last_seq = 0  # Sequence number of the newest message seen
+
+class ChatTurnCache:
+    """
+    Per-conversation cache of role-tagged Gemini turns.
+
+    Each stored message is encoded once, when it is first seen; later requests
+    only fetch and encode messages newer than the cached tail. Turns are kept
+    within the context window and token budget, oldest dropped first.
+    """
+
+    def __init__(self, max_conversations: int = 100, token_budget: int = 1500):
+        self.max_conversations = max_conversations
+        self.token_budget = token_budget
+        # conversation_id -> turns, least recently used first
+        self._conversations: "OrderedDict[str, ConversationTurns]" = OrderedDict()
+        self.turns_encoded = 0
+        self.turns_reused = 0
+
+    @staticmethod
+    def encode_message(message: Message) -> Tuple[str, str, int]:
+        """Encode a stored message as a Gemini turn"""
+        role = GEMINI_ROLES.get(message.role, "user")
+        text = strip_boilerplate(message.content) if role == "model" else message.content
+        return role, text, estimate_tokens(text)
+
+    def _sync(self, conversation_id: str, memory: ConversationStore) -> ConversationTurns:
+        """Append messages stored since the last sync, then trim to the window and budget"""
+        entry = self._conversations.get(conversation_id)
+        if entry is None:
+            entry = ConversationTurns()
+            self._conversations[conversation_id] = entry
+        self._conversations.move_to_end(conversation_id)
+
+        self.turns_reused += len(entry.turns)
+        for message in memory.get_messages_after(conversation_id, entry.last_seq):
+            turn = self.encode_message(message)
+            entry.turns.append(turn)
+            entry.tokens += turn[2]
+            entry.last_seq = message.seq
+            self.turns_encoded += 1
+
+        # The window includes the pending query; the budget covers earlier turns
+        while len(entry.turns) > CONTEXT_WINDOW_MESSAGES or (
+            len(entry.turns) > 1 and entry.tokens - entry.turns[-1][2] > self.token_budget
+        ):
+            entry.tokens -= entry.turns.popleft()[2]
+
+        while len(self._conversations) > self.max_conversations:
+            self._conversations.popitem(last=False)
+
+        return entry
+
+    def get_history(
+        self,
+        conversation_id: str,
+        memory: ConversationStore,
+        summary: Optional[str] = None,
+        pending_query: bool = True
+    ) -> List[Dict[str, Any]]:
+        """
+        Get Gemini `contents` for the turns before the current query
+
+        With `pending_query`, the current user message is already stored; it is
+        the newest turn and is excluded, since the caller sends it with any
+        uploaded image.
+        Adjacent turns with the same role are merged and a leading model turn
+        is dropped, so turns alternate starting with the user. The history may
+        end with a user turn (e.g. after a failed reply); the current query is
+        then appended to it.
+        """
+        entry = self._sync(conversation_id, memory)
+
+        history: List[Dict[str, Any]] = []
+        if summary:
+            history.append({"role": "user", "parts": [f"**Summary of Earlier Conversation**: {summary}"]})
+
+        turns = list(entry.turns)
+        if pending_query:
+            turns = turns[:-1]
+
+        for role, text, _ in turns:
+            if history and history[-1]["role"] == role:
+                history[-1]["parts"].append(text)
+            elif history or role == "user":
+                history.append({"role": role, "parts": [text]})
+        return history
+
+    def discard(self, conversation_id: str) -> None:
+        """Forget the cached turns of a conversation"""
+        self._conversations.pop(conversation_id, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get turn reuse statistics"""
+        total = self.turns_encoded + self.turns_reused
+        return {
+            "conversations": len(self._conversations),
+            "turns_encoded": self.turns_encoded,
+            "turns_reused": self.turns_reused,
+            "reuse_ratio": self.turns_reused / total if total else 0.0
+        }
+
+# Global chat turn cache instance
+chat_turn_cache = ChatTurnCache(
+    max_conversations=settings.CONVERSATION_MAX_COUNT,
+    token_budget=settings.CONTEXT_TOKEN_BUDGET
+)
+
+def get_chat_turn_cache() -> ChatTurnCache:
+    """Get the global chat turn cache instance"""
+    return chat_turn_cache
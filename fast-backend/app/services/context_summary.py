@@ -0,0 +1,80 @@
+"""
+Context Summary Service for Rxplain Medical AI Assistant
+Keeps a rolling summary of conversation turns older than the prompt context window
+"""
+
+import asyncio
+import logging
+from typing import List, Set, Tuple
+
+from app.config import settings
+from app.services.conversation_memory import (
+    CONTEXT_WINDOW_MESSAGES,
+    ContextSummary,
+    Message,
+    get_conversation_memory,
+    run_store_call,
+    strip_boilerplate
+)
+from app.services.gemini import summarize_conversation
+
+logger = logging.getLogger(__name__)
+
+# Conversations with a summary refresh in flight, and the tasks themselves so
+# they are not garbage collected before completing
+_refreshing: Set[str] = set()
+_tasks: Set["asyncio.Task"] = set()
+
+def _format_transcript(messages: List[Message]) -> str:
+    """Format turns for summarization, without safety boilerplate"""
+    lines = []
+    for message in messages:
+        content = strip_boilerplate(message.content) if message.role == "assistant" else message.content
+        lines.append(f"{message.role.title()}: {content}")
+    return "\n\n".join(lines)
+
+def schedule_summary_refresh(conversation_id: str) -> bool:
+    """
+    Start summarizing turns that have left the context window, if enough have
+    accumulated since the last summary. Returns False if summaries are
+    disabled or a refresh for the conversation is already in flight.
+
+    Must be called from a running event loop; the summary is generated in the
+    background and never delays the current response.
+    """
+    if not settings.CONTEXT_SUMMARY_ENABLED or conversation_id in _refreshing:
+        return False
+
+    _refreshing.add(conversation_id)
+    task = asyncio.ensure_future(_refresh_summary(conversation_id))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return True
+
+def _pending_messages(conversation_id: str) -> Tuple[ContextSummary, List[Message]]:
+    """The current summary and the turns that have left the context window since"""
+    memory = get_conversation_memory()
+    previous = memory.get_context_summary(conversation_id)
+    unsummarized = memory.get_messages_after(conversation_id, previous.summarized_seq)
+    # Turns still inside the context window are sent verbatim, not summarized
+    return previous, unsummarized[:-CONTEXT_WINDOW_MESSAGES]
+
+async def _refresh_summary(conversation_id: str):
+    try:
+        previous, pending = await run_store_call(_pending_messages, conversation_id)
+        if len(pending) < settings.CONTEXT_SUMMARY_MIN_MESSAGES:
+            return
+
+        summary = await summarize_conversation(_format_transcript(pending), previous.text)
+        if summary:
+            await run_store_call(
+                get_conversation_memory().update_context_summary,
+                conversation_id,
+                summary,
+                pending[-1].seq
+            )
+    except Exception as e:
+        # The previous summary stays in use; the next turn retries
+        logger.warning("Conversation summary failed for %s: %s", conversation_id, e)
+    finally:
+        _refreshing.discard(conversation_id)
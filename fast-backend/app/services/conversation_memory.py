@@ -3,11 +3,27 @@ Conversation Memory Service for Rxplain Medical AI Assistant
 Maintains conversation history and context for medical discussions
 """
 
+import asyncio
+import functools
 import json
+import re
+import sys
 import time
-from typing import Dict, List, Optional, Any
+import zlib
+from abc import ABC, abstractmethod
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Deque, Dict, FrozenSet, List, NamedTuple, Optional, Any, Tuple, TypeVar, Union
 from datetime import datetime
 from pydantic import BaseModel
+from app.config import settings
+from app.utils.medical_prompts import (
+    extract_medical_features,
+    MEDICAL_KEYWORD_MATCHER,
+    MEDICAL_CONTEXT_KEYWORD_SETS,
+    MEDICAL_DISCLAIMERS,
+    SAFETY_WARNINGS
+)
 
 class Message(BaseModel):
     """Individual message in a conversation"""
@@ -16,6 +32,7 @@ class Message(BaseModel):
     timestamp: datetime
     model: str  # "gemini" or "gpt"
     is_medical_query: bool = False
+    seq: int = 0  # Increases with each message in the conversation; cursor for get_messages_after
 
 class Conversation(BaseModel):
     """Complete conversation with memory"""
@@ -26,80 +43,360 @@ class Conversation(BaseModel):
     updated_at: datetime
     model: str
     medical_context: Dict[str, Any] = {}
+    summary: Optional[str] = None  # Rolling summary of turns older than the context window
 
-class ConversationMemory:
-    """Manages conversation memory and context"""
+class ContextSummary(NamedTuple):
+    """Rolling summary of older turns and the sequence number of the last turn it covers"""
+    text: Optional[str]
+    summarized_seq: int
+
+# Number of most recent messages considered for verbatim prompt context
+CONTEXT_WINDOW_MESSAGES = 6
+
+# Medical keyword category -> medical_context field
+MEDICAL_CONTEXT_FIELDS = {
+    "medications": "medications_mentioned",
+    "symptoms": "symptoms_discussed",
+    "conditions": "conditions_referenced",
+    "warnings": "safety_warnings_given"
+}
+
+# Approximate per-record overheads used for memory budgeting
+STORED_MESSAGE_OVERHEAD = 200  # Record, timestamp and tracked keywords
+STORED_CONVERSATION_OVERHEAD = 1024  # Includes the medical context tracker
+MIN_COMPRESS_LENGTH = 256  # Shorter content does not compress usefully
+
+# Preset dictionary shared by every stored message, so even individually
+# compressed messages reference common text instead of each paying for it:
+# the medical vocabulary, then the boilerplate that recurs in assistant
+# replies (the end of the dictionary is the cheapest to reference)
+COMPRESSION_DICTIONARY = (
+    " ".join(sorted(MEDICAL_KEYWORD_MATCHER.keywords)) + "\n\n"
+    + "\n\n".join(list(SAFETY_WARNINGS.values()) + list(MEDICAL_DISCLAIMERS.values()))
+).encode("utf-8")
+
+# Raw deflate: no zlib header or checksum on each message
+COMPRESSION_WBITS = -15
+
+def _compress_text(text: bytes) -> bytes:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, COMPRESSION_WBITS, zdict=COMPRESSION_DICTIONARY)
+    return compressor.compress(text) + compressor.flush()
+
+def _decompress_text(data: bytes) -> str:
+    decompressor = zlib.decompressobj(COMPRESSION_WBITS, zdict=COMPRESSION_DICTIONARY)
+    return (decompressor.decompress(data) + decompressor.flush()).decode("utf-8")
+
+def extract_context_keywords(content: str) -> Dict[str, FrozenSet[str]]:
+    """Get the medical context keywords found in one message, by context field"""
+    features = extract_medical_features(content)
+    return {
+        field: features & MEDICAL_CONTEXT_KEYWORD_SETS[category]
+        for category, field in MEDICAL_CONTEXT_FIELDS.items()
+    }
+
+# Shared (field, keyword) tuples so tracked messages only hold references
+_KEYWORD_PAIRS: Dict[Tuple[str, str], Tuple[str, str]] = {}
+
+def _intern_keyword_pair(field: str, keyword: str) -> Tuple[str, str]:
+    pair = (field, keyword)
+    return _KEYWORD_PAIRS.setdefault(pair, pair)
+
+class MedicalContextTracker:
+    """
+    Running medical context over the messages retained in a conversation.
+    
+    Keyword occurrences are reference-counted per message, so messages can be
+    added as they arrive and removed when trimmed without rescanning the rest.
+    """
+    
+    def __init__(self):
+        self.counts: Dict[str, Counter] = {field: Counter() for field in MEDICAL_CONTEXT_FIELDS.values()}
+        # (field, keyword) pairs found in each tracked message, oldest first
+        self._message_keywords: Deque[Tuple[Tuple[str, str], ...]] = deque()
+        self._last_medical_message: Optional[Any] = None
+        self._last_medical_topic: Optional[str] = None
+    
+    def add(self, message: Any):
+        """Account for a newly appended message (a Message or StoredMessage)"""
+        content = message.content
+        pairs = tuple(
+            _intern_keyword_pair(field, keyword)
+            for field, found in extract_context_keywords(content).items()
+            for keyword in found
+        )
+        for field, keyword in pairs:
+            self.counts[field][keyword] += 1
+        self._message_keywords.append(pairs)
+        
+        if message.is_medical_query:
+            self._last_medical_message = message
+            self._last_medical_topic = content[:100]
+    
+    def remove_oldest(self, message: Any):
+        """Forget the oldest tracked message after it was trimmed"""
+        for field, keyword in self._message_keywords.popleft():
+            counts = self.counts[field]
+            counts[keyword] -= 1
+            if counts[keyword] <= 0:
+                del counts[keyword]
+        
+        # Every later message is non-medical if the last medical one is the oldest
+        if message is self._last_medical_message:
+            self._last_medical_message = None
+            self._last_medical_topic = None
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Get the medical context in the same shape as extract_medical_context"""
+        context: Dict[str, Any] = {field: list(counts) for field, counts in self.counts.items()}
+        context["last_medical_topic"] = self._last_medical_topic
+        return context
+
+class ConversationStore(ABC):
+    """Storage interface for conversations, their messages and medical context"""
+    
+    # Whether calls may block on I/O or locks; request handlers then go through run_store_call
+    blocking_io = False
     
     def __init__(self):
-        self.conversations: Dict[str, Conversation] = {}
-        self.max_conversations = 100  # Limit stored conversations
+        self.max_conversations = settings.CONVERSATION_MAX_COUNT  # Limit stored conversations
         self.max_messages_per_conversation = 50  # Limit messages per conversation
     
+    @abstractmethod
     def create_conversation(self, title: str = "New Conversation", model: str = "gemini") -> str:
         """Create a new conversation"""
-        conversation_id = f"conv_{int(time.time())}_{len(self.conversations)}"
-        
-        conversation = Conversation(
-            id=conversation_id,
-            title=title,
-            messages=[],
-            created_at=datetime.now(),
-            updated_at=datetime.now(),
-            model=model
+    
+    @abstractmethod
+    def add_message(self, conversation_id: str, role: str, content: str, model: str, is_medical_query: bool = False) -> bool:
+        """Add a message to a conversation"""
+    
+    @abstractmethod
+    def get_conversation(self, conversation_id: str) -> Optional[Conversation]:
+        """Get a conversation by ID"""
+    
+    @abstractmethod
+    def get_conversation_history(self, conversation_id: str, max_messages: int = 10) -> List[Message]:
+        """Get recent conversation history for context"""
+    
+    @abstractmethod
+    def get_conversation_summary(self, conversation_id: str) -> Dict[str, Any]:
+        """Get a summary of the conversation"""
+    
+    @abstractmethod
+    def get_medical_context(self, conversation_id: str) -> Dict[str, Any]:
+        """Get the running medical context over the conversation's retained messages"""
+    
+    @abstractmethod
+    def update_medical_context(self, conversation_id: str, context: Dict[str, Any]) -> bool:
+        """Update medical context for a conversation"""
+    
+    @abstractmethod
+    def get_all_conversations(self) -> List[Dict[str, Any]]:
+        """Get all conversations for the sidebar, most recent first"""
+    
+    @abstractmethod
+    def delete_conversation(self, conversation_id: str) -> bool:
+        """Delete a conversation"""
+    
+    @abstractmethod
+    def get_messages_after(self, conversation_id: str, after_seq: int) -> List[Message]:
+        """Get retained messages with a sequence number above `after_seq`, oldest first"""
+    
+    @abstractmethod
+    def get_context_summary(self, conversation_id: str) -> ContextSummary:
+        """Get the rolling summary of older turns"""
+    
+    @abstractmethod
+    def update_context_summary(self, conversation_id: str, summary: str, summarized_seq: int) -> bool:
+        """Store a new rolling summary covering messages up to sequence number `summarized_seq`"""
+    
+    @abstractmethod
+    def get_stats(self) -> Dict[str, Any]:
+        """Get storage statistics"""
+
+class StoredMessage:
+    """
+    Compact in-memory message record.
+    
+    Content outside a conversation's recent context window is kept
+    zlib-compressed and only decompressed when the message is read.
+    """
+    
+    __slots__ = ("role", "_content", "compressed", "timestamp", "model", "is_medical_query", "seq")
+    
+    def __init__(self, role: str, content: str, timestamp: float, model: str, is_medical_query: bool = False, seq: int = 0):
+        self.role = role
+        self._content: Union[str, bytes] = content
+        self.compressed = False
+        self.timestamp = timestamp
+        self.model = model
+        self.is_medical_query = is_medical_query
+        self.seq = seq
+    
+    @property
+    def content(self) -> str:
+        if self.compressed:
+            return _decompress_text(self._content)
+        return self._content
+    
+    @property
+    def size(self) -> int:
+        """Approximate bytes held by this record"""
+        return STORED_MESSAGE_OVERHEAD + sys.getsizeof(self._content)
+    
+    def compress(self) -> int:
+        """Compress the content if worthwhile; returns the change in size"""
+        if self.compressed or len(self._content) < MIN_COMPRESS_LENGTH:
+            return 0
+        encoded = self._content.encode("utf-8")
+        compressed = _compress_text(encoded)
+        if len(compressed) >= len(encoded):
+            return 0
+        before = self.size
+        self._content = compressed
+        self.compressed = True
+        return self.size - before
+    
+    def to_message(self) -> Message:
+        return Message(
+            role=self.role,
+            content=self.content,
+            timestamp=datetime.fromtimestamp(self.timestamp),
+            model=self.model,
+            is_medical_query=self.is_medical_query,
+            seq=self.seq
         )
+
+class StoredConversation:
+    """Compact in-memory conversation record"""
+    
+    __slots__ = (
+        "id", "title", "messages", "created_at", "updated_at", "model",
+        "medical_context", "context", "summary", "summarized_seq", "last_seq", "size"
+    )
+    
+    def __init__(self, conversation_id: str, title: str, model: str):
+        now = time.time()
+        self.id = conversation_id
+        self.title = title
+        self.messages: Deque[StoredMessage] = deque()
+        self.created_at = now
+        self.updated_at = now
+        self.model = model
+        self.medical_context: Dict[str, Any] = {}
+        self.context = MedicalContextTracker()
+        self.summary: Optional[str] = None
+        self.summarized_seq = 0
+        self.last_seq = 0  # Sequence number of the newest message, including trimmed ones
+        self.size = STORED_CONVERSATION_OVERHEAD + sys.getsizeof(title)
+    
+    def to_conversation(self) -> Conversation:
+        return Conversation(
+            id=self.id,
+            title=self.title,
+            messages=[message.to_message() for message in self.messages],
+            created_at=datetime.fromtimestamp(self.created_at),
+            updated_at=datetime.fromtimestamp(self.updated_at),
+            model=self.model,
+            medical_context=dict(self.medical_context),
+            summary=self.summary
+        )
+
+class ConversationMemory(ConversationStore):
+    """
+    Manages conversation memory and context in process memory.
+    
+    Conversations are kept in recency order (least recently updated first),
+    so eviction and most-recent-first listing need no sorting. Messages are
+    stored as compact records, and the total size of all conversations is
+    kept under a byte budget by evicting the least recently updated ones.
+    """
+    
+    def __init__(self, memory_budget_bytes: Optional[int] = None, hot_messages: int = CONTEXT_WINDOW_MESSAGES):
+        super().__init__()
+        self.conversations: "OrderedDict[str, StoredConversation]" = OrderedDict()
+        self.memory_budget_bytes = (
+            memory_budget_bytes if memory_budget_bytes is not None
+            else settings.CONVERSATION_MEMORY_BUDGET_MB * 1024 * 1024
+        )
+        self.hot_messages = hot_messages  # Recent messages kept uncompressed
+        self.total_bytes = 0
+        self.total_messages = 0
+        self.evictions = 0
+        self._created_count = 0
+    
+    def create_conversation(self, title: str = "New Conversation", model: str = "gemini") -> str:
+        """Create a new conversation"""
+        # A running count keeps IDs unique once old conversations are evicted
+        conversation_id = f"conv_{int(time.time())}_{self._created_count}"
+        self._created_count += 1
         
+        conversation = StoredConversation(conversation_id, title, model)
         self.conversations[conversation_id] = conversation
+        self.total_bytes += conversation.size
         
-        # Clean up old conversations if limit exceeded
-        if len(self.conversations) > self.max_conversations:
-            self._cleanup_old_conversations()
+        # Clean up old conversations if a limit is exceeded
+        self._cleanup_old_conversations()
         
         return conversation_id
     
     def add_message(self, conversation_id: str, role: str, content: str, model: str, is_medical_query: bool = False) -> bool:
         """Add a message to a conversation"""
-        if conversation_id not in self.conversations:
+        conversation = self.conversations.get(conversation_id)
+        if conversation is None:
             return False
         
-        conversation = self.conversations[conversation_id]
-        
-        message = Message(
-            role=role,
-            content=content,
-            timestamp=datetime.now(),
-            model=model,
-            is_medical_query=is_medical_query
-        )
-        
-        conversation.messages.append(message)
-        conversation.updated_at = datetime.now()
+        conversation.last_seq += 1
+        message = StoredMessage(role, content, time.time(), model, is_medical_query, conversation.last_seq)
+        messages = conversation.messages
+        messages.append(message)
+        conversation.context.add(message)
+        self.total_messages += 1
+        conversation.updated_at = message.timestamp
+        self.conversations.move_to_end(conversation_id)
+        size_delta = message.size
         
         # Update conversation title if it's the first user message
-        if role == "user" and len(conversation.messages) == 1:
+        if role == "user" and len(messages) == 1:
+            size_delta -= sys.getsizeof(conversation.title)
             conversation.title = content[:50] + "..." if len(content) > 50 else content
+            size_delta += sys.getsizeof(conversation.title)
+        
+        # Compress the message that just left the recent context window
+        if len(messages) > self.hot_messages:
+            size_delta += messages[-self.hot_messages - 1].compress()
         
         # Limit messages per conversation
-        if len(conversation.messages) > self.max_messages_per_conversation:
-            conversation.messages = conversation.messages[-self.max_messages_per_conversation:]
+        while len(messages) > self.max_messages_per_conversation:
+            old_message = messages.popleft()
+            conversation.context.remove_oldest(old_message)
+            self.total_messages -= 1
+            size_delta -= old_message.size
+        
+        conversation.size += size_delta
+        self.total_bytes += size_delta
+        self._cleanup_old_conversations()
         
         return True
     
     def get_conversation(self, conversation_id: str) -> Optional[Conversation]:
-        """Get a conversation by ID"""
-        return self.conversations.get(conversation_id)
+        """Get a snapshot of a conversation by ID"""
+        conversation = self.conversations.get(conversation_id)
+        return conversation.to_conversation() if conversation else None
     
     def get_conversation_history(self, conversation_id: str, max_messages: int = 10) -> List[Message]:
         """Get recent conversation history for context"""
-        conversation = self.get_conversation(conversation_id)
+        conversation = self.conversations.get(conversation_id)
         if not conversation:
             return []
         
         # Return the last N messages for context
-        return conversation.messages[-max_messages:] if len(conversation.messages) > max_messages else conversation.messages
+        messages = conversation.messages
+        start = max(0, len(messages) - max_messages)
+        return [messages[i].to_message() for i in range(start, len(messages))]
     
     def get_conversation_summary(self, conversation_id: str) -> Dict[str, Any]:
         """Get a summary of the conversation"""
-        conversation = self.get_conversation(conversation_id)
+        conversation = self.conversations.get(conversation_id)
         if not conversation:
             return {}
         
@@ -107,129 +404,262 @@ class ConversationMemory:
             "id": conversation.id,
             "title": conversation.title,
             "message_count": len(conversation.messages),
-            "created_at": conversation.created_at.isoformat(),
-            "updated_at": conversation.updated_at.isoformat(),
+            "created_at": datetime.fromtimestamp(conversation.created_at).isoformat(),
+            "updated_at": datetime.fromtimestamp(conversation.updated_at).isoformat(),
             "model": conversation.model,
             "medical_context": conversation.medical_context
         }
     
+    def get_medical_context(self, conversation_id: str) -> Dict[str, Any]:
+        """Get the running medical context over the conversation's retained messages"""
+        conversation = self.conversations.get(conversation_id)
+        if not conversation:
+            return {}
+        return conversation.context.to_dict()
+    
     def update_medical_context(self, conversation_id: str, context: Dict[str, Any]) -> bool:
         """Update medical context for a conversation"""
-        conversation = self.get_conversation(conversation_id)
+        conversation = self.conversations.get(conversation_id)
         if not conversation:
             return False
         
         conversation.medical_context.update(context)
-        conversation.updated_at = datetime.now()
+        conversation.updated_at = time.time()
+        self.conversations.move_to_end(conversation_id)
         return True
     
-    def get_all_conversations(self) -> List[Dict[str, Any]]:
-        """Get all conversations for the sidebar"""
-        conversations = []
-        for conv in self.conversations.values():
-            conversations.append(self.get_conversation_summary(conv.id))
+    def get_messages_after(self, conversation_id: str, after_seq: int) -> List[Message]:
+        """Get retained messages with a sequence number above `after_seq`, oldest first"""
+        conversation = self.conversations.get(conversation_id)
+        if not conversation:
+            return []
+        
+        # Walk back from the newest message, so only the new tail is decompressed
+        newer = []
+        for message in reversed(conversation.messages):
+            if message.seq <= after_seq:
+                break
+            newer.append(message.to_message())
+        newer.reverse()
+        return newer
+    
+    def get_context_summary(self, conversation_id: str) -> ContextSummary:
+        """Get the rolling summary of older turns"""
+        conversation = self.conversations.get(conversation_id)
+        if not conversation:
+            return ContextSummary(None, 0)
+        return ContextSummary(conversation.summary, conversation.summarized_seq)
+    
+    def update_context_summary(self, conversation_id: str, summary: str, summarized_seq: int) -> bool:
+        """Store a new rolling summary covering messages up to sequence number `summarized_seq`"""
+        conversation = self.conversations.get(conversation_id)
+        if not conversation:
+            return False
         
-        # Sort by most recent first
-        conversations.sort(key=lambda x: x["updated_at"], reverse=True)
-        return conversations
+        size_delta = sys.getsizeof(summary) - (sys.getsizeof(conversation.summary) if conversation.summary else 0)
+        conversation.summary = summary
+        conversation.summarized_seq = summarized_seq
+        conversation.size += size_delta
+        self.total_bytes += size_delta
+        return True
+    
+    def get_all_conversations(self) -> List[Dict[str, Any]]:
+        """Get all conversations for the sidebar, most recent first"""
+        return [
+            self.get_conversation_summary(conversation_id)
+            for conversation_id in reversed(self.conversations)
+        ]
     
     def delete_conversation(self, conversation_id: str) -> bool:
         """Delete a conversation"""
-        if conversation_id in self.conversations:
-            del self.conversations[conversation_id]
-            return True
-        return False
+        conversation = self.conversations.pop(conversation_id, None)
+        if conversation is None:
+            return False
+        self.total_bytes -= conversation.size
+        self.total_messages -= len(conversation.messages)
+        return True
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get storage statistics"""
+        return {
+            "backend": "memory",
+            "conversations": len(self.conversations),
+            "messages": self.total_messages,
+            "bytes": self.total_bytes,
+            "budget_bytes": self.memory_budget_bytes,
+            "evictions": self.evictions
+        }
     
     def _cleanup_old_conversations(self):
-        """Remove old conversations to maintain memory limits"""
-        if len(self.conversations) <= self.max_conversations:
-            return
-        
-        # Sort by updated_at and remove oldest
-        sorted_conversations = sorted(
-            self.conversations.items(),
-            key=lambda x: x[1].updated_at
-        )
-        
-        # Remove oldest conversations
-        to_remove = len(self.conversations) - self.max_conversations
-        for i in range(to_remove):
-            del self.conversations[sorted_conversations[i][0]]
+        """Remove least recently updated conversations to maintain memory limits"""
+        # The most recently updated conversation is always kept
+        while len(self.conversations) > 1 and (
+            len(self.conversations) > self.max_conversations
+            or self.total_bytes > self.memory_budget_bytes
+        ):
+            _, conversation = self.conversations.popitem(last=False)
+            self.total_bytes -= conversation.size
+            self.total_messages -= len(conversation.messages)
+            self.evictions += 1
+
+def create_conversation_store(backend: Optional[str] = None) -> ConversationStore:
+    """Create the conversation store selected by settings.CONVERSATION_STORE"""
+    backend = (backend or settings.CONVERSATION_STORE).lower()
+    if backend == "memory":
+        return ConversationMemory()
+    if backend == "sqlite":
+        from app.services.sqlite_memory import SQLiteConversationMemory
+        return SQLiteConversationMemory(settings.CONVERSATION_DB_PATH)
+    raise ValueError(f"Unknown conversation store: {backend}")
 
 # Global conversation memory instance
-conversation_memory = ConversationMemory()
+conversation_memory = create_conversation_store()
 
-def get_conversation_memory() -> ConversationMemory:
+def get_conversation_memory() -> ConversationStore:
     """Get the global conversation memory instance"""
     return conversation_memory
 
-def create_context_prompt(conversation_history: List[Message], current_query: str) -> str:
-    """Create a context-aware prompt for the AI"""
-    if not conversation_history:
+T = TypeVar("T")
+
+# Thread for blocking store calls; the store serializes them anyway
+_store_executor: Optional[ThreadPoolExecutor] = None
+
+async def run_store_call(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Run `func`, which uses the conversation store, from async code.
+
+    With a store that blocks (SQLite may wait up to its busy timeout for
+    another worker's write lock), the call runs on the store thread so the
+    event loop keeps serving other requests; in-process stores are called
+    directly. All code touching the store from handlers goes through here,
+    so helpers like the chat turn cache only ever run on one thread.
+    """
+    global _store_executor
+    if not conversation_memory.blocking_io:
+        return func(*args, **kwargs)
+    if _store_executor is None:
+        _store_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="conversation-store")
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_store_executor, functools.partial(func, *args, **kwargs))
+
+# Safety boilerplate appended to assistant replies; it carries no context
+_BOILERPLATE_RE = re.compile("|".join(
+    re.escape(text)
+    for text in sorted(
+        set(SAFETY_WARNINGS.values()) | set(MEDICAL_DISCLAIMERS.values()),
+        key=len,
+        reverse=True
+    )
+))
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+
+def strip_boilerplate(content: str) -> str:
+    """Remove standard safety warnings and disclaimers from a message"""
+    stripped = _BOILERPLATE_RE.sub("", content)
+    return _BLANK_LINES_RE.sub("\n\n", stripped).strip()
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (about four characters per token)"""
+    return len(text) // 4 + 1
+
+class ContextPromptStats:
+    """Compares built context prompts with the verbatim history they replace"""
+    
+    def __init__(self):
+        self.prompts = 0
+        self.verbatim_tokens = 0
+        self.built_tokens = 0
+    
+    def record(self, verbatim_tokens: int, built_tokens: int):
+        self.prompts += 1
+        self.verbatim_tokens += verbatim_tokens
+        self.built_tokens += built_tokens
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get prompt size statistics"""
+        saved = self.verbatim_tokens - self.built_tokens
+        return {
+            "prompts": self.prompts,
+            "verbatim_tokens": self.verbatim_tokens,
+            "built_tokens": self.built_tokens,
+            "tokens_saved": saved,
+            "savings_ratio": saved / self.verbatim_tokens if self.verbatim_tokens else 0.0
+        }
+
+# Global context prompt statistics
+context_prompt_stats = ContextPromptStats()
+
+def get_context_prompt_stats() -> ContextPromptStats:
+    """Get the global context prompt statistics"""
+    return context_prompt_stats
+
+def create_context_prompt(
+    conversation_history: List[Message],
+    current_query: str,
+    summary: Optional[str] = None,
+    token_budget: Optional[int] = None
+) -> str:
+    """
+    Create a context-aware prompt for the AI
+    
+    Recent messages are included newest first until the token budget is
+    spent, with safety boilerplate stripped from assistant replies. Older
+    turns are represented by the rolling summary, when one is available.
+    """
+    if not conversation_history and not summary:
         return current_query
     
+    if token_budget is None:
+        token_budget = settings.CONTEXT_TOKEN_BUDGET
+    
+    remaining = token_budget
+    built_tokens = 0
+    if summary:
+        summary_part = f"**Summary of Earlier Conversation**: {summary}"
+        built_tokens += estimate_tokens(summary_part)
+        remaining -= built_tokens
+    
+    # Select recent messages, newest first, within the remaining budget
+    recent_parts = []
+    verbatim_tokens = 0
+    for message in reversed(conversation_history[-CONTEXT_WINDOW_MESSAGES:]):
+        role_emoji = "👤" if message.role == "user" else "🤖"
+        prefix = f"{role_emoji} **{message.role.title()}**: "
+        verbatim_tokens += estimate_tokens(prefix + message.content)
+        if remaining <= 0:
+            continue
+        
+        content = strip_boilerplate(message.content) if message.role == "assistant" else message.content
+        part = prefix + content
+        cost = estimate_tokens(part)
+        if cost > remaining:
+            # Keep the start of the newest message rather than dropping it entirely
+            if not recent_parts:
+                recent_parts.append(part[:remaining * 4] + "…")
+                built_tokens += remaining
+            remaining = 0
+            continue
+        
+        recent_parts.append(part)
+        built_tokens += cost
+        remaining -= cost
+    
     # Build conversation context
     context_parts = []
     context_parts.append("**Previous Conversation Context:**")
-    
-    for message in conversation_history[-6:]:  # Last 6 messages for context
-        role_emoji = "👤" if message.role == "user" else "🤖"
-        context_parts.append(f"{role_emoji} **{message.role.title()}**: {message.content}")
+    if summary:
+        context_parts.append(summary_part)
+    context_parts.extend(reversed(recent_parts))
     
     context_parts.append(f"\n**Current Query**: {current_query}")
     context_parts.append("\n**Instructions**: Please provide a response that considers the conversation context above. If this is a follow-up question, reference previous information when appropriate.")
     
+    context_prompt_stats.record(verbatim_tokens, built_tokens)
     return "\n\n".join(context_parts)
 
 def extract_medical_context(messages: List[Message]) -> Dict[str, Any]:
     """Extract medical context from conversation history"""
-    context = {
-        "medications_mentioned": set(),
-        "symptoms_discussed": set(),
-        "conditions_referenced": set(),
-        "safety_warnings_given": set(),
-        "last_medical_topic": None
-    }
-    
-    medical_keywords = {
-        "medications": ["medication", "medicine", "drug", "pill", "tablet", "metformin", "aspirin", "ibuprofen"],
-        "symptoms": ["symptom", "pain", "fever", "headache", "nausea", "dizziness"],
-        "conditions": ["diabetes", "hypertension", "heart disease", "asthma", "arthritis"],
-        "warnings": ["side effect", "allergy", "interaction", "warning", "precaution"]
-    }
-    
+    tracker = MedicalContextTracker()
     for message in messages:
-        content_lower = message.content.lower()
-        
-        # Extract medications
-        for keyword in medical_keywords["medications"]:
-            if keyword in content_lower:
-                context["medications_mentioned"].add(keyword)
-        
-        # Extract symptoms
-        for keyword in medical_keywords["symptoms"]:
-            if keyword in content_lower:
-                context["symptoms_discussed"].add(keyword)
-        
-        # Extract conditions
-        for keyword in medical_keywords["conditions"]:
-            if keyword in content_lower:
-                context["conditions_referenced"].add(keyword)
-        
-        # Extract warnings
-        for keyword in medical_keywords["warnings"]:
-            if keyword in content_lower:
-                context["safety_warnings_given"].add(keyword)
-        
-        # Track last medical topic
-        if message.is_medical_query:
-            context["last_medical_topic"] = message.content[:100]
-    
-    # Convert sets to lists for JSON serialization
-    return {
-        "medications_mentioned": list(context["medications_mentioned"]),
-        "symptoms_discussed": list(context["symptoms_discussed"]),
-        "conditions_referenced": list(context["conditions_referenced"]),
-        "safety_warnings_given": list(context["safety_warnings_given"]),
-        "last_medical_topic": context["last_medical_topic"]
-    } 
\ No newline at end of file
+        tracker.add(message)
+    return tracker.to_dict()
@@ -0,0 +1,118 @@
+"""
+Fake LLM Provider for Rxplain Medical AI Assistant
+Deterministic offline model for load testing, selected with LLM_PROVIDERS=["fake"]
+"""
+
+import asyncio
+import hashlib
+import math
+import random
+from typing import AsyncIterator, List, Optional
+
+from fastapi import HTTPException, status
+
+from app.config import settings
+from app.services.llm_provider import Contents, LLMProvider, estimate_request_tokens, get_usage_stats
+
+# z-score of the 99th percentile of a standard normal distribution
+Z_99 = 2.326
+
+VOCABULARY = [
+    "medication", "dose", "tablet", "daily", "doctor", "pharmacist", "symptoms", "blood",
+    "pressure", "treatment", "side", "effects", "common", "usually", "mild", "take",
+    "with", "food", "water", "morning", "evening", "condition", "monitor", "health",
+    "avoid", "alcohol", "consult", "provider", "prescribed", "may", "help", "reduce"
+]
+
+WORDS_PER_SENTENCE = 12
+
+class FakeProvider(LLMProvider):
+    """
+    Offline model answering with generated text after a simulated delay.
+
+    The answer depends only on the request, so repeated prompts get the same
+    text. Latency is log-normal around FAKE_LLM_LATENCY_MEDIAN_MS with its
+    99th percentile at FAKE_LLM_LATENCY_P99_MS, and FAKE_LLM_ERROR_RATE of
+    calls fail. Latencies and failures are drawn from a generator seeded with
+    FAKE_LLM_SEED, so a run with the same request order is reproducible.
+    """
+
+    name = "fake"
+
+    def __init__(self):
+        super().__init__()
+        self._random = random.Random(settings.FAKE_LLM_SEED)
+
+    @property
+    def model_name(self) -> str:
+        return "fake"
+
+    def is_available(self) -> bool:
+        return True
+
+    def _sample_latency(self) -> float:
+        """Seconds the simulated call takes"""
+        median = max(0.0, settings.FAKE_LLM_LATENCY_MEDIAN_MS) / 1000
+        p99 = max(median, settings.FAKE_LLM_LATENCY_P99_MS / 1000)
+        if median == 0 or p99 == median:
+            return median
+        sigma = math.log(p99 / median) / Z_99
+        return self._random.lognormvariate(math.log(median), sigma)
+
+    def _maybe_fail(self):
+        if self._random.random() < settings.FAKE_LLM_ERROR_RATE:
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail="Fake LLM error (injected)"
+            )
+
+    @staticmethod
+    def _response_words(contents: Contents, system_instruction: Optional[str]) -> List[str]:
+        """Response text seeded by the request text"""
+        digest = hashlib.blake2b(digest_size=8)
+        digest.update((system_instruction or "").encode("utf-8"))
+        for turn in contents:
+            for part in turn["parts"]:
+                digest.update(part.encode("utf-8") if isinstance(part, str) else part["data"])
+        rng = random.Random(digest.digest())
+
+        words = []
+        for index in range(max(1, settings.FAKE_LLM_OUTPUT_WORDS)):
+            word = rng.choice(VOCABULARY)
+            if index % WORDS_PER_SENTENCE == 0:
+                word = word.capitalize()
+            if index % WORDS_PER_SENTENCE == WORDS_PER_SENTENCE - 1:
+                word += "."
+            words.append(word)
+        return words
+
+    def _record_usage(self, variant: str, contents: Contents, system_instruction: Optional[str], words: int):
+        get_usage_stats().record(
+            self.name,
+            variant,
+            prompt_tokens=estimate_request_tokens(contents, system_instruction),
+            output_tokens=words * 4 // 3
+        )
+
+    async def generate(self, contents: Contents, variant: str, system_instruction: Optional[str] = None) -> str:
+        await asyncio.sleep(self._sample_latency())
+        self._maybe_fail()
+        words = self._response_words(contents, system_instruction)
+        self._record_usage(variant, contents, system_instruction, len(words))
+        return " ".join(words)
+
+    async def stream(self, contents: Contents, variant: str, system_instruction: Optional[str] = None) -> AsyncIterator[str]:
+        latency = self._sample_latency()
+        words = self._response_words(contents, system_instruction)
+        chunk_words = max(1, settings.FAKE_LLM_STREAM_CHUNK_WORDS)
+        chunks = [" ".join(words[start:start + chunk_words]) for start in range(0, len(words), chunk_words)]
+
+        # The sampled latency is spread evenly over the chunks,
+        # and injected errors happen before the first chunk, so the router can fail over
+        delay = latency / len(chunks)
+        for index, chunk in enumerate(chunks):
+            await asyncio.sleep(delay)
+            if index == 0:
+                self._maybe_fail()
+            yield chunk if index == 0 else " " + chunk
+        self._record_usage(variant, contents, system_instruction, len(words))
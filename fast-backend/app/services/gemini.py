@@ -1,21 +1,26 @@
-import os
-from dotenv import load_dotenv
-import google.generativeai as genai
-from fastapi import HTTPException, status
 import json
-import base64
-from typing import Optional, Union
-from PIL import Image
-import io
-
-load_dotenv()
-
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    raise Exception("GEMINI_API_KEY not found in environment variables")
-
-genai.configure(api_key=GEMINI_API_KEY)
-model = genai.GenerativeModel('gemini-2.0-flash')
+import hashlib
+import math
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, FrozenSet, List, Optional
+from fastapi import HTTPException, status
+from app.config import settings
+from app.services.image_pipeline import detect_mime_type
+from app.services.llm_provider import Contents, get_llm_router
+from app.services.metrics import UPSTREAM_ERRORS, track_stage
+from app.services.priority_scheduler import get_priority_scheduler
+from app.services.response_cache import get_response_cache, ResponseCache
+from app.services.single_flight import get_single_flight
+from app.services.upstream_limits import UpstreamRejected
+from app.utils.keyword_matcher import matches_any
+from app.utils.medical_prompts import (
+    classify_medical_query,
+    extract_medical_features,
+    MEDICAL_KEYWORD_SETS,
+    MEDICAL_VALIDATION_KEYWORD_SET,
+    SAFETY_WARNINGS,
+    WARNING_TRIGGER_SETS
+)
 
 # Comprehensive Medical Assistant System Prompt
 MEDICAL_SYSTEM_PROMPT = """You are Rxplain, a professional medical AI assistant designed to help patients understand their medications and health information. Your role is to provide clear, accurate, and helpful medical information while maintaining the highest standards of safety and ethics.
@@ -117,38 +122,15 @@ Structure your response as:
 
 ⚠️ **Important**: This analysis is for educational purposes only. Always follow your healthcare provider's specific instructions and consult them for personalized medical guidance."""
 
-# Safety filters and medical keywords
-MEDICAL_SAFETY_FILTERS = [
-    "emergency", "urgent", "immediate", "severe", "serious", "dangerous",
-    "overdose", "allergic", "reaction", "chest pain", "difficulty breathing",
-    "swelling", "rash", "fever", "bleeding", "dizziness", "fainting"
-]
+# Keywords that identify a medical query when falling back after an API error
+FALLBACK_MEDICAL_KEYWORDS = frozenset(["medication", "medicine", "drug", "health", "symptom", "prescription"])
 
-def create_medical_prompt(user_query: str, has_image: bool = False) -> str:
-    """
-    Create a comprehensive medical prompt with safety guidelines
-    """
-    # Detect if this is a medication-related query
-    medication_keywords = [
-        "medication", "medicine", "drug", "pill", "tablet", "capsule", "injection",
-        "prescription", "dosage", "side effect", "interaction", "allergy",
-        "metformin", "aspirin", "ibuprofen", "acetaminophen", "antibiotic",
-        "blood pressure", "diabetes", "cholesterol", "pain", "fever"
-    ]
-    
-    is_medication_query = any(keyword.lower() in user_query.lower() for keyword in medication_keywords)
-    
-    # Enhanced prompt based on query type and image presence
-    if has_image:
-        if is_medication_query or "prescription" in user_query.lower():
-            enhanced_prompt = f"""
-{MEDICAL_SYSTEM_PROMPT}
-
-{PRESCRIPTION_IMAGE_PROMPT}
+# Warnings added by add_safety_warnings, in display order
+QUERY_WARNING_TYPES = ["side_effects", "dosage", "interactions", "pregnancy", "discontinuation"]
 
-**USER QUERY**: {user_query}
-
-**INSTRUCTIONS**: 
+# Per-variant instructions that follow the user query in the medical prompt
+MEDICAL_PROMPT_INSTRUCTIONS = {
+    "prescription_image": """**INSTRUCTIONS**: 
 - Analyze the prescription image provided
 - Identify all medications clearly
 - Provide comprehensive information about each medication
@@ -167,14 +149,8 @@ Please provide a well-structured response covering:
 6. Additional helpful tips
 
 Remember to maintain a caring, professional tone and prioritize patient safety.
-"""
-        else:
-            enhanced_prompt = f"""
-{MEDICAL_SYSTEM_PROMPT}
-
-**USER QUERY**: {user_query}
-
-**INSTRUCTIONS**:
+""",
+    "image": """**INSTRUCTIONS**:
 - Analyze the medical image provided
 - Provide helpful health information
 - Maintain medical accuracy
@@ -190,14 +166,8 @@ Provide a clear, informative response that:
 - Maintains safety guidelines
 - Uses appropriate medical terminology
 - Encourages professional consultation when needed
-"""
-    elif is_medication_query:
-        enhanced_prompt = f"""
-{MEDICAL_SYSTEM_PROMPT}
-
-**USER QUERY**: {user_query}
-
-**INSTRUCTIONS**: 
+""",
+    "medication": """**INSTRUCTIONS**: 
 - Provide comprehensive medication information
 - Include safety warnings and precautions
 - Explain in simple, patient-friendly language
@@ -215,14 +185,8 @@ Please provide a well-structured response covering:
 7. Additional helpful tips
 
 Remember to maintain a caring, professional tone and prioritize patient safety.
-"""
-    else:
-        enhanced_prompt = f"""
-{MEDICAL_SYSTEM_PROMPT}
-
-**USER QUERY**: {user_query}
-
-**INSTRUCTIONS**:
+""",
+    "general": """**INSTRUCTIONS**:
 - Provide helpful health information
 - Maintain medical accuracy
 - Use clear, accessible language
@@ -237,39 +201,90 @@ Provide a clear, informative response that:
 - Uses appropriate medical terminology
 - Encourages professional consultation when needed
 """
+}
 
-    return enhanced_prompt
-
-def add_safety_warnings(response: str, user_query: str, has_image: bool = False) -> str:
+def select_prompt_variant(user_query: str, has_image: bool = False, features: Optional[FrozenSet[str]] = None) -> str:
     """
-    Add appropriate safety warnings based on the query content
+    Select the medical prompt variant for a query: "prescription_image",
+    "image", "medication" or "general"
     """
-    query_lower = user_query.lower()
+    if features is None:
+        features = extract_medical_features(user_query)
     
-    # Add specific warnings based on query content
-    warnings = []
+    # Detect if this is a medication-related query
+    is_medication_query = matches_any(features, MEDICAL_KEYWORD_SETS["medications"])
     
+    # Enhanced prompt based on query type and image presence
     if has_image:
-        warnings.append("⚠️ **Image Analysis Disclaimer**: This analysis is for educational purposes only. Always consult your healthcare provider for accurate medical information and follow their specific instructions.")
+        if is_medication_query or "prescription" in features:
+            return "prescription_image"
+        return "image"
+    if is_medication_query:
+        return "medication"
+    return "general"
+
+def _get_prompt_preamble(variant: str) -> str:
+    """Static guidelines that precede the user query"""
+    if variant == "prescription_image":
+        return f"{MEDICAL_SYSTEM_PROMPT}\n\n{PRESCRIPTION_IMAGE_PROMPT}"
+    return MEDICAL_SYSTEM_PROMPT
+
+def get_system_instruction(variant: str) -> str:
+    """
+    Get the static part of a prompt variant, sent once as the model's
+    system instruction instead of with every request
+    """
+    return f"{_get_prompt_preamble(variant)}\n\n{MEDICAL_PROMPT_INSTRUCTIONS[variant].strip()}"
+
+def create_user_prompt(user_query: str) -> str:
+    """Per-request prompt sent alongside a variant's system instruction"""
+    return f"**USER QUERY**: {user_query}"
+
+def create_medical_prompt(user_query: str, has_image: bool = False, features: Optional[FrozenSet[str]] = None) -> str:
+    """
+    Create a comprehensive medical prompt with safety guidelines
     
-    if any(word in query_lower for word in ["side effect", "reaction", "allergy"]):
-        warnings.append("⚠️ **Safety Alert**: If you experience severe side effects, allergic reactions, or unusual symptoms, seek immediate medical attention.")
+    This is the full single-text form of a prompt variant; Gemini calls send
+    the static part as a system instruction instead (see get_system_instruction).
+    """
+    variant = select_prompt_variant(user_query, has_image, features)
+    return f"""
+{_get_prompt_preamble(variant)}
+
+{create_user_prompt(user_query)}
+
+{MEDICAL_PROMPT_INSTRUCTIONS[variant]}"""
+
+MEDICAL_DISCLAIMER = "⚠️ **Important**: This information is for educational purposes only and should not replace professional medical advice. Always consult your healthcare provider for personalized medical guidance."
+
+def get_query_warnings(user_query: str, has_image: bool = False, features: Optional[FrozenSet[str]] = None) -> List[str]:
+    """
+    Get the safety warnings that apply to a query, independent of the response
+    """
+    if features is None:
+        features = extract_medical_features(user_query)
     
-    if any(word in query_lower for word in ["dosage", "dose", "how much", "frequency"]):
-        warnings.append("⚠️ **Dosage Warning**: Always follow your healthcare provider's prescribed dosage. Never adjust medication doses without consulting your doctor.")
+    # Add specific warnings based on query content
+    warnings = []
     
-    if any(word in query_lower for word in ["interaction", "mix", "combine", "alcohol"]):
-        warnings.append("⚠️ **Interaction Warning**: Always inform your healthcare provider about all medications, supplements, and substances you're taking to avoid harmful interactions.")
+    if has_image:
+        warnings.append(SAFETY_WARNINGS["image_analysis"])
     
-    if any(word in query_lower for word in ["pregnancy", "breastfeeding", "baby"]):
-        warnings.append("⚠️ **Pregnancy/Breastfeeding**: Consult your healthcare provider before taking any medication during pregnancy or while breastfeeding.")
+    for warning_type in QUERY_WARNING_TYPES:
+        if matches_any(features, WARNING_TRIGGER_SETS[warning_type]):
+            warnings.append(SAFETY_WARNINGS[warning_type])
     
-    if any(word in query_lower for word in ["stop", "discontinue", "quit"]):
-        warnings.append("⚠️ **Discontinuation Warning**: Never stop taking prescribed medications without consulting your healthcare provider, as this can be dangerous.")
+    return warnings
+
+def add_safety_warnings(response: str, user_query: str, has_image: bool = False, features: Optional[FrozenSet[str]] = None) -> str:
+    """
+    Add appropriate safety warnings based on the query content
+    """
+    warnings = get_query_warnings(user_query, has_image, features)
     
     # Add general medical disclaimer if not already present
     if "⚠️ **Important**:" not in response:
-        response += "\n\n⚠️ **Important**: This information is for educational purposes only and should not replace professional medical advice. Always consult your healthcare provider for personalized medical guidance."
+        response += "\n\n" + MEDICAL_DISCLAIMER
     
     # Add specific warnings at the beginning if any were identified
     if warnings:
@@ -277,52 +292,158 @@ def add_safety_warnings(response: str, user_query: str, has_image: bool = False)
     
     return response
 
-async def query_gemini(prompt: str, image_data: Optional[bytes] = None) -> str:
+def _prepare_contents(user_prompt: str, image_data: Optional[bytes] = None) -> List[Any]:
+    """
+    Build the parts of the user turn from the per-request prompt and optional image
+    """
+    if not image_data:
+        return [user_prompt]
+    
+    # Send the (already preprocessed) encoded image as an inline blob
+    return [user_prompt, {"mime_type": detect_mime_type(image_data), "data": image_data}]
+
+def _build_contents(
+    prompt: str,
+    image_data: Optional[bytes] = None,
+    history: Optional[List[Dict[str, Any]]] = None
+) -> Contents:
+    """
+    Build the request contents, appending the query as the newest user turn
+    after any structured conversation history
+    """
+    parts = _prepare_contents(create_user_prompt(prompt), image_data)
+    if not history:
+        return [{"role": "user", "parts": parts}]
+    
+    if history[-1]["role"] == "user":
+        # Consecutive user turns are merged (e.g. after an unanswered message)
+        return history[:-1] + [{"role": "user", "parts": history[-1]["parts"] + parts}]
+    return history + [{"role": "user", "parts": parts}]
+
+def _get_cache_key(variant: str, prompt: str, image_data: Optional[bytes], use_cache: bool) -> Optional[str]:
     """
-    Enhanced Gemini query function with medical assistant capabilities and image support
+    Get the response cache key for a request, or None if caching does not apply
+    
+    The prompt variant stands in for its static system instruction.
     """
+    if not use_cache or not settings.RESPONSE_CACHE_ENABLED:
+        return None
+    return ResponseCache.make_key(f"{variant}\n{create_user_prompt(prompt)}", image_data)
+
+def _get_flight_key(
+    variant: str,
+    prompt: str,
+    image_data: Optional[bytes],
+    history: Optional[List[Dict[str, Any]]]
+) -> str:
+    """Key identifying the exact upstream request, for coalescing identical calls"""
+    digest = hashlib.sha256(f"{variant}\0{prompt}".encode("utf-8"))
+    if history:
+        digest.update(b"\0history:")
+        digest.update(json.dumps(history, ensure_ascii=False).encode("utf-8"))
+    if image_data:
+        digest.update(b"\0image:")
+        digest.update(hashlib.sha256(image_data).digest())
+    return digest.hexdigest()
+
+def _rejected_response(rejection: UpstreamRejected) -> HTTPException:
+    """Fast 429/503 for calls the upstream limits did not admit"""
+    return HTTPException(
+        status_code=rejection.status_code,
+        detail=rejection.detail,
+        headers={"Retry-After": str(math.ceil(rejection.retry_after))}
+    )
+
+def get_query_class(prompt: str, has_image: bool, features: Optional[FrozenSet[str]] = None) -> str:
+    """Scheduling class of a query (see PriorityScheduler)"""
+    query_class = classify_medical_query(prompt, features)
+    # An uploaded image is a prescription or medication even if the prompt is generic
+    if has_image and query_class == "general_health":
+        return "medication"
+    return query_class
+
+@asynccontextmanager
+async def _upstream_slot(query_class: str) -> AsyncIterator[None]:
+    """Hold an upstream slot, queuing by priority when capacity is saturated"""
+    if not settings.PRIORITY_SCHEDULER_ENABLED:
+        yield
+        return
+    scheduler = get_priority_scheduler()
+    with track_stage("queue_wait"):
+        await scheduler.acquire(query_class)
     try:
-        # Create comprehensive medical prompt
+        yield
+    finally:
+        scheduler.release()
+
+async def _generate(variant: str, contents: Contents, query_class: str) -> str:
+    """Make one upstream call through the provider router"""
+    async with _upstream_slot(query_class):
+        return await get_llm_router().generate(contents, variant, get_system_instruction(variant))
+
+async def query_gemini(
+    prompt: str,
+    image_data: Optional[bytes] = None,
+    use_cache: bool = True,
+    history: Optional[List[Dict[str, Any]]] = None,
+    query_class: Optional[str] = None
+) -> str:
+    """
+    Enhanced medical assistant query with image support, answered by the
+    fastest available provider (Gemini by default, see LLMRouter)
+    
+    Set use_cache=False for prompts that carry conversation context; only
+    standalone queries should be answered from the response cache. `history`
+    holds earlier turns as Gemini contents (see ChatTurnCache.get_history).
+    `query_class` is the scheduling
+    class of the patient's own query (see get_query_class); pass it when the
+    prompt is wrapped in conversation context, whose earlier turns would
+    otherwise decide the class.
+    """
+    # Scan the prompt once; the feature set is shared by every classifier below
+    features = extract_medical_features(prompt)
+    if query_class is None:
+        query_class = get_query_class(prompt, image_data is not None, features)
+    
+    try:
+        # Select the medical prompt variant; its static part is the model's system instruction
         has_image = image_data is not None
-        medical_prompt = create_medical_prompt(prompt, has_image)
+        variant = select_prompt_variant(prompt, has_image, features)
         
-        # Prepare content for Gemini
-        if image_data:
-            # Convert image data to PIL Image and then to format Gemini can handle
-            try:
-                image = Image.open(io.BytesIO(image_data))
-                # Convert to RGB if necessary
-                if image.mode != 'RGB':
-                    image = image.convert('RGB')
-                
-                # Generate response with image
-                response = model.generate_content([medical_prompt, image])
-            except Exception as img_error:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"Error processing image: {str(img_error)}"
-                )
-        else:
-            # Generate response with text only
-            response = model.generate_content(medical_prompt)
+        cache_key = _get_cache_key(variant, prompt, image_data, use_cache and not history)
+        with track_stage("cache_lookup"):
+            response_text = get_response_cache().get(cache_key) if cache_key else None
         
-        if not response.text:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Empty response from Gemini"
-            )
+        if response_text is None:
+            # Identical concurrent requests share one upstream call
+            with track_stage("upstream_llm"):
+                if settings.SINGLE_FLIGHT_ENABLED:
+                    response_text = await get_single_flight().do(
+                        _get_flight_key(variant, prompt, image_data, history),
+                        lambda: _generate(variant, _build_contents(prompt, image_data, history), query_class)
+                    )
+                else:
+                    response_text = await _generate(variant, _build_contents(prompt, image_data, history), query_class)
+            if cache_key:
+                get_response_cache().set(cache_key, response_text)
         
         # Add safety warnings based on query content
-        enhanced_response = add_safety_warnings(response.text, prompt, has_image)
+        with track_stage("safety"):
+            enhanced_response = add_safety_warnings(response_text, prompt, has_image, features)
         
         return enhanced_response
         
+    except UpstreamRejected as rejection:
+        # Not admitted upstream: tell the client when to retry rather than
+        # answering with the technical difficulties text
+        raise _rejected_response(rejection)
     except Exception as e:
+        UPSTREAM_ERRORS.labels(query_class).inc()
         # Provide a helpful error message for medical queries
         error_message = f"Gemini API error: {str(e)}"
         
         # If it's a medical query, provide a more helpful response
-        if any(keyword in prompt.lower() for keyword in ["medication", "medicine", "drug", "health", "symptom", "prescription"]):
+        if matches_any(features, FALLBACK_MEDICAL_KEYWORDS):
             return """I apologize, but I'm currently experiencing technical difficulties. 
 
 For medical questions, please:
@@ -339,19 +460,89 @@ Your health and safety are the top priority."""
             detail=error_message
         )
 
+async def stream_gemini(
+    prompt: str,
+    image_data: Optional[bytes] = None,
+    use_cache: bool = True,
+    features: Optional[FrozenSet[str]] = None,
+    history: Optional[List[Dict[str, Any]]] = None,
+    query_class: Optional[str] = None
+) -> AsyncIterator[str]:
+    """
+    Stream raw response text as it is generated.
+    
+    Safety warnings and the disclaimer are not applied here; callers emit
+    them around the stream (see get_query_warnings and MEDICAL_DISCLAIMER).
+    A cached response is yielded as a single chunk. `query_class` is as
+    for query_gemini.
+    """
+    has_image = image_data is not None
+    if query_class is None:
+        query_class = get_query_class(prompt, has_image, features)
+    variant = select_prompt_variant(prompt, has_image, features)
+    
+    cache_key = _get_cache_key(variant, prompt, image_data, use_cache and not history)
+    if cache_key:
+        with track_stage("cache_lookup"):
+            cached = get_response_cache().get(cache_key)
+        if cached is not None:
+            yield cached
+            return
+    
+    contents = _build_contents(prompt, image_data, history)
+    chunks: List[str] = []
+    
+    try:
+        # Includes the time the client takes to receive each chunk
+        with track_stage("upstream_llm"):
+            async with _upstream_slot(query_class):
+                async for text in get_llm_router().stream(contents, variant, get_system_instruction(variant)):
+                    chunks.append(text)
+                    yield text
+    except UpstreamRejected as rejection:
+        raise _rejected_response(rejection)
+    except Exception:
+        # The caller turns the failure into an error event
+        UPSTREAM_ERRORS.labels(query_class).inc()
+        raise
+    
+    if cache_key and chunks:
+        get_response_cache().set(cache_key, "".join(chunks))
+
+# Prompt used to condense older conversation turns into a rolling summary
+CONVERSATION_SUMMARY_PROMPT = """Summarize the earlier part of a conversation between a patient and Rxplain, a medical AI assistant. The summary replaces these turns as context for later questions.
+
+- Keep medication names, conditions, symptoms and what the patient asked about
+- Keep key facts that were already explained, as short bullet points
+- Omit disclaimers, safety warnings and greetings
+- Keep it under 150 words"""
+
+async def summarize_conversation(transcript: str, previous_summary: Optional[str] = None) -> str:
+    """
+    Summarize conversation turns, folding in the previous summary if any
+    """
+    parts = [CONVERSATION_SUMMARY_PROMPT]
+    if previous_summary:
+        parts.append(f"**Summary so far**:\n{previous_summary}")
+    parts.append(f"**Conversation turns**:\n{transcript}")
+    
+    # Background work; shed before any patient query
+    async with _upstream_slot("summary"):
+        summary = await get_llm_router().generate(
+            [{"role": "user", "parts": ["\n\n".join(parts)]}],
+            "summary"
+        )
+    return summary.strip()
+
 # Additional utility functions for medical assistance
-def validate_medical_query(query: str) -> bool:
+def validate_medical_query(query: str, features: Optional[FrozenSet[str]] = None) -> bool:
     """
     Validate if a query is medical-related
     """
-    medical_keywords = [
-        "medication", "medicine", "drug", "health", "symptom", "treatment",
-        "side effect", "dosage", "prescription", "doctor", "nurse", "hospital",
-        "pain", "fever", "allergy", "reaction", "blood", "heart", "diabetes",
-        "blood pressure", "cholesterol", "antibiotic", "vitamin", "supplement"
-    ]
+    if features is None:
+        features = extract_medical_features(query)
     
-    return any(keyword.lower() in query.lower() for keyword in medical_keywords)
+    return matches_any(features, MEDICAL_VALIDATION_KEYWORD_SET)
 
 def get_medical_response_template(query_type: str) -> str:
     """
@@ -0,0 +1,150 @@
+"""
+Gemini Provider for Rxplain Medical AI Assistant
+Async Google Gemini calls behind the common LLM provider interface
+"""
+
+import asyncio
+import logging
+import time
+from datetime import timedelta
+from typing import Any, AsyncIterator, Dict, Optional
+
+from fastapi import HTTPException, status
+
+from app.config import settings
+from app.services.llm_provider import Contents, LLMProvider, get_usage_stats
+
+logger = logging.getLogger(__name__)
+
+class GeminiProvider(LLMProvider):
+    """
+    Google Gemini, with one model per prompt variant whose static prompt is
+    the system instruction (optionally backed by Gemini context caching)
+    """
+
+    name = "gemini"
+
+    def __init__(self):
+        super().__init__(rpm_limit=settings.GEMINI_RPM_LIMIT, tpm_limit=settings.GEMINI_TPM_LIMIT)
+        self._configured = False
+        self._variant_models: Dict[str, Any] = {}
+        self._variant_model_expiry: Dict[str, float] = {}
+        # Created lazily so they bind to the running event loop
+        self._variant_model_lock: Optional[asyncio.Lock] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def model_name(self) -> str:
+        return settings.GEMINI_MODEL
+
+    def is_available(self) -> bool:
+        return bool(settings.GEMINI_API_KEY)
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        """Get the semaphore limiting concurrent Gemini calls per worker"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(max(1, settings.GEMINI_MAX_CONCURRENCY))
+        return self._semaphore
+
+    def initialize(self):
+        self._configure()
+
+    def _configure(self):
+        """Configure the SDK on first use rather than at import"""
+        if not self._configured:
+            import google.generativeai as genai
+            genai.configure(api_key=settings.GEMINI_API_KEY)
+            self._configured = True
+
+    def _create_model(self, system_instruction: Optional[str]) -> Any:
+        """Create a model that sends the static prompt as its system instruction"""
+        import google.generativeai as genai
+        self._configure()
+        return genai.GenerativeModel(settings.GEMINI_MODEL, system_instruction=system_instruction)
+
+    def _create_cached_model(self, system_instruction: str) -> Any:
+        """Create a model whose system instruction is stored as Gemini cached content"""
+        import google.generativeai as genai
+        from google.generativeai import caching
+        self._configure()
+        cached_content = caching.CachedContent.create(
+            model=settings.GEMINI_MODEL,
+            system_instruction=system_instruction,
+            ttl=timedelta(seconds=settings.GEMINI_CONTEXT_CACHE_TTL_SECONDS)
+        )
+        return genai.GenerativeModel.from_cached_content(cached_content=cached_content)
+
+    async def _get_variant_model(self, variant: str, system_instruction: Optional[str]) -> Any:
+        """Get the model for a prompt variant, creating it on first use"""
+        variant_model = self._variant_models.get(variant)
+        if variant_model is not None and self._variant_model_expiry[variant] > time.monotonic():
+            return variant_model
+
+        if self._variant_model_lock is None:
+            self._variant_model_lock = asyncio.Lock()
+
+        async with self._variant_model_lock:
+            variant_model = self._variant_models.get(variant)
+            if variant_model is not None and self._variant_model_expiry[variant] > time.monotonic():
+                return variant_model
+
+            variant_model = None
+            expiry = float("inf")
+            if settings.GEMINI_CONTEXT_CACHE_ENABLED and system_instruction:
+                try:
+                    # Creating cached content is a blocking API call
+                    loop = asyncio.get_running_loop()
+                    variant_model = await loop.run_in_executor(None, self._create_cached_model, system_instruction)
+                    # Recreate shortly before the cached content expires
+                    expiry = time.monotonic() + settings.GEMINI_CONTEXT_CACHE_TTL_SECONDS * 0.9
+                except Exception as e:
+                    # E.g. the prefix is below the model's minimum cacheable size
+                    logger.warning("Gemini context caching unavailable for %s prompt: %s", variant, e)
+
+            if variant_model is None:
+                variant_model = self._create_model(system_instruction)
+
+            self._variant_models[variant] = variant_model
+            self._variant_model_expiry[variant] = expiry
+            return variant_model
+
+    def _record_usage(self, variant: str, usage_metadata: Any):
+        if usage_metadata is None:
+            return
+        get_usage_stats().record(
+            self.name,
+            variant,
+            prompt_tokens=getattr(usage_metadata, "prompt_token_count", 0) or 0,
+            cached_tokens=getattr(usage_metadata, "cached_content_token_count", 0) or 0,
+            output_tokens=getattr(usage_metadata, "candidates_token_count", 0) or 0
+        )
+
+    async def generate(self, contents: Contents, variant: str, system_instruction: Optional[str] = None) -> str:
+        variant_model = await self._get_variant_model(variant, system_instruction)
+
+        # Generate response without blocking the event loop
+        async with self._get_semaphore():
+            response = await variant_model.generate_content_async(contents)
+        self._record_usage(variant, getattr(response, "usage_metadata", None))
+
+        if not response.text:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Empty response from Gemini"
+            )
+        return response.text
+
+    async def stream(self, contents: Contents, variant: str, system_instruction: Optional[str] = None) -> AsyncIterator[str]:
+        variant_model = await self._get_variant_model(variant, system_instruction)
+
+        async with self._get_semaphore():
+            response = await variant_model.generate_content_async(contents, stream=True)
+            async for chunk in response:
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # Chunks without text parts (e.g. a trailing finish reason)
+                    continue
+                if text:
+                    yield text
+        self._record_usage(variant, getattr(response, "usage_metadata", None))
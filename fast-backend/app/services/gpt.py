@@ -1,16 +1,132 @@
-import openai
-import os
-from dotenv import load_dotenv
+"""
+OpenAI GPT Provider for Rxplain Medical AI Assistant
+Async OpenAI chat completions behind the common LLM provider interface
+"""
 
-load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY")
+import asyncio
+import base64
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from fastapi import HTTPException, status
+
+from app.config import settings
+from app.services.llm_provider import Contents, LLMProvider, get_usage_stats
+
+# Gemini-style turn roles mapped to OpenAI chat roles
+OPENAI_ROLES = {"user": "user", "model": "assistant"}
+
+def to_openai_messages(contents: Contents, system_instruction: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Convert Gemini-style turns to OpenAI chat messages"""
+    messages: List[Dict[str, Any]] = []
+    if system_instruction:
+        messages.append({"role": "system", "content": system_instruction})
+
+    for turn in contents:
+        role = OPENAI_ROLES.get(turn["role"], "user")
+        parts = turn["parts"]
+        if all(isinstance(part, str) for part in parts):
+            messages.append({"role": role, "content": "\n\n".join(parts)})
+            continue
+
+        content = []
+        for part in parts:
+            if isinstance(part, str):
+                content.append({"type": "text", "text": part})
+            else:
+                encoded = base64.b64encode(part["data"]).decode("ascii")
+                content.append({
+                    "type": "image_url",
+                    "image_url": {"url": f"data:{part['mime_type']};base64,{encoded}"}
+                })
+        messages.append({"role": role, "content": content})
+    return messages
+
+class OpenAIProvider(LLMProvider):
+    """OpenAI chat completions using the async client"""
+
+    name = "gpt"
+
+    def __init__(self):
+        super().__init__(rpm_limit=settings.GPT_RPM_LIMIT, tpm_limit=settings.GPT_TPM_LIMIT)
+        self._client = None
+        # Created lazily so it binds to the running event loop
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def model_name(self) -> str:
+        return settings.GPT_MODEL
+
+    def is_available(self) -> bool:
+        return bool(settings.OPENAI_API_KEY)
+
+    def initialize(self):
+        self._get_client()
+
+    def _get_client(self) -> Any:
+        """Create the client on first use; the openai package is optional"""
+        if self._client is None:
+            from openai import AsyncOpenAI
+            self._client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+        return self._client
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        """Get the semaphore limiting concurrent OpenAI calls per worker"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(max(1, settings.GPT_MAX_CONCURRENCY))
+        return self._semaphore
+
+    def _record_usage(self, variant: str, usage: Any):
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        get_usage_stats().record(
+            self.name,
+            variant,
+            prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+            cached_tokens=getattr(details, "cached_tokens", 0) or 0,
+            output_tokens=getattr(usage, "completion_tokens", 0) or 0
+        )
+
+    async def generate(self, contents: Contents, variant: str, system_instruction: Optional[str] = None) -> str:
+        async with self._get_semaphore():
+            response = await self._get_client().chat.completions.create(
+                model=settings.GPT_MODEL,
+                messages=to_openai_messages(contents, system_instruction),
+                max_tokens=settings.GPT_MAX_TOKENS,
+                temperature=settings.GPT_TEMPERATURE
+            )
+        self._record_usage(variant, response.usage)
+
+        text = response.choices[0].message.content if response.choices else None
+        if not text:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Empty response from GPT"
+            )
+        return text
+
+    async def stream(self, contents: Contents, variant: str, system_instruction: Optional[str] = None) -> AsyncIterator[str]:
+        async with self._get_semaphore():
+            response = await self._get_client().chat.completions.create(
+                model=settings.GPT_MODEL,
+                messages=to_openai_messages(contents, system_instruction),
+                max_tokens=settings.GPT_MAX_TOKENS,
+                temperature=settings.GPT_TEMPERATURE,
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+            async for chunk in response:
+                # The final chunk carries usage and no choices
+                if chunk.usage is not None:
+                    self._record_usage(variant, chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
 
 async def query_gpt(prompt: str) -> str:
-    response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",  # or "gpt-4"
-        messages=[
-            {"role": "system", "content": "You are a helpful AI that explains medical prescriptions."},
-            {"role": "user", "content": prompt}
-        ]
+    """Ask GPT directly, bypassing routing (e.g. to check the API key)"""
+    provider = OpenAIProvider()
+    return await provider.generate(
+        [{"role": "user", "parts": [prompt]}],
+        variant="direct",
+        system_instruction="You are a helpful AI that explains medical prescriptions."
     )
-    return response['choices'][0]['message']['content']
\ No newline at end of file
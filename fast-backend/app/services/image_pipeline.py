@@ -0,0 +1,159 @@
+"""
+Image Pipeline Service for Rxplain Medical AI Assistant
+Bounded upload ingestion and off-loop downscaling of prescription images
+"""
+
+import asyncio
+import io
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from fastapi import HTTPException, UploadFile, status
+
+from app.config import settings
+
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Output formats Gemini accepts, by Pillow format name
+IMAGE_MIME_TYPES = {
+    "JPEG": "image/jpeg",
+    "WEBP": "image/webp",
+    "PNG": "image/png"
+}
+
+_image_executor: Optional[Executor] = None
+
+def _image_too_large() -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"Image size must be less than {settings.IMAGE_MAX_UPLOAD_MB}MB"
+    )
+
+async def read_upload(image: UploadFile, max_bytes: Optional[int] = None) -> bytes:
+    """
+    Read an uploaded image in chunks, stopping as soon as it exceeds the size limit
+    """
+    if max_bytes is None:
+        max_bytes = settings.IMAGE_MAX_UPLOAD_MB * 1024 * 1024
+
+    # The multipart parser records the size once the part is spooled
+    if image.size is not None and image.size > max_bytes:
+        raise _image_too_large()
+
+    buffer = bytearray()
+    while True:
+        chunk = await image.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        buffer.extend(chunk)
+        if len(buffer) > max_bytes:
+            raise _image_too_large()
+    return bytes(buffer)
+
+def detect_mime_type(image_data: bytes) -> str:
+    """Detect an image's MIME type from its leading bytes"""
+    if image_data[:3] == b"\xff\xd8\xff":
+        return "image/jpeg"
+    if image_data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "image/png"
+    if image_data[:4] == b"RIFF" and image_data[8:12] == b"WEBP":
+        return "image/webp"
+    if image_data[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    return "application/octet-stream"
+
+def process_image(image_data: bytes, max_dimension: int, image_format: str, quality: int) -> bytes:
+    """
+    Decode, downscale and re-encode an image without its metadata
+
+    Runs in a worker process, so it only takes and returns plain values.
+    """
+    from PIL import Image, ImageOps
+
+    image = Image.open(io.BytesIO(image_data))
+    # Let JPEG decode directly at a reduced scale when the image is much larger
+    image.draft("RGB", (max_dimension, max_dimension))
+    # Apply the EXIF orientation before the metadata is dropped
+    image = ImageOps.exif_transpose(image)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
+    # A fresh save without exif/icc_profile/info carries no metadata
+    output = io.BytesIO()
+    image.save(output, format=image_format, quality=quality, optimize=True)
+    return output.getvalue()
+
+def _get_image_executor() -> Optional[Executor]:
+    """Get the image worker pool, or None to use the event loop's thread pool"""
+    global _image_executor
+    if _image_executor is None and settings.IMAGE_PROCESS_WORKERS > 0:
+        # Spawned workers do not inherit the server's threads or event loop
+        _image_executor = ProcessPoolExecutor(
+            max_workers=settings.IMAGE_PROCESS_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _image_executor
+
+async def preprocess_image(image_data: bytes) -> bytes:
+    """
+    Downscale and re-encode an uploaded image off the event loop
+    """
+    if not settings.IMAGE_PREPROCESS_ENABLED:
+        return image_data
+
+    image_format = settings.IMAGE_FORMAT.upper()
+    if image_format not in IMAGE_MIME_TYPES:
+        image_format = "JPEG"
+
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(
+            _get_image_executor(),
+            process_image,
+            image_data,
+            settings.IMAGE_MAX_DIMENSION,
+            image_format,
+            settings.IMAGE_QUALITY
+        )
+    except BrokenProcessPool:
+        # A worker died (e.g. out of memory); start a fresh pool next time
+        shutdown_image_pool(wait=False)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Image processing is temporarily unavailable"
+        )
+    except Exception as img_error:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Error processing image: {str(img_error)}"
+        )
+
+def _warm_up_worker() -> bool:
+    """Import Pillow in a pool worker"""
+    from PIL import Image  # noqa: F401
+    return True
+
+async def warm_image_pool():
+    """Start the image worker processes before the first upload"""
+    executor = _get_image_executor() if settings.IMAGE_PREPROCESS_ENABLED else None
+    if executor is None:
+        return
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*(
+        loop.run_in_executor(executor, _warm_up_worker) for _ in range(settings.IMAGE_PROCESS_WORKERS)
+    ))
+
+def shutdown_image_pool(wait: bool = True):
+    """
+    Stop the image worker processes
+
+    Waits for them by default: a server exiting without waiting can leave
+    the spawned workers running.
+    """
+    global _image_executor
+    if _image_executor is not None:
+        _image_executor.shutdown(wait=wait)
+        _image_executor = None
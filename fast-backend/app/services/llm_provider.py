@@ -0,0 +1,400 @@
+"""
+LLM Provider Service for Rxplain Medical AI Assistant
+Common interface for upstream models, with latency-aware routing and hedging
+"""
+
+import asyncio
+import logging
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional
+
+from fastapi import status
+
+from app.config import settings
+from app.services.upstream_limits import UpstreamGuard, UpstreamRejected
+
+logger = logging.getLogger(__name__)
+
+# Contents are Gemini-style turns: {"role": "user" | "model", "parts": [...]},
+# where a part is text or an inline image {"mime_type": ..., "data": bytes}
+Contents = List[Dict[str, Any]]
+
+# Minimal request sent to each provider by the optional startup warm-up
+WARMUP_CONTENTS: Contents = [{"role": "user", "parts": ["Reply with OK."]}]
+
+# Approximate input tokens billed per image
+IMAGE_TOKEN_ESTIMATE = 258
+
+def estimate_request_tokens(contents: Contents, system_instruction: Optional[str] = None) -> int:
+    """Rough input token count of a request (about four characters per token)"""
+    characters = len(system_instruction) if system_instruction else 0
+    images = 0
+    for turn in contents:
+        for part in turn["parts"]:
+            if isinstance(part, str):
+                characters += len(part)
+            else:
+                images += 1
+    return characters // 4 + 1 + images * IMAGE_TOKEN_ESTIMATE
+
+class UpstreamUsageStats:
+    """Token usage reported by upstream models, overall, per provider and per prompt variant"""
+
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.output_tokens = 0
+        self.by_provider: Dict[str, Dict[str, int]] = {}
+        self.by_variant: Dict[str, Dict[str, int]] = {}
+
+    @staticmethod
+    def _add(totals: Dict[str, Dict[str, int]], key: str, prompt_tokens: int, cached_tokens: int, output_tokens: int):
+        entry = totals.setdefault(
+            key, {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "output_tokens": 0}
+        )
+        entry["calls"] += 1
+        entry["prompt_tokens"] += prompt_tokens
+        entry["cached_tokens"] += cached_tokens
+        entry["output_tokens"] += output_tokens
+
+    def record(self, provider: str, variant: str, prompt_tokens: int = 0, cached_tokens: int = 0, output_tokens: int = 0):
+        """Record the token counts of one upstream response"""
+        self.calls += 1
+        self.prompt_tokens += prompt_tokens
+        self.cached_tokens += cached_tokens
+        self.output_tokens += output_tokens
+        self._add(self.by_provider, provider, prompt_tokens, cached_tokens, output_tokens)
+        self._add(self.by_variant, variant, prompt_tokens, cached_tokens, output_tokens)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get token usage totals and per-call averages"""
+        return {
+            "calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "cached_tokens": self.cached_tokens,
+            "output_tokens": self.output_tokens,
+            "avg_prompt_tokens": self.prompt_tokens / self.calls if self.calls else 0.0,
+            "by_provider": self.by_provider,
+            "by_variant": self.by_variant
+        }
+
+# Global upstream usage statistics
+usage_stats = UpstreamUsageStats()
+
+def get_usage_stats() -> UpstreamUsageStats:
+    """Get the global upstream usage statistics"""
+    return usage_stats
+
+class LatencyTracker:
+    """Moving latency estimate (EWMA) and recent-sample p95 of one provider"""
+
+    def __init__(self, alpha: float = 0.2, window: int = 100):
+        self.alpha = alpha
+        self.ewma: Optional[float] = None
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.successes = 0
+        self.failures = 0
+
+    def record(self, seconds: float):
+        """Record the latency of a successful call"""
+        self.successes += 1
+        self.samples.append(seconds)
+        self.ewma = seconds if self.ewma is None else self.ewma + self.alpha * (seconds - self.ewma)
+
+    def record_failure(self):
+        """A failure counts as a slow call, so routing moves away from the provider"""
+        self.failures += 1
+        penalty = settings.LLM_FAILURE_PENALTY_SECONDS
+        self.ewma = penalty if self.ewma is None else self.ewma + self.alpha * (penalty - self.ewma)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        """Latency percentile over the recent samples, or None without samples"""
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "ewma_seconds": self.ewma,
+            "p95_seconds": self.percentile(0.95),
+            "samples": len(self.samples),
+            "successes": self.successes,
+            "failures": self.failures
+        }
+
+class LLMProvider(ABC):
+    """An upstream model behind the common generate interface"""
+
+    name: str = ""
+
+    def __init__(self, rpm_limit: int = 0, tpm_limit: int = 0):
+        self.latency = LatencyTracker()
+        self.guard = UpstreamGuard(
+            self.name,
+            rpm_limit=rpm_limit,
+            tpm_limit=tpm_limit,
+            max_queue=settings.UPSTREAM_QUEUE_MAX,
+            max_wait_seconds=settings.UPSTREAM_QUEUE_MAX_WAIT_SECONDS,
+            failure_threshold=settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+            reset_seconds=settings.CIRCUIT_BREAKER_RESET_SECONDS
+        )
+
+    @property
+    @abstractmethod
+    def model_name(self) -> str:
+        """The configured model"""
+
+    @abstractmethod
+    def is_available(self) -> bool:
+        """Whether the provider is configured (e.g. has an API key)"""
+
+    @abstractmethod
+    async def generate(self, contents: Contents, variant: str, system_instruction: Optional[str] = None) -> str:
+        """Generate a complete response for the contents"""
+
+    @abstractmethod
+    def stream(self, contents: Contents, variant: str, system_instruction: Optional[str] = None) -> AsyncIterator[str]:
+        """Generate a response, yielding text as it arrives"""
+
+    def initialize(self):
+        """Import the SDK and construct clients ahead of the first request (called at startup)"""
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = {"model": self.model_name, "available": self.is_available()}
+        stats.update(self.latency.get_stats())
+        stats["limits"] = self.guard.get_stats()
+        return stats
+
+def create_provider(name: str) -> LLMProvider:
+    """Create a provider by name"""
+    if name == "gemini":
+        from app.services.gemini_provider import GeminiProvider
+        return GeminiProvider()
+    if name in ("gpt", "openai"):
+        from app.services.gpt import OpenAIProvider
+        return OpenAIProvider()
+    if name == "fake":
+        from app.services.fake_provider import FakeProvider
+        return FakeProvider()
+    raise ValueError(f"Unknown LLM provider: {name}")
+
+class LLMRouter:
+    """
+    Routes each request to the provider with the lowest moving latency.
+
+    If the chosen provider fails, or rejects the call under its quota or an
+    open circuit, the next one is tried. With hedging enabled, a second
+    request goes to the next provider once the first has taken longer than
+    its recent p95 latency; the first response wins and the other request
+    is cancelled.
+    """
+
+    def __init__(self, providers: List[LLMProvider]):
+        self.providers = providers
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+
+    def rank(self) -> List[LLMProvider]:
+        """Available providers, fastest first; unmeasured providers are tried early"""
+        available = [provider for provider in self.providers if provider.is_available()]
+        order = {id(provider): index for index, provider in enumerate(available)}
+        return sorted(
+            available,
+            key=lambda provider: (provider.latency.ewma or 0.0, order[id(provider)])
+        )
+
+    def _admissible(self) -> List[LLMProvider]:
+        """Ranked providers whose circuit is not open"""
+        ranked = self.rank()
+        if not ranked:
+            raise RuntimeError("No LLM provider is configured")
+
+        admissible = [provider for provider in ranked if not provider.guard.breaker.is_open()]
+        if not admissible:
+            raise UpstreamRejected(
+                status.HTTP_503_SERVICE_UNAVAILABLE,
+                "The AI service is temporarily unavailable",
+                min(provider.guard.breaker.retry_after() for provider in ranked)
+            )
+        return admissible
+
+    def get_hedge_delay(self, provider: LLMProvider) -> float:
+        """How long to wait for a provider before sending a hedged request"""
+        if len(provider.latency.samples) >= settings.LLM_HEDGE_MIN_SAMPLES:
+            return provider.latency.percentile(0.95)
+        return settings.LLM_HEDGE_DEFAULT_DELAY_SECONDS
+
+    async def _timed_generate(
+        self,
+        provider: LLMProvider,
+        contents: Contents,
+        variant: str,
+        system_instruction: Optional[str]
+    ) -> str:
+        await provider.guard.acquire(estimate_request_tokens(contents, system_instruction))
+        
+        start = time.monotonic()
+        try:
+            result = await provider.generate(contents, variant, system_instruction)
+        except asyncio.CancelledError:
+            provider.guard.breaker.release()
+            raise
+        except Exception as e:
+            provider.latency.record_failure()
+            provider.guard.breaker.record_failure()
+            logger.warning("%s request failed: %s", provider.name, e)
+            raise
+        provider.latency.record(time.monotonic() - start)
+        provider.guard.breaker.record_success()
+        # Output tokens also count towards the quota
+        provider.guard.settle(len(result) // 4 + 1)
+        return result
+
+    async def generate(self, contents: Contents, variant: str, system_instruction: Optional[str] = None) -> str:
+        """Generate a response from the best available provider"""
+        remaining = self._admissible()
+        primary = remaining[0]
+        pending = {}
+
+        def launch():
+            provider = remaining.pop(0)
+            task = asyncio.ensure_future(self._timed_generate(provider, contents, variant, system_instruction))
+            pending[task] = provider
+
+        launch()
+        hedged = False
+        hedge_at = None
+        if settings.LLM_HEDGE_ENABLED and remaining:
+            hedge_at = time.monotonic() + self.get_hedge_delay(primary)
+
+        error: Optional[BaseException] = None
+        rejection: Optional[UpstreamRejected] = None
+        try:
+            while pending:
+                timeout = None
+                if hedge_at is not None:
+                    timeout = max(0.0, hedge_at - time.monotonic())
+
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # The primary is slower than usual: race the next provider
+                    hedge_at = None
+                    hedged = True
+                    self.hedges += 1
+                    launch()
+                    continue
+
+                for task in done:
+                    provider = pending.pop(task)
+                    if task.exception() is None:
+                        if hedged and provider is not primary:
+                            self.hedge_wins += 1
+                        return task.result()
+                    if isinstance(task.exception(), UpstreamRejected):
+                        if rejection is None or task.exception().retry_after < rejection.retry_after:
+                            rejection = task.exception()
+                    else:
+                        error = task.exception()
+
+                if not pending and remaining:
+                    hedge_at = None
+                    self.failovers += 1
+                    launch()
+            # A real upstream error takes precedence over quota rejections
+            raise error or rejection
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def stream(self, contents: Contents, variant: str, system_instruction: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Stream a response from the best available provider, failing over to
+        the next one only if nothing has been yielded yet
+        """
+        providers = self._admissible()
+        tokens = estimate_request_tokens(contents, system_instruction)
+
+        for index, provider in enumerate(providers):
+            last = index == len(providers) - 1
+            try:
+                await provider.guard.acquire(tokens)
+            except UpstreamRejected:
+                if last:
+                    raise
+                self.failovers += 1
+                continue
+
+            start = time.monotonic()
+            output_characters = 0
+            try:
+                async for text in provider.stream(contents, variant, system_instruction):
+                    output_characters += len(text)
+                    yield text
+            except Exception as e:
+                provider.latency.record_failure()
+                provider.guard.breaker.record_failure()
+                if output_characters or last:
+                    raise
+                logger.warning("%s stream failed, trying next provider: %s", provider.name, e)
+                self.failovers += 1
+                continue
+            except BaseException:
+                # Cancelled, or the consumer stopped iterating
+                provider.guard.breaker.release()
+                raise
+            provider.latency.record(time.monotonic() - start)
+            provider.guard.breaker.record_success()
+            provider.guard.settle(output_characters // 4 + 1)
+            return
+
+    async def start(self, warm_up: bool = False, timeout: float = 10.0):
+        """
+        Construct the available providers' clients, off the event loop and
+        concurrently; with warm_up, also send each a minimal request so
+        connections are open before the first real one
+        """
+        available = [provider for provider in self.providers if provider.is_available()]
+        if not available:
+            logger.warning("No LLM provider is configured; chat requests will fail")
+            return
+
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(None, provider.initialize) for provider in available))
+        if not warm_up:
+            return
+
+        async def warm(provider: LLMProvider):
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(provider.generate(WARMUP_CONTENTS, "warmup"), timeout)
+                logger.info("Warmed up %s in %.0f ms", provider.name, (time.perf_counter() - started) * 1000)
+            except Exception as e:
+                # The worker still starts; the first real request pays the cost instead
+                logger.warning("Warm-up request to %s failed: %r", provider.name, e)
+
+        await asyncio.gather(*(warm(provider) for provider in available))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get routing statistics"""
+        return {
+            "providers": {provider.name: provider.get_stats() for provider in self.providers},
+            "hedging_enabled": settings.LLM_HEDGE_ENABLED,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "failovers": self.failovers
+        }
+
+# Global router, created on first use so no SDK is configured at import
+_llm_router: Optional[LLMRouter] = None
+
+def get_llm_router() -> LLMRouter:
+    """Get the global LLM router"""
+    global _llm_router
+    if _llm_router is None:
+        _llm_router = LLMRouter([create_provider(name) for name in settings.LLM_PROVIDERS])
+    return _llm_router
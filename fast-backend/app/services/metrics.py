@@ -0,0 +1,227 @@
+"""
+Metrics Service for Rxplain Medical AI Assistant
+Prometheus-compatible counters, gauges and histograms rendered in the text exposition format
+"""
+
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app.services.tracing import record_stage
+
+# Latency buckets in seconds, from cache hits up to slow upstream calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Labels = Tuple[str, ...]
+Samples = List[Tuple[str, Labels, float]]
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+class Metric:
+    """A metric family; `labels(...)` returns the child for one label set"""
+
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Labels, Any] = {}
+
+    def _new_child(self) -> Any:
+        raise NotImplementedError
+
+    def labels(self, *values: str) -> Any:
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def samples(self) -> Samples:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for name, values, value in self.samples():
+            labelnames = self.labelnames + ("le",) if len(values) > len(self.labelnames) else self.labelnames
+            lines.append(f"{name}{_format_labels(labelnames, values)} {_format_value(value)}")
+        return lines
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+class Counter(Metric):
+    """Monotonically increasing count"""
+
+    type_name = "counter"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def samples(self) -> Samples:
+        return [(self.name, values, child.value) for values, child in self._children.items()]
+
+class Gauge(Counter):
+    """Value that can go up and down"""
+
+    type_name = "gauge"
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        # One slot per bucket plus +Inf, cumulated when rendered
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+class Histogram(Metric):
+    """Distribution of observed values in cumulative buckets"""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> _HistogramValue:
+        return _HistogramValue(self.buckets)
+
+    def samples(self) -> Samples:
+        samples: Samples = []
+        for values, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", values + (_format_value(bound),), cumulative))
+            samples.append((f"{self.name}_sum", values, child.sum))
+            samples.append((f"{self.name}_count", values, cumulative))
+        return samples
+
+class CallbackMetric(Metric):
+    """
+    Metric whose samples are read from `callback` at scrape time, so
+    statistics other services already keep cost nothing on the hot path
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str],
+        callback: Callable[[], Dict[Labels, float]],
+        type_name: str = "gauge"
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+        self.type_name = type_name
+
+    def samples(self) -> Samples:
+        return [(self.name, values, value) for values, value in self.callback().items()]
+
+class MetricsRegistry:
+    """Registered metrics, rendered in registration order"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+# Global registry instance
+registry = MetricsRegistry()
+
+def get_metrics_registry() -> MetricsRegistry:
+    """Get the global metrics registry"""
+    return registry
+
+STAGE_DURATION = registry.register(Histogram(
+    "rxplain_stage_duration_seconds",
+    "Time spent in each stage of a chat request",
+    ("stage",)
+))
+REQUESTS = registry.register(Counter(
+    "rxplain_requests_total",
+    "HTTP requests by route, query class and status code",
+    ("route", "query_class", "status")
+))
+REQUEST_ERRORS = registry.register(Counter(
+    "rxplain_request_errors_total",
+    "Requests that failed or were answered with a fallback response",
+    ("route", "query_class")
+))
+REQUEST_DURATION = registry.register(Histogram(
+    "rxplain_request_duration_seconds",
+    "HTTP request duration by route",
+    ("route",)
+))
+UPSTREAM_ERRORS = registry.register(Counter(
+    "rxplain_upstream_errors_total",
+    "Failed upstream model queries (answered with fallback text or an error)",
+    ("query_class",)
+))
+IN_FLIGHT = registry.register(Gauge(
+    "rxplain_requests_in_flight",
+    "HTTP requests currently being handled"
+)).labels()
+
+@contextmanager
+def track_stage(stage: str) -> Iterator[None]:
+    """Time a block as one stage of the current request (histogram and trace)"""
+    histogram = STAGE_DURATION.labels(stage)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        histogram.observe(elapsed)
+        record_stage(stage, elapsed)
@@ -0,0 +1,189 @@
+"""
+Priority Scheduler Service for Rxplain Medical AI Assistant
+Orders upstream model calls by query class when capacity is saturated
+"""
+
+import asyncio
+import itertools
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional
+
+from fastapi import status
+
+from app.config import settings
+from app.services.upstream_limits import UpstreamRejected
+
+# Recent queue waits kept per class for percentiles
+WAIT_SAMPLE_SIZE = 200
+
+class _Waiter:
+    """A request queued for an upstream slot"""
+
+    __slots__ = ("query_class", "weight", "seq", "enqueued_at", "future")
+
+    def __init__(self, query_class: str, weight: float, seq: int, future: "asyncio.Future"):
+        self.query_class = query_class
+        self.weight = weight
+        self.seq = seq
+        self.enqueued_at = time.monotonic()
+        self.future = future
+
+class ClassStats:
+    """Queue wait statistics for one query class"""
+
+    def __init__(self):
+        self.dispatched = 0
+        self.queued = 0
+        self.shed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.waits: Deque[float] = deque(maxlen=WAIT_SAMPLE_SIZE)
+
+    def record_wait(self, seconds: float):
+        self.dispatched += 1
+        self.total_wait += seconds
+        self.max_wait = max(self.max_wait, seconds)
+        self.waits.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.waits:
+            return None
+        ordered = sorted(self.waits)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "dispatched": self.dispatched,
+            "queued": self.queued,
+            "shed": self.shed,
+            "avg_wait_seconds": self.total_wait / self.dispatched if self.dispatched else 0.0,
+            "p95_wait_seconds": self.percentile(0.95),
+            "max_wait_seconds": self.max_wait
+        }
+
+class PriorityScheduler:
+    """
+    Limits concurrent upstream calls and, once they are all in use, hands
+    freed slots to the highest-weight waiting class first (FIFO within a
+    class). When the queue is full the lowest-weight, most recent waiter
+    is shed to make room for higher-weight work; waiters that are not
+    dispatched within `max_wait_seconds` are shed as well.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        weights: Dict[str, float],
+        max_queue: int = 64,
+        max_wait_seconds: float = 15.0
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.weights = weights
+        self.max_queue = max_queue
+        self.max_wait_seconds = max_wait_seconds
+        self.active = 0
+        self._queue: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._stats: Dict[str, ClassStats] = {}
+
+    def weight_of(self, query_class: str) -> float:
+        """Weight for a class; unknown classes rank with the lowest configured weight"""
+        if query_class in self.weights:
+            return self.weights[query_class]
+        return min(self.weights.values(), default=0)
+
+    def _class_stats(self, query_class: str) -> ClassStats:
+        stats = self._stats.get(query_class)
+        if stats is None:
+            stats = self._stats[query_class] = ClassStats()
+        return stats
+
+    def _shed(self, query_class: str) -> UpstreamRejected:
+        self._class_stats(query_class).shed += 1
+        return UpstreamRejected(
+            status.HTTP_429_TOO_MANY_REQUESTS,
+            "The AI service is busy with higher priority requests, please retry shortly",
+            self.max_wait_seconds
+        )
+
+    def _remove(self, waiter: _Waiter):
+        if waiter in self._queue:
+            self._queue.remove(waiter)
+            self._class_stats(waiter.query_class).queued -= 1
+
+    async def acquire(self, query_class: str):
+        """Wait for an upstream slot, or raise UpstreamRejected if shed"""
+        stats = self._class_stats(query_class)
+        if self.active < self.max_concurrency and not self._queue:
+            self.active += 1
+            stats.record_wait(0.0)
+            return
+
+        weight = self.weight_of(query_class)
+        if len(self._queue) >= self.max_queue:
+            lowest = min(self._queue, key=lambda waiter: (waiter.weight, -waiter.seq), default=None)
+            if lowest is None or lowest.weight >= weight:
+                raise self._shed(query_class)
+            # Make room by shedding lower-priority work
+            self._remove(lowest)
+            lowest.future.set_exception(self._shed(lowest.query_class))
+
+        waiter = _Waiter(query_class, weight, next(self._seq), asyncio.get_running_loop().create_future())
+        self._queue.append(waiter)
+        stats.queued += 1
+        try:
+            await asyncio.wait_for(waiter.future, self.max_wait_seconds)
+        except asyncio.TimeoutError:
+            self._remove(waiter)
+            raise self._shed(query_class)
+        except BaseException:
+            if waiter.future.done() and not waiter.future.cancelled() and waiter.future.exception() is None:
+                # Cancelled just after being handed a slot; pass it on
+                self.release()
+            else:
+                self._remove(waiter)
+            raise
+        stats.record_wait(time.monotonic() - waiter.enqueued_at)
+
+    def release(self):
+        """Free a slot, handing it straight to the highest-priority waiter"""
+        while self._queue:
+            waiter = min(self._queue, key=lambda waiter: (-waiter.weight, waiter.seq))
+            self._remove(waiter)
+            if not waiter.future.done():
+                waiter.future.set_result(None)
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def slot(self, query_class: str) -> AsyncIterator[None]:
+        """Hold an upstream slot for the duration of the block"""
+        await self.acquire(query_class)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get scheduling statistics with queue waits per class"""
+        return {
+            "active": self.active,
+            "max_concurrency": self.max_concurrency,
+            "queued": len(self._queue),
+            "weights": self.weights,
+            "classes": {name: stats.get_stats() for name, stats in self._stats.items()}
+        }
+
+# Global scheduler instance for upstream model calls
+priority_scheduler = PriorityScheduler(
+    settings.PRIORITY_MAX_CONCURRENCY,
+    settings.PRIORITY_WEIGHTS,
+    max_queue=settings.PRIORITY_QUEUE_MAX,
+    max_wait_seconds=settings.PRIORITY_QUEUE_MAX_WAIT_SECONDS
+)
+
+def get_priority_scheduler() -> PriorityScheduler:
+    """Get the global priority scheduler instance"""
+    return priority_scheduler
@@ -0,0 +1,74 @@
+"""
+Single-Flight Service for Rxplain Medical AI Assistant
+Coalesces identical concurrent upstream calls into one
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+class _Call:
+    """An in-flight upstream call and the number of requests awaiting it"""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: "asyncio.Future"):
+        self.task = task
+        self.waiters = 0
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time; concurrent callers with the
+    same key await the same result (or exception).
+
+    A caller that is cancelled stops waiting without cancelling the shared
+    call, unless it was the last caller still waiting for it.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self.upstream_calls = 0
+        self.saved_calls = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Await fn() for this key, sharing a call already in flight"""
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+            self.upstream_calls += 1
+        else:
+            self.saved_calls += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Every caller was cancelled; nobody needs the result
+                call.task.cancel()
+
+    def _forget(self, key: str, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        # Mark a failure as retrieved even if every waiter has gone
+        if not call.task.cancelled():
+            call.task.exception()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get coalescing statistics"""
+        total = self.upstream_calls + self.saved_calls
+        return {
+            "in_flight": len(self._calls),
+            "upstream_calls": self.upstream_calls,
+            "saved_calls": self.saved_calls,
+            "saved_ratio": self.saved_calls / total if total else 0.0
+        }
+
+# Global single-flight instance for Gemini calls
+single_flight = SingleFlight()
+
+def get_single_flight() -> SingleFlight:
+    """Get the global single-flight instance"""
+    return single_flight
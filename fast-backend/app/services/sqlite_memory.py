@@ -0,0 +1,358 @@
+"""
+SQLite Conversation Store for Rxplain Medical AI Assistant
+Persists conversations across restarts and shares them between workers
+"""
+
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.services.conversation_memory import (
+    ContextSummary,
+    Conversation,
+    ConversationStore,
+    Message,
+    MEDICAL_CONTEXT_FIELDS,
+    extract_context_keywords
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    model TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    message_count INTEGER NOT NULL DEFAULT 0,
+    medical_context TEXT NOT NULL DEFAULT '{}',
+    summary TEXT,
+    summarized_seq INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_conversations_updated_at ON conversations (updated_at);
+
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    conversation_id TEXT NOT NULL REFERENCES conversations (id) ON DELETE CASCADE,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    model TEXT NOT NULL,
+    is_medical_query INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_messages_conversation ON messages (conversation_id, id);
+
+CREATE TABLE IF NOT EXISTS message_keywords (
+    message_id INTEGER NOT NULL REFERENCES messages (id) ON DELETE CASCADE,
+    conversation_id TEXT NOT NULL,
+    field TEXT NOT NULL,
+    keyword TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_message_keywords_message ON message_keywords (message_id);
+CREATE INDEX IF NOT EXISTS idx_message_keywords_conversation ON message_keywords (conversation_id, field, keyword);
+"""
+
+# Columns added after the initial schema: name -> definition
+ADDED_COLUMNS = {
+    "conversations": {
+        "summary": "TEXT",
+        "summarized_seq": "INTEGER NOT NULL DEFAULT 0"
+    }
+}
+
+# Statements are kept constant so sqlite3 reuses its prepared statement cache
+INSERT_CONVERSATION = (
+    "INSERT INTO conversations (id, title, model, created_at, updated_at) VALUES (?, ?, ?, ?, ?)"
+)
+INSERT_MESSAGE = (
+    "INSERT INTO messages (conversation_id, role, content, timestamp, model, is_medical_query) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+INSERT_KEYWORD = (
+    "INSERT INTO message_keywords (message_id, conversation_id, field, keyword) VALUES (?, ?, ?, ?)"
+)
+TOUCH_CONVERSATION = (
+    "UPDATE conversations SET updated_at = ?, message_count = message_count + 1 WHERE id = ?"
+)
+TRIM_MESSAGES = (
+    "DELETE FROM messages WHERE conversation_id = ? AND id <= "
+    "(SELECT id FROM messages WHERE conversation_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?)"
+)
+SELECT_CONVERSATION = (
+    "SELECT id, title, model, created_at, updated_at, message_count, medical_context "
+    "FROM conversations WHERE id = ?"
+)
+SELECT_RECENT_MESSAGES = (
+    "SELECT role, content, timestamp, model, is_medical_query, id FROM messages "
+    "WHERE conversation_id = ? ORDER BY id DESC LIMIT ?"
+)
+SELECT_ALL_CONVERSATIONS = (
+    "SELECT id, title, model, created_at, updated_at, message_count, medical_context "
+    "FROM conversations ORDER BY updated_at DESC"
+)
+SELECT_CONTEXT_KEYWORDS = (
+    "SELECT DISTINCT field, keyword FROM message_keywords WHERE conversation_id = ?"
+)
+# Message row IDs increase within a conversation and serve as its sequence numbers
+SELECT_MESSAGES_AFTER = (
+    "SELECT role, content, timestamp, model, is_medical_query, id FROM messages "
+    "WHERE conversation_id = ? AND id > ? ORDER BY id"
+)
+SELECT_LAST_MEDICAL_TOPIC = (
+    "SELECT substr(content, 1, 100) FROM messages "
+    "WHERE conversation_id = ? AND is_medical_query = 1 ORDER BY id DESC LIMIT 1"
+)
+DELETE_OLDEST_CONVERSATIONS = (
+    "DELETE FROM conversations WHERE id IN "
+    "(SELECT id FROM conversations ORDER BY updated_at ASC LIMIT ?)"
+)
+
+class SQLiteConversationMemory(ConversationStore):
+    """
+    Conversation store backed by a SQLite database in WAL mode.
+
+    Listing and history reads are indexed queries, and each message's medical
+    keywords are stored once at insert time so the running medical context is
+    an aggregate over retained messages rather than a rescan of their content.
+    Calls block, so handlers make them through run_store_call.
+    """
+
+    blocking_io = True
+
+    def __init__(self, db_path: str = "rxplain_conversations.db"):
+        super().__init__()
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            db_path,
+            check_same_thread=False,
+            isolation_level=None,  # Transactions are managed explicitly
+            cached_statements=256
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        """Add columns missing from databases created by older versions"""
+        for table, columns in ADDED_COLUMNS.items():
+            existing = {row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+            for name, definition in columns.items():
+                if name not in existing:
+                    self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Run statements in a write transaction shared safely between workers"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _query(self, sql: str, params: tuple = ()) -> List[tuple]:
+        """Run a read-only query"""
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    @staticmethod
+    def _row_to_message(row: tuple) -> Message:
+        role, content, timestamp, model, is_medical_query, seq = row
+        return Message(
+            role=role,
+            content=content,
+            timestamp=datetime.fromtimestamp(timestamp),
+            model=model,
+            is_medical_query=bool(is_medical_query),
+            seq=seq
+        )
+
+    @staticmethod
+    def _row_to_summary(row: tuple) -> Dict[str, Any]:
+        conversation_id, title, model, created_at, updated_at, message_count, medical_context = row
+        return {
+            "id": conversation_id,
+            "title": title,
+            "message_count": message_count,
+            "created_at": datetime.fromtimestamp(created_at).isoformat(),
+            "updated_at": datetime.fromtimestamp(updated_at).isoformat(),
+            "model": model,
+            "medical_context": json.loads(medical_context)
+        }
+
+    def create_conversation(self, title: str = "New Conversation", model: str = "gemini") -> str:
+        """Create a new conversation"""
+        # Random suffix keeps IDs unique across workers sharing the database
+        conversation_id = f"conv_{int(time.time())}_{uuid.uuid4().hex[:8]}"
+        now = time.time()
+
+        with self._transaction() as conn:
+            conn.execute(INSERT_CONVERSATION, (conversation_id, title, model, now, now))
+
+            # Clean up old conversations if limit exceeded
+            count = conn.execute("SELECT COUNT(*) FROM conversations").fetchone()[0]
+            if count > self.max_conversations:
+                conn.execute(DELETE_OLDEST_CONVERSATIONS, (count - self.max_conversations,))
+
+        return conversation_id
+
+    def add_message(self, conversation_id: str, role: str, content: str, model: str, is_medical_query: bool = False) -> bool:
+        """Add a message to a conversation"""
+        keywords = extract_context_keywords(content)
+        now = time.time()
+
+        with self._transaction() as conn:
+            touched = conn.execute(TOUCH_CONVERSATION, (now, conversation_id)).rowcount
+            if not touched:
+                return False
+
+            message_id = conn.execute(
+                INSERT_MESSAGE,
+                (conversation_id, role, content, now, model, int(is_medical_query))
+            ).lastrowid
+            conn.executemany(INSERT_KEYWORD, [
+                (message_id, conversation_id, field, keyword)
+                for field, found in keywords.items()
+                for keyword in found
+            ])
+
+            # Update conversation title if it's the first user message
+            message_count = conn.execute(
+                "SELECT message_count FROM conversations WHERE id = ?", (conversation_id,)
+            ).fetchone()[0]
+            if role == "user" and message_count == 1:
+                conn.execute(
+                    "UPDATE conversations SET title = ? WHERE id = ?",
+                    (content[:50] + "..." if len(content) > 50 else content, conversation_id)
+                )
+
+            # Limit messages per conversation
+            if message_count > self.max_messages_per_conversation:
+                conn.execute(
+                    TRIM_MESSAGES,
+                    (conversation_id, conversation_id, self.max_messages_per_conversation)
+                )
+                conn.execute(
+                    "UPDATE conversations SET message_count = ? WHERE id = ?",
+                    (self.max_messages_per_conversation, conversation_id)
+                )
+
+        return True
+
+    def get_conversation(self, conversation_id: str) -> Optional[Conversation]:
+        """Get a conversation by ID"""
+        rows = self._query(SELECT_CONVERSATION, (conversation_id,))
+        if not rows:
+            return None
+
+        summary = self._row_to_summary(rows[0])
+        context_summary = self.get_context_summary(conversation_id)
+        return Conversation(
+            id=summary["id"],
+            title=summary["title"],
+            messages=self.get_conversation_history(conversation_id, self.max_messages_per_conversation),
+            created_at=datetime.fromisoformat(summary["created_at"]),
+            updated_at=datetime.fromisoformat(summary["updated_at"]),
+            model=summary["model"],
+            medical_context=summary["medical_context"],
+            summary=context_summary.text
+        )
+
+    def get_conversation_history(self, conversation_id: str, max_messages: int = 10) -> List[Message]:
+        """Get recent conversation history for context"""
+        rows = self._query(SELECT_RECENT_MESSAGES, (conversation_id, max_messages))
+        return [self._row_to_message(row) for row in reversed(rows)]
+
+    def get_conversation_summary(self, conversation_id: str) -> Dict[str, Any]:
+        """Get a summary of the conversation"""
+        rows = self._query(SELECT_CONVERSATION, (conversation_id,))
+        return self._row_to_summary(rows[0]) if rows else {}
+
+    def get_medical_context(self, conversation_id: str) -> Dict[str, Any]:
+        """Get the running medical context over the conversation's retained messages"""
+        if not self._query("SELECT 1 FROM conversations WHERE id = ?", (conversation_id,)):
+            return {}
+
+        context: Dict[str, Any] = {field: [] for field in MEDICAL_CONTEXT_FIELDS.values()}
+        for field, keyword in self._query(SELECT_CONTEXT_KEYWORDS, (conversation_id,)):
+            context[field].append(keyword)
+
+        last_topic = self._query(SELECT_LAST_MEDICAL_TOPIC, (conversation_id,))
+        context["last_medical_topic"] = last_topic[0][0] if last_topic else None
+        return context
+
+    def update_medical_context(self, conversation_id: str, context: Dict[str, Any]) -> bool:
+        """Update medical context for a conversation"""
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT medical_context FROM conversations WHERE id = ?", (conversation_id,)
+            ).fetchone()
+            if not row:
+                return False
+
+            medical_context = json.loads(row[0])
+            medical_context.update(context)
+            conn.execute(
+                "UPDATE conversations SET medical_context = ?, updated_at = ? WHERE id = ?",
+                (json.dumps(medical_context), time.time(), conversation_id)
+            )
+        return True
+
+    def get_messages_after(self, conversation_id: str, after_seq: int) -> List[Message]:
+        """Get retained messages with a sequence number above `after_seq`, oldest first"""
+        rows = self._query(SELECT_MESSAGES_AFTER, (conversation_id, after_seq))
+        return [self._row_to_message(row) for row in rows]
+
+    def get_context_summary(self, conversation_id: str) -> ContextSummary:
+        """Get the rolling summary of older turns"""
+        rows = self._query(
+            "SELECT summary, summarized_seq FROM conversations WHERE id = ?", (conversation_id,)
+        )
+        if not rows:
+            return ContextSummary(None, 0)
+        return ContextSummary(rows[0][0], rows[0][1])
+
+    def update_context_summary(self, conversation_id: str, summary: str, summarized_seq: int) -> bool:
+        """Store a new rolling summary covering messages up to sequence number `summarized_seq`"""
+        with self._transaction() as conn:
+            updated = conn.execute(
+                "UPDATE conversations SET summary = ?, summarized_seq = ? WHERE id = ?",
+                (summary, summarized_seq, conversation_id)
+            ).rowcount
+        return updated > 0
+
+    def get_all_conversations(self) -> List[Dict[str, Any]]:
+        """Get all conversations for the sidebar, most recent first"""
+        return [self._row_to_summary(row) for row in self._query(SELECT_ALL_CONVERSATIONS)]
+
+    def delete_conversation(self, conversation_id: str) -> bool:
+        """Delete a conversation"""
+        with self._transaction() as conn:
+            deleted = conn.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,)).rowcount
+        return deleted > 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get storage statistics"""
+        conversations = self._query("SELECT COUNT(*) FROM conversations")[0][0]
+        messages = self._query("SELECT COUNT(*) FROM messages")[0][0]
+        return {
+            "backend": "sqlite",
+            "conversations": conversations,
+            "messages": messages,
+            "db_path": self.db_path
+        }
+
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            self._conn.close()
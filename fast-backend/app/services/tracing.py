@@ -0,0 +1,122 @@
+"""
+Tracing Service for Rxplain Medical AI Assistant
+Per-request stage timings and sampled profiler reports
+"""
+
+import cProfile
+import io
+import marshal
+import pstats
+import time
+import uuid
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from app.config import settings
+
+# Functions listed in the text report of a profile
+PROFILE_REPORT_LINES = 60
+
+class RequestTrace:
+    """Stage durations and annotations of one request"""
+
+    __slots__ = ("start", "stages", "annotations")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        # Stage name -> total seconds; repeated stages accumulate
+        self.stages: Dict[str, float] = {}
+        self.annotations: Dict[str, Any] = {}
+
+    def add_stage(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    def server_timing(self) -> str:
+        """Stages as a Server-Timing header value (durations in milliseconds)"""
+        entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.stages.items()]
+        entries.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(entries)
+
+# Trace of the request being handled; tasks spawned by it share the trace
+_current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("rxplain_request_trace", default=None)
+
+def start_trace() -> RequestTrace:
+    """Start tracing the current request"""
+    trace = RequestTrace()
+    _current_trace.set(trace)
+    return trace
+
+def get_current_trace() -> Optional[RequestTrace]:
+    """Trace of the current request, if it is being traced"""
+    return _current_trace.get()
+
+def record_stage(stage: str, seconds: float):
+    """Add a stage duration to the current request's trace"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_stage(stage, seconds)
+
+def annotate_trace(**annotations: Any):
+    """Attach fields (e.g. the conversation id) to the current request's log line"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.annotations.update(annotations)
+
+class ProfileReport:
+    """A stored cProfile capture of one request"""
+
+    def __init__(self, profile: cProfile.Profile, route: str, duration: float, annotations: Dict[str, Any]):
+        self.id = uuid.uuid4().hex[:12]
+        self.created_at = time.time()
+        self.route = route
+        self.duration = duration
+        self.annotations = annotations
+        profile.create_stats()
+        # Same format as Profile.dump_stats, loadable with pstats or snakeviz
+        self.data = marshal.dumps(profile.stats)
+        stream = io.StringIO()
+        pstats.Stats(profile, stream=stream).sort_stats("cumulative").print_stats(PROFILE_REPORT_LINES)
+        self.text = stream.getvalue()
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "created_at": self.created_at,
+            "route": self.route,
+            "duration_ms": round(self.duration * 1000, 1),
+            **self.annotations
+        }
+
+class ProfileStore:
+    """
+    The most recent profile reports. Only one request is profiled at a
+    time, since cProfile hooks the whole thread: the report of an async
+    request also covers other requests that ran while it was awaiting.
+    """
+
+    def __init__(self, max_reports: int = 20):
+        self.max_reports = max_reports
+        self._reports: "OrderedDict[str, ProfileReport]" = OrderedDict()
+        self.active = False
+
+    def add(self, report: ProfileReport):
+        self._reports[report.id] = report
+        while len(self._reports) > self.max_reports:
+            self._reports.popitem(last=False)
+
+    def get(self, report_id: str) -> Optional[ProfileReport]:
+        return self._reports.get(report_id)
+
+    def list(self) -> List[Dict[str, Any]]:
+        return [report.summary() for report in reversed(self._reports.values())]
+
+# Global profile store instance
+profile_store = ProfileStore(settings.PROFILING_MAX_REPORTS)
+
+def get_profile_store() -> ProfileStore:
+    """Get the global profile store instance"""
+    return profile_store
@@ -0,0 +1,156 @@
+"""
+Traffic Recorder Service for Rxplain Medical AI Assistant
+Opt-in capture of sanitized chat request shapes for replay (see benchmarks/replay.py)
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+TRACE_VERSION = 1
+
+# Seconds the writer waits for records before flushing what it has written
+FLUSH_INTERVAL_SECONDS = 1.0
+
+_STOP = object()
+
+def conversation_key(conversation_id: str) -> str:
+    """Opaque key linking the turns of a conversation without storing its ID"""
+    return hashlib.blake2b(conversation_id.encode("utf-8"), digest_size=6).hexdigest()
+
+class TrafficRecorder:
+    """
+    Appends one JSON line per chat request to a gzip trace.
+
+    Only the request's shape is kept: prompt length, query class, upload
+    size, the conversation (as an opaque key) and the turn's position in it,
+    the arrival time and the gap since the previous recorded request. No
+    prompt text, file names or client addresses are written.
+
+    Sampling is per conversation, so sampled conversations keep all their
+    turns. Records are written by a background thread; when its queue is
+    full, records are dropped rather than slowing requests down.
+    """
+
+    def __init__(self, path: str, sample_rate: float = 1.0, max_queue: int = 10000):
+        # One trace per worker process; gzip streams from several writers cannot be interleaved
+        self.path = path.format(pid=os.getpid())
+        self.sample_rate = sample_rate
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._last_arrival: Optional[float] = None
+        self.recorded = 0
+        self.dropped = 0
+        self.write_errors = 0
+
+    def _sampled(self, key: str) -> bool:
+        return int(key, 16) / float(1 << 48) < self.sample_rate
+
+    def record(
+        self,
+        endpoint: str,
+        arrival: float,
+        prompt_chars: int,
+        query_class: str,
+        image_bytes: int,
+        conversation_id: str,
+        position: int
+    ):
+        """Queue a request's shape; `arrival` is its epoch time and `position` the messages before it"""
+        key = conversation_key(conversation_id)
+        if not self._sampled(key):
+            return
+
+        with self._lock:
+            interarrival = 0.0 if self._last_arrival is None else max(0.0, arrival - self._last_arrival)
+            self._last_arrival = max(arrival, self._last_arrival or arrival)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._write_loop, name="traffic-recorder", daemon=True)
+                self._thread.start()
+
+        try:
+            self._queue.put_nowait({
+                "t": round(arrival, 3),
+                "interarrival": round(interarrival, 3),
+                "endpoint": endpoint,
+                "prompt_chars": prompt_chars,
+                "query_class": query_class,
+                "image_bytes": image_bytes,
+                "conversation": key,
+                "position": position
+            })
+            self.recorded += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def _write_loop(self):
+        directory = os.path.dirname(self.path)
+        try:
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            trace = gzip.open(self.path, "at", encoding="utf-8")
+        except OSError as e:
+            logger.error("Cannot open traffic trace %s: %s", self.path, e)
+            self.write_errors += 1
+            return
+
+        with trace:
+            # Appending adds a gzip member; each recording session starts with a header line
+            trace.write(json.dumps({"trace_version": TRACE_VERSION, "started": datetime.now().isoformat()}) + "\n")
+            while True:
+                try:
+                    record = self._queue.get(timeout=FLUSH_INTERVAL_SECONDS)
+                except queue.Empty:
+                    trace.flush()
+                    continue
+                if record is _STOP:
+                    return
+                try:
+                    trace.write(json.dumps(record) + "\n")
+                except OSError as e:
+                    self.write_errors += 1
+                    logger.warning("Traffic trace write failed: %s", e)
+
+    def close(self, timeout: float = 5.0):
+        """Write out queued records and close the trace"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            try:
+                self._queue.put(_STOP, timeout=timeout)
+            except queue.Full:
+                logger.warning("Traffic trace queue did not drain; closing without the remaining records")
+                return
+            thread.join(timeout)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": settings.TRAFFIC_RECORDING_ENABLED,
+            "path": self.path,
+            "sample_rate": self.sample_rate,
+            "recorded": self.recorded,
+            "dropped": self.dropped,
+            "queued": self._queue.qsize(),
+            "write_errors": self.write_errors
+        }
+
+# Global traffic recorder instance
+traffic_recorder = TrafficRecorder(
+    settings.TRAFFIC_RECORDING_PATH,
+    sample_rate=settings.TRAFFIC_RECORDING_SAMPLE_RATE
+)
+
+def get_traffic_recorder() -> TrafficRecorder:
+    """Get the global traffic recorder"""
+    return traffic_recorder
@@ -0,0 +1,214 @@
+"""
+Upstream Limits Service for Rxplain Medical AI Assistant
+Client-side quota limiting and circuit breaking for upstream model calls
+"""
+
+import asyncio
+import time
+from typing import Any, Dict
+
+from fastapi import status
+
+class UpstreamRejected(Exception):
+    """A call was not admitted upstream; the client should retry after a delay"""
+
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+class TokenBucket:
+    """Token bucket refilled continuously at a per-minute rate"""
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` tokens are available (0 if they are now)"""
+        self._refill()
+        # A request larger than the whole bucket only needs a full bucket
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        """Take tokens; the balance may go negative to settle actual usage"""
+        self._refill()
+        self.tokens -= amount
+
+class CircuitBreaker:
+    """
+    Opens after consecutive failures, rejecting calls until `reset_seconds`
+    have passed. It then lets a single probe call through (half-open): a
+    success closes it again, a failure reopens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.opens = 0
+        self._probe_in_flight = False
+
+    def is_open(self) -> bool:
+        """Whether calls are currently being rejected outright"""
+        if self.state == self.OPEN:
+            return time.monotonic() < self.opened_at + self.reset_seconds
+        return self.state == self.HALF_OPEN and self._probe_in_flight
+
+    def allow(self) -> bool:
+        """Admit a call, claiming the probe slot when half-open"""
+        if self.failure_threshold <= 0:
+            return True
+        if self.state == self.OPEN:
+            if time.monotonic() < self.opened_at + self.reset_seconds:
+                return False
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN:
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+        return True
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self._probe_in_flight = False
+        if self.state == self.HALF_OPEN or (
+            self.failure_threshold > 0 and self.consecutive_failures >= self.failure_threshold
+        ):
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self.opens += 1
+
+    def release(self):
+        """Give up the probe slot without an outcome (e.g. the call was cancelled)"""
+        self._probe_in_flight = False
+
+    def retry_after(self) -> float:
+        if self.state == self.OPEN:
+            return max(1.0, self.opened_at + self.reset_seconds - time.monotonic())
+        return 1.0
+
+class UpstreamGuard:
+    """
+    Admission control for one upstream provider: requests-per-minute and
+    tokens-per-minute buckets sized to the provider quota, a bounded wait
+    queue, and a circuit breaker.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rpm_limit: int = 0,
+        tpm_limit: int = 0,
+        max_queue: int = 32,
+        max_wait_seconds: float = 10.0,
+        failure_threshold: int = 5,
+        reset_seconds: float = 30.0
+    ):
+        self.name = name
+        self.requests = TokenBucket(rpm_limit) if rpm_limit > 0 else None
+        self.tokens = TokenBucket(tpm_limit) if tpm_limit > 0 else None
+        self.max_queue = max_queue
+        self.max_wait_seconds = max_wait_seconds
+        self.breaker = CircuitBreaker(failure_threshold, reset_seconds)
+        self.queued = 0
+        self.admitted = 0
+        self.rejected_rate_limited = 0
+        self.rejected_circuit_open = 0
+
+    def _wait_time(self, tokens: int) -> float:
+        wait = 0.0
+        if self.requests:
+            wait = self.requests.wait_time(1)
+        if self.tokens:
+            wait = max(wait, self.tokens.wait_time(tokens))
+        return wait
+
+    def _rate_limited(self, retry_after: float) -> UpstreamRejected:
+        self.rejected_rate_limited += 1
+        return UpstreamRejected(
+            status.HTTP_429_TOO_MANY_REQUESTS,
+            f"{self.name} is at its request quota, please retry shortly",
+            retry_after
+        )
+
+    async def acquire(self, tokens: int):
+        """
+        Wait for quota to admit a call of about `tokens` tokens, or raise
+        UpstreamRejected if the circuit is open or the wait would exceed the
+        queue bounds
+        """
+        if not self.breaker.allow():
+            self.rejected_circuit_open += 1
+            raise UpstreamRejected(
+                status.HTTP_503_SERVICE_UNAVAILABLE,
+                f"{self.name} is temporarily unavailable",
+                self.breaker.retry_after()
+            )
+
+        try:
+            wait = self._wait_time(tokens)
+            if wait > 0:
+                if self.queued >= self.max_queue or wait > self.max_wait_seconds:
+                    raise self._rate_limited(wait)
+
+                deadline = time.monotonic() + self.max_wait_seconds
+                self.queued += 1
+                try:
+                    while wait > 0:
+                        if time.monotonic() + wait > deadline:
+                            raise self._rate_limited(wait)
+                        await asyncio.sleep(wait)
+                        wait = self._wait_time(tokens)
+                finally:
+                    self.queued -= 1
+
+            if self.requests:
+                self.requests.consume(1)
+            if self.tokens:
+                self.tokens.consume(tokens)
+            self.admitted += 1
+        except BaseException:
+            self.breaker.release()
+            raise
+
+    def settle(self, extra_tokens: int):
+        """Charge tokens that were not known at admission (e.g. the output)"""
+        if self.tokens and extra_tokens > 0:
+            self.tokens.consume(extra_tokens)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get admission statistics"""
+        return {
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.consecutive_failures,
+            "circuit_opens": self.breaker.opens,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "rejected_rate_limited": self.rejected_rate_limited,
+            "rejected_circuit_open": self.rejected_circuit_open,
+            "requests_available": self.requests.tokens if self.requests else None,
+            "tokens_available": self.tokens.tokens if self.tokens else None
+        }
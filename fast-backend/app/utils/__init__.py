@@ -4,22 +4,31 @@ Utility modules for Rxplain Medical AI Assistant
 
 from .medical_prompts import (
     classify_medical_query,
+    extract_medical_features,
     get_appropriate_disclaimer,
     get_safety_warnings,
     format_medical_response,
     MEDICAL_SAFETY_GUIDELINES,
     MEDICAL_QUERY_CATEGORIES,
     SAFETY_WARNINGS,
-    MEDICAL_DISCLAIMERS
+    MEDICAL_DISCLAIMERS,
+    MEDICAL_KEYWORDS,
+    MEDICAL_KEYWORD_MATCHER
 )
+from .keyword_matcher import KeywordMatcher, matches_any
 
 __all__ = [
     'classify_medical_query',
+    'extract_medical_features',
     'get_appropriate_disclaimer', 
     'get_safety_warnings',
     'format_medical_response',
     'MEDICAL_SAFETY_GUIDELINES',
     'MEDICAL_QUERY_CATEGORIES',
     'SAFETY_WARNINGS',
-    'MEDICAL_DISCLAIMERS'
+    'MEDICAL_DISCLAIMERS',
+    'MEDICAL_KEYWORDS',
+    'MEDICAL_KEYWORD_MATCHER',
+    'KeywordMatcher',
+    'matches_any'
 ] 
\ No newline at end of file
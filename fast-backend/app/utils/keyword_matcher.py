@@ -0,0 +1,95 @@
+"""
+Keyword Matcher for Rxplain Medical AI Assistant
+Single-pass multi-keyword matching used by the medical query classifiers
+"""
+
+from typing import Dict, FrozenSet, Iterable, List, Set, Tuple
+
+_NO_FRAGMENTS: FrozenSet[str] = frozenset()
+
+class KeywordMatcher:
+    """
+    Finds every keyword that occurs in a text with one pass over its words.
+
+    Matching has the same semantics as `keyword.lower() in text.lower()` for
+    each keyword, including keywords that overlap or contain one another
+    (e.g. "pain" inside "chest pain", or "heart" and "heart disease").
+
+    A keyword without whitespace can only occur inside one whitespace-separated
+    word of the text, so the text is split once and each distinct word is
+    resolved to the keyword fragments it contains. That resolution is cached
+    per word, so recurring words cost one dict lookup and the scan does not
+    grow with the vocabulary. Keywords spanning whitespace are confirmed with
+    a substring check, and only once all of their words have been found.
+    """
+
+    def __init__(self, keywords: Iterable[str], max_cached_words: int = 50_000):
+        vocabulary = {keyword.lower() for keyword in keywords if keyword}
+        self.keywords: FrozenSet[str] = frozenset(vocabulary)
+        self.max_cached_words = max_cached_words
+
+        # Keywords within one word, and phrases indexed by their longest word
+        self._words: FrozenSet[str] = frozenset(keyword for keyword in vocabulary if keyword.split() == [keyword])
+        self._phrases: Dict[str, List[Tuple[str, FrozenSet[str]]]] = {}
+        self._blank_phrases: List[str] = []  # Whitespace-only keywords
+        fragments: Set[str] = set(self._words)
+        for phrase in vocabulary - self._words:
+            words = phrase.split()
+            if not words:
+                self._blank_phrases.append(phrase)
+                continue
+            self._phrases.setdefault(max(words, key=len), []).append((phrase, frozenset(words)))
+            fragments.update(words)
+
+        self._fragments: FrozenSet[str] = frozenset(fragments)
+        self._fragment_lengths: List[int] = sorted({len(fragment) for fragment in fragments})
+        self._word_cache: Dict[str, FrozenSet[str]] = {}
+
+    def _fragments_in(self, word: str) -> FrozenSet[str]:
+        """Keyword fragments that occur in one word of the text"""
+        fragments = self._fragments
+        probes = sum(len(word) - length + 1 for length in self._fragment_lengths if length <= len(word))
+        if probes > len(fragments):
+            # Long words: fewer checks going through the vocabulary instead
+            found = frozenset(fragment for fragment in fragments if fragment in word)
+        else:
+            found = frozenset(
+                word[start:start + length]
+                for length in self._fragment_lengths
+                for start in range(len(word) - length + 1)
+                if word[start:start + length] in fragments
+            )
+        return found or _NO_FRAGMENTS
+
+    def scan(self, text: str) -> FrozenSet[str]:
+        """Return the set of keywords that occur anywhere in the text"""
+        if not self.keywords or not text:
+            return frozenset()
+
+        lowered = text.lower()
+        cache = self._word_cache
+        found: Set[str] = set()
+        for word in set(lowered.split()):
+            fragments = cache.get(word)
+            if fragments is None:
+                fragments = self._fragments_in(word)
+                if len(cache) >= self.max_cached_words:
+                    cache.clear()
+                cache[word] = fragments
+            if fragments:
+                found |= fragments
+
+        matches = found & self._words
+        if self._phrases:
+            for anchor in found.intersection(self._phrases):
+                for phrase, words in self._phrases[anchor]:
+                    if words <= found and phrase in lowered:
+                        matches.add(phrase)
+        for phrase in self._blank_phrases:
+            if phrase in lowered:
+                matches.add(phrase)
+        return frozenset(matches)
+
+def matches_any(features: FrozenSet[str], keywords: FrozenSet[str]) -> bool:
+    """Check whether any of the keywords were found in a scanned text"""
+    return not features.isdisjoint(keywords)
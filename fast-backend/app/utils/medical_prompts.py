@@ -3,6 +3,10 @@ Medical Prompt Templates and Safety Guidelines for Rxplain
 Comprehensive medical assistant prompts and safety protocols
 """
 
+from typing import FrozenSet, Optional
+
+from .keyword_matcher import KeywordMatcher, matches_any
+
 # Medical Safety Guidelines
 MEDICAL_SAFETY_GUIDELINES = {
     "never_do": [
@@ -116,7 +120,8 @@ SAFETY_WARNINGS = {
     "interactions": "⚠️ **Interaction Warning**: Always inform your healthcare provider about all medications, supplements, and substances you're taking to avoid harmful interactions.",
     "pregnancy": "⚠️ **Pregnancy/Breastfeeding**: Consult your healthcare provider before taking any medication during pregnancy or while breastfeeding.",
     "discontinuation": "⚠️ **Discontinuation Warning**: Never stop taking prescribed medications without consulting your healthcare provider, as this can be dangerous.",
-    "emergency": "🚨 **EMERGENCY**: If you're experiencing a medical emergency, call emergency services immediately. Do not rely on AI assistants for emergency medical care."
+    "emergency": "🚨 **EMERGENCY**: If you're experiencing a medical emergency, call emergency services immediately. Do not rely on AI assistants for emergency medical care.",
+    "image_analysis": "⚠️ **Image Analysis Disclaimer**: This analysis is for educational purposes only. Always consult your healthcare provider for accurate medical information and follow their specific instructions."
 }
 
 # Medical Response Templates
@@ -199,26 +204,85 @@ MEDICAL_KEYWORDS = {
     ]
 }
 
-def classify_medical_query(query: str) -> str:
+# Keywords that mark a query as medical-related
+MEDICAL_VALIDATION_KEYWORDS = [
+    "medication", "medicine", "drug", "health", "symptom", "treatment",
+    "side effect", "dosage", "prescription", "doctor", "nurse", "hospital",
+    "pain", "fever", "allergy", "reaction", "blood", "heart", "diabetes",
+    "blood pressure", "cholesterol", "antibiotic", "vitamin", "supplement"
+]
+
+# Safety filters for urgent or dangerous situations
+MEDICAL_SAFETY_FILTERS = [
+    "emergency", "urgent", "immediate", "severe", "serious", "dangerous",
+    "overdose", "allergic", "reaction", "chest pain", "difficulty breathing",
+    "swelling", "rash", "fever", "bleeding", "dizziness", "fainting"
+]
+
+# Query keywords that trigger each safety warning
+WARNING_TRIGGERS = {
+    "side_effects": ["side effect", "reaction", "allergy"],
+    "dosage": ["dosage", "dose", "how much", "frequency"],
+    "interactions": ["interaction", "mix", "combine", "alcohol"],
+    "pregnancy": ["pregnancy", "breastfeeding", "baby"],
+    "discontinuation": ["stop", "discontinue", "quit"],
+    "emergency": ["emergency", "urgent", "immediate", "severe"]
+}
+
+# Keywords tracked in a conversation's medical context
+MEDICAL_CONTEXT_KEYWORDS = {
+    "medications": ["medication", "medicine", "drug", "pill", "tablet", "metformin", "aspirin", "ibuprofen"],
+    "symptoms": ["symptom", "pain", "fever", "headache", "nausea", "dizziness"],
+    "conditions": ["diabetes", "hypertension", "heart disease", "asthma", "arthritis"],
+    "warnings": ["side effect", "allergy", "interaction", "warning", "precaution"]
+}
+
+def _keyword_set(keywords) -> FrozenSet[str]:
+    return frozenset(keyword.lower() for keyword in keywords)
+
+# Precomputed keyword sets consumed by the classifiers
+MEDICAL_KEYWORD_SETS = {category: _keyword_set(words) for category, words in MEDICAL_KEYWORDS.items()}
+MEDICAL_VALIDATION_KEYWORD_SET = _keyword_set(MEDICAL_VALIDATION_KEYWORDS)
+WARNING_TRIGGER_SETS = {warning: _keyword_set(words) for warning, words in WARNING_TRIGGERS.items()}
+MEDICAL_CONTEXT_KEYWORD_SETS = {category: _keyword_set(words) for category, words in MEDICAL_CONTEXT_KEYWORDS.items()}
+
+# One matcher over every keyword list, so a text is scanned once and the
+# resulting feature set is shared by all classifiers
+MEDICAL_KEYWORD_MATCHER = KeywordMatcher(
+    [keyword for words in MEDICAL_KEYWORDS.values() for keyword in words]
+    + MEDICAL_VALIDATION_KEYWORDS
+    + MEDICAL_SAFETY_FILTERS
+    + [keyword for words in WARNING_TRIGGERS.values() for keyword in words]
+    + [keyword for words in MEDICAL_CONTEXT_KEYWORDS.values() for keyword in words]
+)
+
+def extract_medical_features(text: str) -> FrozenSet[str]:
+    """
+    Scan text once and return the set of medical keywords it contains
+    """
+    return MEDICAL_KEYWORD_MATCHER.scan(text)
+
+def classify_medical_query(query: str, features: Optional[FrozenSet[str]] = None) -> str:
     """
     Classify a medical query into categories
     """
-    query_lower = query.lower()
+    if features is None:
+        features = extract_medical_features(query)
     
     # Check for emergency keywords first
-    if any(keyword in query_lower for keyword in MEDICAL_KEYWORDS["emergency"]):
+    if matches_any(features, MEDICAL_KEYWORD_SETS["emergency"]):
         return "emergency"
     
     # Check for medication keywords
-    if any(keyword in query_lower for keyword in MEDICAL_KEYWORDS["medications"]):
+    if matches_any(features, MEDICAL_KEYWORD_SETS["medications"]):
         return "medication"
     
     # Check for symptom keywords
-    if any(keyword in query_lower for keyword in MEDICAL_KEYWORDS["symptoms"]):
+    if matches_any(features, MEDICAL_KEYWORD_SETS["symptoms"]):
         return "symptom"
     
     # Check for condition keywords
-    if any(keyword in query_lower for keyword in MEDICAL_KEYWORDS["conditions"]):
+    if matches_any(features, MEDICAL_KEYWORD_SETS["conditions"]):
         return "condition"
     
     # Default to general health
@@ -237,32 +301,18 @@ def get_appropriate_disclaimer(query_type: str) -> str:
     else:
         return MEDICAL_DISCLAIMERS["standard"]
 
-def get_safety_warnings(query: str) -> list:
+def get_safety_warnings(query: str, features: Optional[FrozenSet[str]] = None) -> list:
     """
     Get appropriate safety warnings based on query content
     """
-    warnings = []
-    query_lower = query.lower()
-    
-    if any(word in query_lower for word in ["side effect", "reaction", "allergy"]):
-        warnings.append(SAFETY_WARNINGS["side_effects"])
-    
-    if any(word in query_lower for word in ["dosage", "dose", "how much", "frequency"]):
-        warnings.append(SAFETY_WARNINGS["dosage"])
+    if features is None:
+        features = extract_medical_features(query)
     
-    if any(word in query_lower for word in ["interaction", "mix", "combine", "alcohol"]):
-        warnings.append(SAFETY_WARNINGS["interactions"])
-    
-    if any(word in query_lower for word in ["pregnancy", "breastfeeding", "baby"]):
-        warnings.append(SAFETY_WARNINGS["pregnancy"])
-    
-    if any(word in query_lower for word in ["stop", "discontinue", "quit"]):
-        warnings.append(SAFETY_WARNINGS["discontinuation"])
-    
-    if any(word in query_lower for word in ["emergency", "urgent", "immediate", "severe"]):
-        warnings.append(SAFETY_WARNINGS["emergency"])
-    
-    return warnings
+    return [
+        SAFETY_WARNINGS[warning]
+        for warning, triggers in WARNING_TRIGGER_SETS.items()
+        if matches_any(features, triggers)
+    ]
 
 def format_medical_response(response: str, query_type: str, warnings: list = None) -> str:
     """
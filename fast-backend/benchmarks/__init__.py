@@ -0,0 +1,4 @@
+"""
+Micro-benchmarks for Rxplain Medical AI Assistant
+CPU-bound hot paths, run offline against synthetic corpora (see README)
+"""
@@ -0,0 +1,74 @@
+"""
+Run the benchmarks: python -m benchmarks [--filter NAME] [--save-baseline]
+
+Compares each result with benchmarks/baseline.json and exits with status 1
+if any case regressed by more than --threshold.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+from pathlib import Path
+
+# Offline: the stub model answers every upstream call
+os.environ.setdefault("GEMINI_API_KEY", "")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "False")
+
+from benchmarks.cases import CASES
+from benchmarks.harness import compare, run_case
+
+DEFAULT_BASELINE = Path(__file__).with_name("baseline.json")
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Rxplain backend micro-benchmarks")
+    parser.add_argument("--filter", default="", help="only run cases whose name contains this")
+    parser.add_argument("--min-time", type=float, default=1.0, help="seconds of timing per case")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.3, help="tolerated regression (0.3 = 30%%)")
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text()).get("results", {})
+
+    results = {}
+    regressed = False
+    print(f"{'case':<36} {'ops/sec':>14} {'vs base':>8} {'peak KB':>10} {'retained B/op':>14}")
+    for case in CASES:
+        if args.filter not in case.name:
+            continue
+        result = run_case(case, min_time=args.min_time)
+        results[case.name] = result.to_dict()
+
+        base = baseline.get(case.name)
+        change = f"{result.ops_per_sec / base['ops_per_sec'] - 1:+.0%}" if base else "new"
+        print(
+            f"{case.name:<36} {result.ops_per_sec:>14,.1f} {change:>8} "
+            f"{result.peak_bytes / 1024:>10,.1f} {result.retained_bytes_per_op:>14,.1f}"
+        )
+        for regression in compare(result, base, args.threshold):
+            regressed = True
+            print(f"  REGRESSION: {regression}")
+
+    if args.save_baseline:
+        saved = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+        saved_results = saved.get("results", {})
+        saved_results.update(results)
+        args.baseline.write_text(json.dumps({
+            "machine": {
+                "python": platform.python_version(),
+                "implementation": platform.python_implementation(),
+                "processor": platform.machine()
+            },
+            "results": dict(sorted(saved_results.items()))
+        }, indent=2) + "\n")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    return 1 if regressed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+"""
+Benchmark cases for the backend's CPU-bound hot paths
+"""
+
+import asyncio
+import itertools
+from typing import AsyncIterator, List, Optional
+
+from app.services import llm_provider
+from app.services.conversation_memory import ConversationMemory, create_context_prompt, extract_medical_context
+from app.services.gemini import add_safety_warnings, create_medical_prompt, query_gemini, validate_medical_query
+from app.services.llm_provider import Contents, LLMProvider, LLMRouter
+from app.utils.keyword_matcher import KeywordMatcher
+from app.utils.medical_prompts import MEDICAL_KEYWORD_MATCHER, classify_medical_query
+
+from benchmarks.corpus import make_document, make_messages, make_queries, make_responses, make_vocabulary
+from benchmarks.harness import Case, Runner
+
+CORPUS_SIZE = 512
+
+def _cycle_calls(fn, inputs: List) -> Runner:
+    """run(n) calling fn on the next n inputs"""
+    pool = itertools.cycle(inputs)
+
+    def run(n: int):
+        for _ in range(n):
+            fn(next(pool))
+    return run
+
+def bench_create_medical_prompt() -> Runner:
+    return _cycle_calls(create_medical_prompt, make_queries(CORPUS_SIZE))
+
+def bench_create_context_prompt() -> Runner:
+    history = make_messages(6)
+    summary = "The patient takes metformin for type 2 diabetes and asked about side effects."
+    return _cycle_calls(lambda query: create_context_prompt(history, query, summary=summary), make_queries(CORPUS_SIZE))
+
+def bench_add_safety_warnings() -> Runner:
+    pairs = list(zip(make_responses(CORPUS_SIZE), make_queries(CORPUS_SIZE)))
+    return _cycle_calls(lambda pair: add_safety_warnings(pair[0], pair[1]), pairs)
+
+def bench_validate_medical_query() -> Runner:
+    return _cycle_calls(validate_medical_query, make_queries(CORPUS_SIZE))
+
+def bench_classify_medical_query() -> Runner:
+    return _cycle_calls(classify_medical_query, make_queries(CORPUS_SIZE))
+
+def bench_extract_medical_context(messages: int):
+    def setup() -> Runner:
+        history = make_messages(messages)
+
+        def run(n: int):
+            for _ in range(n):
+                extract_medical_context(history)
+        return run
+    return setup
+
+def _substring_scan(keywords: List[str]):
+    """The per-keyword `in` loop the matcher replaced, kept as a reference"""
+    def scan(text: str):
+        lowered = text.lower()
+        return frozenset(keyword for keyword in keywords if keyword in lowered)
+    return scan
+
+def bench_keyword_scan(texts: str, vocabulary: str, reference: bool = False):
+    """Scanning 4KB documents or queries with the medical or a 3000-keyword vocabulary"""
+    def setup() -> Runner:
+        keywords = sorted(MEDICAL_KEYWORD_MATCHER.keywords) if vocabulary == "medical" else make_vocabulary(3000)
+        inputs = make_queries(CORPUS_SIZE) if texts == "queries" else [make_document(4096, seed) for seed in range(16)]
+        scan = _substring_scan(keywords) if reference else KeywordMatcher(keywords).scan
+        return _cycle_calls(scan, inputs)
+    return setup
+
+def _filled_memory(conversations: int, capacity: Optional[int] = None) -> ConversationMemory:
+    # The byte budget is lifted so only the conversation count limits the store
+    memory = ConversationMemory(memory_budget_bytes=1 << 40)
+    memory.max_conversations = capacity or conversations * 2
+    queries = make_queries(64)
+    for index in range(conversations):
+        conversation_id = memory.create_conversation(title=queries[index % 64][:50])
+        memory.add_message(conversation_id, "user", queries[index % 64], "gemini", True)
+    return memory
+
+def bench_memory_create(conversations: int):
+    def setup() -> Runner:
+        memory = _filled_memory(conversations)
+        # Grows without eviction; see bench_memory_cleanup for the store at capacity
+        memory.max_conversations = 1 << 30
+
+        def run(n: int):
+            for _ in range(n):
+                memory.create_conversation(title="What is metformin used for?")
+        return run
+    return setup
+
+def bench_memory_add(conversations: int):
+    def setup() -> Runner:
+        memory = _filled_memory(conversations)
+        ids = list(memory.conversations)
+        # Stride through conversations so each add moves a different one to the end;
+        # conversations settle at max_messages_per_conversation
+        targets = itertools.cycle(ids[::max(1, len(ids) // 256)])
+        responses = itertools.cycle(make_responses(64))
+
+        def run(n: int):
+            for _ in range(n):
+                memory.add_message(next(targets), "assistant", next(responses), "gemini", True)
+        return run
+    return setup
+
+def bench_memory_list(conversations: int):
+    def setup() -> Runner:
+        memory = _filled_memory(conversations)
+
+        def run(n: int):
+            for _ in range(n):
+                memory.get_all_conversations()
+        return run
+    return setup
+
+def bench_memory_cleanup(conversations: int):
+    def setup() -> Runner:
+        # At capacity, every new conversation evicts the least recently updated one
+        memory = _filled_memory(conversations, capacity=conversations)
+
+        def run(n: int):
+            for _ in range(n):
+                memory.create_conversation(title="What is metformin used for?")
+        return run
+    return setup
+
+class StubProvider(LLMProvider):
+    """Offline model that answers instantly with a canned response"""
+
+    name = "stub"
+
+    def __init__(self):
+        super().__init__()
+        self.response = make_responses(1)[0]
+
+    @property
+    def model_name(self) -> str:
+        return "stub"
+
+    def is_available(self) -> bool:
+        return True
+
+    async def generate(self, contents: Contents, variant: str, system_instruction: Optional[str] = None) -> str:
+        return self.response
+
+    async def stream(self, contents: Contents, variant: str, system_instruction: Optional[str] = None) -> AsyncIterator[str]:
+        yield self.response
+
+def bench_query_pipeline() -> Runner:
+    """query_gemini end to end (uncached) against the stub model"""
+    llm_provider._llm_router = LLMRouter([StubProvider()])
+    queries = itertools.cycle(make_queries(CORPUS_SIZE))
+    loop = asyncio.new_event_loop()
+
+    async def many(n: int):
+        for _ in range(n):
+            await query_gemini(next(queries), use_cache=False)
+
+    def run(n: int):
+        loop.run_until_complete(many(n))
+    return run
+
+CASES: List[Case] = [
+    Case("create_medical_prompt", bench_create_medical_prompt),
+    Case("create_context_prompt", bench_create_context_prompt),
+    Case("add_safety_warnings", bench_add_safety_warnings),
+    Case("validate_medical_query", bench_validate_medical_query),
+    Case("classify_medical_query", bench_classify_medical_query),
+    *[
+        Case(f"extract_medical_context[{messages}]", bench_extract_medical_context(messages))
+        for messages in (6, 50, 500)
+    ],
+    *[
+        Case(f"{name}[{texts},{vocabulary}]", bench_keyword_scan(texts, vocabulary, reference))
+        for texts, vocabulary in (("queries", "medical"), ("4kb", "medical"), ("queries", "3000"))
+        for name, reference in (("keyword_scan", False), ("keyword_scan_substring", True))
+    ],
+    *[
+        Case(f"memory_{operation}[{conversations}]", factory(conversations))
+        for conversations in (100, 10_000, 100_000)
+        for operation, factory in (
+            ("create", bench_memory_create),
+            ("add", bench_memory_add),
+            ("list", bench_memory_list),
+            ("cleanup", bench_memory_cleanup)
+        )
+    ],
+    Case("query_pipeline_stub", bench_query_pipeline)
+]
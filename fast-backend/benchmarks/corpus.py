@@ -0,0 +1,91 @@
+"""
+Synthetic corpora for the benchmarks
+Seeded, so every run measures the same inputs
+"""
+
+import random
+from datetime import datetime, timedelta
+from typing import List
+
+from app.services.conversation_memory import Message
+
+SEED = 1234
+
+MEDICATIONS = ["metformin", "aspirin", "ibuprofen", "acetaminophen", "lisinopril", "atorvastatin", "amoxicillin"]
+SYMPTOMS = ["headache", "nausea", "dizziness", "fatigue", "cough", "rash", "back pain"]
+CONDITIONS = ["diabetes", "hypertension", "asthma", "arthritis", "heart disease"]
+EMERGENCIES = ["chest pain", "difficulty breathing", "severe bleeding", "seizure"]
+
+QUERY_TEMPLATES = [
+    "What is {medication} used for?",
+    "What are the side effects of {medication}?",
+    "Can I take {medication} with {other} for my {condition}?",
+    "I have had a {symptom} for three days, should I be worried?",
+    "My father has {condition}, what lifestyle changes help?",
+    "I am having {emergency} right now, what should I do?",
+    "What dosage of {medication} is normal for an adult?",
+    "Is it safe to drink alcohol while taking {medication}?",
+    "How much water should I drink every day?",
+    "What are good habits for better sleep?"
+]
+
+RESPONSE_PARAGRAPHS = [
+    "**{medication}** is commonly prescribed for {condition}. It works by helping the body regulate the underlying process.",
+    "Common side effects include {symptom} and mild stomach upset, which usually improve after the first few weeks.",
+    "Take it exactly as prescribed and do not change the dose without talking to your doctor or pharmacist.",
+    "If you notice {emergency}, seek emergency medical care immediately.",
+    "⚠️ **Important**: This information is for educational purposes only. Always consult your healthcare provider."
+]
+
+def _fill(template: str, rng: random.Random) -> str:
+    return template.format(
+        medication=rng.choice(MEDICATIONS),
+        other=rng.choice(MEDICATIONS),
+        symptom=rng.choice(SYMPTOMS),
+        condition=rng.choice(CONDITIONS),
+        emergency=rng.choice(EMERGENCIES)
+    )
+
+def make_queries(count: int, seed: int = SEED) -> List[str]:
+    """Patient queries mixing every query class"""
+    rng = random.Random(seed)
+    return [_fill(rng.choice(QUERY_TEMPLATES), rng) for _ in range(count)]
+
+def make_responses(count: int, seed: int = SEED) -> List[str]:
+    """Assistant responses of 3-5 paragraphs"""
+    rng = random.Random(seed)
+    return [
+        "\n\n".join(_fill(paragraph, rng) for paragraph in rng.sample(RESPONSE_PARAGRAPHS, rng.randint(3, 5)))
+        for _ in range(count)
+    ]
+
+def make_messages(count: int, seed: int = SEED) -> List[Message]:
+    """A conversation of alternating user and assistant messages"""
+    queries = make_queries(count, seed)
+    responses = make_responses(count, seed)
+    start = datetime(2024, 1, 1)
+    return [
+        Message(
+            role="user" if index % 2 == 0 else "assistant",
+            content=queries[index] if index % 2 == 0 else responses[index],
+            timestamp=start + timedelta(seconds=30 * index),
+            model="gemini",
+            is_medical_query=index % 2 == 0
+        )
+        for index in range(count)
+    ]
+
+def make_document(size_bytes: int, seed: int = SEED) -> str:
+    """One long text (e.g. a pasted report) of responses joined up to the size"""
+    text = "\n\n".join(make_responses(max(1, size_bytes // 200), seed))
+    return text[:size_bytes]
+
+def make_vocabulary(count: int, seed: int = SEED) -> List[str]:
+    """A large keyword list of made-up drug names plus one- and two-word medical terms"""
+    rng = random.Random(seed)
+    terms = MEDICATIONS + SYMPTOMS + CONDITIONS + EMERGENCIES
+    vocabulary = set(terms)
+    while len(vocabulary) < count:
+        name = "".join(rng.choice("abcdefghiklmnoprstuvz") for _ in range(rng.randint(5, 11)))
+        vocabulary.add(name if rng.random() < 0.7 else f"{name} {rng.choice(terms).split()[0]}")
+    return sorted(vocabulary)
@@ -0,0 +1,94 @@
+"""
+Benchmark harness
+Times each case, measures its allocations with tracemalloc and compares against a baseline
+"""
+
+import gc
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+# A case's setup returns run(n), which performs n operations
+Runner = Callable[[int], Any]
+
+class Case(NamedTuple):
+    name: str
+    setup: Callable[[], Runner]
+
+class Result(NamedTuple):
+    name: str
+    ops_per_sec: float
+    peak_bytes: int  # Peak traced memory above the starting point while running
+    retained_bytes_per_op: float  # Memory still held after the run, per operation
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "ops_per_sec": round(self.ops_per_sec, 1),
+            "peak_bytes": self.peak_bytes,
+            "retained_bytes_per_op": round(self.retained_bytes_per_op, 1)
+        }
+
+def _timed(run: Runner, n: int) -> float:
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        run(n)
+        return time.perf_counter() - start
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+def _calibrate(run: Runner, min_time: float) -> int:
+    """Operations per repeat so that one repeat takes about a fifth of min_time"""
+    n = 1
+    while True:
+        elapsed = _timed(run, n)
+        if elapsed >= min_time / 5 or n >= 1 << 24:
+            return n
+        n *= 2 if elapsed == 0 else max(2, min(10, int(min_time / 5 / elapsed) + 1))
+
+def _measure_allocations(run: Runner, n: int) -> Dict[str, float]:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        run(n)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"peak_bytes": peak - baseline, "retained_bytes_per_op": (current - baseline) / n}
+
+def run_case(case: Case, min_time: float = 1.0, repeats: int = 5) -> Result:
+    """Best-of-`repeats` throughput, then allocations over a separate run"""
+    run = case.setup()
+    run(1)  # Warm caches and lazy imports
+    n = _calibrate(run, min_time)
+    best = min(_timed(run, n) for _ in range(repeats))
+
+    # tracemalloc slows execution down several times; trace fewer operations
+    allocations = _measure_allocations(case.setup(), max(1, min(n, 1000)))
+    return Result(
+        name=case.name,
+        ops_per_sec=n / best if best > 0 else float("inf"),
+        peak_bytes=int(allocations["peak_bytes"]),
+        retained_bytes_per_op=allocations["retained_bytes_per_op"]
+    )
+
+def compare(result: Result, baseline: Optional[Dict[str, Any]], threshold: float) -> List[str]:
+    """Regressions of a result against its baseline entry"""
+    if not baseline:
+        return []
+    regressions = []
+    if result.ops_per_sec < baseline["ops_per_sec"] * (1 - threshold):
+        regressions.append(
+            f"throughput {result.ops_per_sec:,.0f} ops/s vs baseline {baseline['ops_per_sec']:,.0f}"
+        )
+    # Small absolute slack so tiny allocation counts do not flap
+    if result.peak_bytes > baseline["peak_bytes"] * (1 + threshold) + 4096:
+        regressions.append(f"peak memory {result.peak_bytes:,} B vs baseline {baseline['peak_bytes']:,}")
+    if result.retained_bytes_per_op > baseline["retained_bytes_per_op"] * (1 + threshold) + 256:
+        regressions.append(
+            f"retained {result.retained_bytes_per_op:,.0f} B/op vs baseline {baseline['retained_bytes_per_op']:,.0f}"
+        )
+    return regressions
@@ -0,0 +1,308 @@
+"""
+End-to-end load test: python -m benchmarks.loadtest [--rps N] [--duration S] [--spawn-workers N]
+
+Sends an open-loop mix of chat, follow-up, streaming, conversation list and
+image upload requests at a fixed arrival rate and reports throughput and
+p50/p95/p99 latency per scenario. Latency is measured from each request's
+scheduled start, so a server that falls behind shows up in the tail instead
+of silently lowering the offered load.
+
+With --spawn-workers the server is started locally with the fake model
+(LLM_PROVIDERS=["fake"]) and rate limiting disabled, so no network or API
+key is needed; FAKE_LLM_* variables in the environment are passed through.
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import math
+import os
+import random
+import signal
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from PIL import Image
+
+from benchmarks.corpus import make_queries
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+DEFAULT_MIX = "chat=6,followup=2,stream=1,conversations=1,image=1"
+
+class Sample:
+    __slots__ = ("scenario", "latency", "outcome")
+
+    def __init__(self, scenario: str, latency: float, outcome: str):
+        self.scenario = scenario
+        self.latency = latency
+        self.outcome = outcome  # "ok", an HTTP status, "fallback", "timeout" or an error name
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        weights[name.strip()] = float(weight or 1)
+    unknown = set(weights) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Unknown scenarios in --mix: {', '.join(sorted(unknown))}")
+    return weights
+
+def make_image(width: int = 640, height: int = 480) -> bytes:
+    """A deterministic PNG resembling a photographed label"""
+    image = Image.new("RGB", (width, height), "white")
+    pixels = image.load()
+    rng = random.Random(0)
+    for y in range(0, height, 8):
+        shade = rng.randint(0, 200)
+        for x in range(rng.randint(0, width // 2), width, 3):
+            pixels[x, y] = (shade, shade, shade)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+class LoadTest:
+    def __init__(self, client: httpx.AsyncClient, seed: int):
+        self.client = client
+        self.rng = random.Random(seed)
+        self.queries = make_queries(512, seed)
+        self.image = make_image()
+        self.conversation_ids: List[str] = []
+
+    def _prompt(self) -> str:
+        return self.rng.choice(self.queries)
+
+    def _remember(self, body: Dict[str, Any]):
+        conversation_id = body.get("conversation_id")
+        if conversation_id and conversation_id != "error":
+            self.conversation_ids.append(conversation_id)
+            # Follow-ups go to recent conversations
+            del self.conversation_ids[:-256]
+
+    async def _chat(self, data: Dict[str, str], files: Optional[Dict[str, Tuple]] = None) -> str:
+        response = await self.client.post("/api/chat", data=data, files=files)
+        if response.status_code != 200:
+            return str(response.status_code)
+        body = response.json()
+        self._remember(body)
+        # The chat endpoint answers some upstream failures with a fallback message
+        return "fallback" if body.get("error") else "ok"
+
+    async def chat(self) -> str:
+        return await self._chat({"prompt": self._prompt()})
+
+    async def followup(self) -> str:
+        if not self.conversation_ids:
+            return await self.chat()
+        return await self._chat({
+            "prompt": self._prompt(),
+            "conversation_id": self.rng.choice(self.conversation_ids)
+        })
+
+    async def image(self) -> str:
+        return await self._chat(
+            {"prompt": "What is this medication and how should I take it?"},
+            files={"image": ("label.png", self.image, "image/png")}
+        )
+
+    async def stream(self) -> str:
+        async with self.client.stream("POST", "/api/chat/stream", data={"prompt": self._prompt()}) as response:
+            if response.status_code != 200:
+                return str(response.status_code)
+            outcome = "ok"
+            async for line in response.aiter_lines():
+                if line.startswith("event: error"):
+                    outcome = "fallback"
+            return outcome
+
+    async def conversations(self) -> str:
+        response = await self.client.get("/api/conversations")
+        return "ok" if response.status_code == 200 else str(response.status_code)
+
+SCENARIOS = {
+    "chat": LoadTest.chat,
+    "followup": LoadTest.followup,
+    "stream": LoadTest.stream,
+    "conversations": LoadTest.conversations,
+    "image": LoadTest.image
+}
+
+async def _timed(test: LoadTest, scenario: str, scheduled: float, samples: List[Sample]):
+    try:
+        outcome = await SCENARIOS[scenario](test)
+    except httpx.TimeoutException:
+        outcome = "timeout"
+    except httpx.HTTPError as e:
+        outcome = type(e).__name__
+    samples.append(Sample(scenario, time.perf_counter() - scheduled, outcome))
+
+async def run_load(
+    url: str,
+    rps: float,
+    duration: float,
+    mix: Dict[str, float],
+    timeout: float,
+    max_in_flight: int,
+    poisson: bool,
+    seed: int
+) -> Tuple[List[Sample], int, float]:
+    """Offer `rps` requests per second for `duration` seconds; returns samples, dropped count and elapsed time"""
+    limits = httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight)
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+        test = LoadTest(client, seed)
+        scenarios, weights = zip(*mix.items())
+        samples: List[Sample] = []
+        tasks = set()
+        dropped = 0
+
+        start = time.perf_counter()
+        scheduled = start
+        while scheduled - start < duration:
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if len(tasks) >= max_in_flight:
+                # The client cannot offer more load without queueing it itself
+                dropped += 1
+            else:
+                scenario = test.rng.choices(scenarios, weights)[0]
+                task = asyncio.ensure_future(_timed(test, scenario, scheduled, samples))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            scheduled += test.rng.expovariate(rps) if poisson else 1 / rps
+
+        if tasks:
+            await asyncio.wait(tasks)
+        return samples, dropped, time.perf_counter() - start
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of a sorted list"""
+    index = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def summarize(samples: List[Sample], elapsed: float) -> Dict[str, Dict[str, Any]]:
+    by_scenario: Dict[str, List[Sample]] = defaultdict(list)
+    for sample in samples:
+        by_scenario[sample.scenario].append(sample)
+        by_scenario["total"].append(sample)
+
+    summary = {}
+    for scenario, group in sorted(by_scenario.items(), key=lambda item: (item[0] == "total", item[0])):
+        latencies = sorted(sample.latency * 1000 for sample in group)
+        outcomes: Dict[str, int] = defaultdict(int)
+        for sample in group:
+            outcomes[sample.outcome] += 1
+        summary[scenario] = {
+            "requests": len(group),
+            "ok": outcomes.pop("ok", 0),
+            "errors": dict(outcomes),
+            "throughput_rps": round(len(group) / elapsed, 2),
+            "p50_ms": round(percentile(latencies, 0.50), 1),
+            "p95_ms": round(percentile(latencies, 0.95), 1),
+            "p99_ms": round(percentile(latencies, 0.99), 1),
+            "max_ms": round(latencies[-1], 1)
+        }
+    return summary
+
+def print_summary(summary: Dict[str, Dict[str, Any]], rps: float, dropped: int, elapsed: float):
+    width = max(len(name) for name in ["scenario", *summary])
+    print(f"{'scenario':<{width}} {'requests':>9} {'ok':>7} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}  errors")
+    for scenario, row in summary.items():
+        errors = ", ".join(f"{outcome}={count}" for outcome, count in sorted(row["errors"].items())) or "-"
+        print(
+            f"{scenario:<{width}} {row['requests']:>9} {row['ok']:>7} {row['throughput_rps']:>8.1f} "
+            f"{row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f} {row['max_ms']:>9.1f}  {errors}"
+        )
+    print(f"Offered {rps:g} rps for {elapsed:.1f}s; {dropped} requests dropped at the client's in-flight limit")
+
+def spawn_server(port: int, workers: int) -> subprocess.Popen:
+    """Start uvicorn with the fake model and wait until it answers health checks"""
+    env = dict(os.environ)
+    env.setdefault("LLM_PROVIDERS", '["fake"]')
+    env.setdefault("RATE_LIMIT_ENABLED", "False")
+    env.setdefault("LOG_LEVEL", "WARNING")
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "app.main:app",
+            "--host", "127.0.0.1", "--port", str(port),
+            "--workers", str(workers), "--log-level", "warning", "--no-access-log"
+        ],
+        cwd=BACKEND_DIR,
+        env=env,
+        start_new_session=True  # Its own process group, so stop_server reaches every worker
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"Server exited with status {process.returncode}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/api/health", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.05)
+    stop_server(process)
+    raise SystemExit("Server did not become healthy within 60s")
+
+def stop_server(process: subprocess.Popen):
+    os.killpg(process.pid, signal.SIGTERM)
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Rxplain backend load test")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="server to test (ignored with --spawn-workers)")
+    parser.add_argument("--rps", type=float, default=20.0, help="offered requests per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of load")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"scenario weights (default {DEFAULT_MIX})")
+    parser.add_argument("--poisson", action="store_true", help="exponential inter-arrival times instead of a fixed rate")
+    parser.add_argument("--timeout", type=float, default=60.0, help="per-request timeout in seconds")
+    parser.add_argument("--max-in-flight", type=int, default=1000, help="client-side concurrency limit")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--spawn-workers", type=int, default=0, help="start a local fake-model server with N workers")
+    parser.add_argument("--port", type=int, default=8765, help="port for --spawn-workers")
+    parser.add_argument("--json", type=Path, help="also write the summary to this file")
+    args = parser.parse_args()
+
+    url = args.url
+    server = None
+    if args.spawn_workers:
+        server = spawn_server(args.port, args.spawn_workers)
+        url = f"http://127.0.0.1:{args.port}"
+
+    try:
+        samples, dropped, elapsed = asyncio.run(run_load(
+            url, args.rps, args.duration, parse_mix(args.mix),
+            args.timeout, args.max_in_flight, args.poisson, args.seed
+        ))
+    finally:
+        if server:
+            stop_server(server)
+
+    if not samples:
+        print("No requests completed")
+        return 1
+    summary = summarize(samples, elapsed)
+    print_summary(summary, args.rps, dropped, elapsed)
+    if args.json:
+        args.json.write_text(json.dumps({
+            "rps": args.rps,
+            "duration": args.duration,
+            "mix": args.mix,
+            "workers": args.spawn_workers or None,
+            "dropped": dropped,
+            "scenarios": summary
+        }, indent=2) + "\n")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,241 @@
+"""
+Replay a recorded traffic trace: python -m benchmarks.replay TRACE [TRACE ...] [--speed N] [--spawn-workers N]
+
+Re-drives the request shapes written by the traffic recorder
+(TRAFFIC_RECORDING_ENABLED) with their original timing, divided by --speed.
+Prompts are synthesized per query class at the recorded length, uploads are
+synthetic images of the recorded size, and follow-ups are sent to the
+conversation their earlier turns created, after those turns have finished,
+as a real client would. Reports throughput and p50/p95/p99 latency per
+endpoint and query class.
+"""
+
+import argparse
+import asyncio
+import gzip
+import io
+import json
+import random
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from PIL import Image
+
+from app.utils.medical_prompts import classify_medical_query
+from benchmarks.corpus import make_queries
+from benchmarks.loadtest import Sample, print_summary, spawn_server, stop_server, summarize
+
+PROMPT_FILLER = " Please explain what I should know about this in plain language."
+
+def load_trace(paths: List[Path]) -> List[Dict[str, Any]]:
+    """Request records from one or more traces (e.g. one per worker), in arrival order"""
+    records = []
+    for path in paths:
+        with gzip.open(path, "rt", encoding="utf-8") as trace:
+            for line in trace:
+                record = json.loads(line)
+                # Each recording session starts with a header line
+                if "trace_version" not in record:
+                    records.append(record)
+    records.sort(key=lambda record: record["t"])
+    return records
+
+def describe_trace(records: List[Dict[str, Any]]) -> str:
+    conversations = {record["conversation"] for record in records}
+    images = sum(1 for record in records if record["image_bytes"])
+    duration = records[-1]["t"] - records[0]["t"]
+    return (
+        f"{len(records)} requests in {len(conversations)} conversations over {duration:.1f}s "
+        f"({len(records) / max(duration, 1e-9):.2f} rps), {images} with images, "
+        f"deepest position {max(record['position'] for record in records)}"
+    )
+
+class Replayer:
+    def __init__(self, client: httpx.AsyncClient, seed: int):
+        self.client = client
+        self.rng = random.Random(seed)
+        self.prompts: Dict[str, List[str]] = defaultdict(list)
+        for query in make_queries(512, seed):
+            self.prompts[classify_medical_query(query)].append(query)
+        self.images: Dict[int, bytes] = {}
+        # The latest turn of each trace conversation resolves to the server's conversation ID
+        self.turns: Dict[str, "asyncio.Future[Optional[str]]"] = {}
+        self.waited = 0  # Follow-ups delayed until the previous turn finished
+        self.unlinked = 0  # Follow-ups whose earlier turns are not in the trace or failed
+
+    def _prompt(self, record: Dict[str, Any], index: int) -> str:
+        candidates = self.prompts.get(record["query_class"]) or self.prompts["general_health"]
+        # Unique per request, so the response cache only serves what the trace cannot tell apart
+        prompt = f"{self.rng.choice(candidates)} (#{index})"
+        while len(prompt) < record["prompt_chars"]:
+            prompt += PROMPT_FILLER
+        return prompt[:max(record["prompt_chars"], 1)]
+
+    def _image(self, size: int) -> bytes:
+        """A noise PNG of about `size` bytes (noise does not compress), sizes rounded to two digits"""
+        bucket = int(float(f"{size:.2g}"))
+        if bucket not in self.images:
+            side = max(16, int((bucket / 3) ** 0.5))
+            noise = random.Random(bucket).getrandbits(8 * side * side * 3).to_bytes(side * side * 3, "little")
+            buffer = io.BytesIO()
+            Image.frombytes("RGB", (side, side), noise).save(buffer, format="PNG")
+            self.images[bucket] = buffer.getvalue()
+        return self.images[bucket]
+
+    async def _send(self, record: Dict[str, Any], index: int, conversation_id: Optional[str]) -> Tuple[str, Optional[str]]:
+        """Send one request; returns the outcome and the server's conversation ID"""
+        data = {"prompt": self._prompt(record, index)}
+        if conversation_id:
+            data["conversation_id"] = conversation_id
+        files = None
+        if record["image_bytes"]:
+            files = {"image": ("upload.png", self._image(record["image_bytes"]), "image/png")}
+
+        if record["endpoint"] == "stream":
+            async with self.client.stream("POST", "/api/chat/stream", data=data, files=files) as response:
+                if response.status_code != 200:
+                    return str(response.status_code), None
+                outcome, event = "ok", None
+                async for line in response.aiter_lines():
+                    if line.startswith("event: "):
+                        event = line[7:]
+                        if event == "error":
+                            outcome = "fallback"
+                    elif event == "start" and line.startswith("data: "):
+                        conversation_id = json.loads(line[6:])["conversation_id"]
+                return outcome, conversation_id
+
+        response = await self.client.post("/api/chat", data=data, files=files)
+        if response.status_code != 200:
+            return str(response.status_code), None
+        body = response.json()
+        return ("fallback" if body.get("error") else "ok"), body.get("conversation_id")
+
+    async def replay(self, record: Dict[str, Any], index: int, scheduled: float, samples: List[Sample]):
+        key = record["conversation"]
+        previous = self.turns.get(key) if record["position"] > 0 else None
+        turn: "asyncio.Future[Optional[str]]" = asyncio.get_running_loop().create_future()
+        self.turns[key] = turn
+
+        start = scheduled
+        conversation_id = None
+        if previous is not None:
+            if not previous.done():
+                self.waited += 1
+                conversation_id = await previous
+                start = time.perf_counter()
+            else:
+                conversation_id = previous.result()
+        if record["position"] > 0 and conversation_id is None:
+            self.unlinked += 1
+
+        try:
+            outcome, created = await self._send(record, index, conversation_id)
+            # A failed follow-up leaves its conversation in place for the next turn
+            conversation_id = created or conversation_id
+        except httpx.TimeoutException:
+            outcome = "timeout"
+        except httpx.HTTPError as e:
+            outcome = type(e).__name__
+        finally:
+            if not turn.done():
+                turn.set_result(conversation_id)
+        samples.append(Sample(f"{record['endpoint']}/{record['query_class']}", time.perf_counter() - start, outcome))
+
+async def run_replay(
+    url: str,
+    records: List[Dict[str, Any]],
+    speed: float,
+    timeout: float,
+    max_in_flight: int,
+    seed: int
+) -> Tuple[List[Sample], int, float, Replayer]:
+    limits = httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight)
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+        replayer = Replayer(client, seed)
+        samples: List[Sample] = []
+        tasks = set()
+        dropped = 0
+
+        first = records[0]["t"]
+        start = time.perf_counter()
+        for index, record in enumerate(records):
+            scheduled = start + (record["t"] - first) / speed
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if len(tasks) >= max_in_flight:
+                dropped += 1
+                continue
+            task = asyncio.ensure_future(replayer.replay(record, index, scheduled, samples))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        if tasks:
+            await asyncio.wait(tasks)
+        return samples, dropped, time.perf_counter() - start, replayer
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Replay a recorded Rxplain traffic trace")
+    parser.add_argument("traces", type=Path, nargs="+", help="trace files written by the traffic recorder")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay N times faster than recorded")
+    parser.add_argument("--limit", type=int, default=0, help="replay only the first N requests")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="server to test (ignored with --spawn-workers)")
+    parser.add_argument("--timeout", type=float, default=60.0, help="per-request timeout in seconds")
+    parser.add_argument("--max-in-flight", type=int, default=1000, help="client-side concurrency limit")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--spawn-workers", type=int, default=0, help="start a local fake-model server with N workers")
+    parser.add_argument("--port", type=int, default=8765, help="port for --spawn-workers")
+    parser.add_argument("--json", type=Path, help="also write the summary to this file")
+    args = parser.parse_args()
+
+    records = load_trace(args.traces)
+    if args.limit:
+        records = records[:args.limit]
+    if not records:
+        print("The trace has no requests")
+        return 1
+    print(f"Trace: {describe_trace(records)}")
+
+    url = args.url
+    server = None
+    if args.spawn_workers:
+        server = spawn_server(args.port, args.spawn_workers)
+        url = f"http://127.0.0.1:{args.port}"
+
+    try:
+        samples, dropped, elapsed, replayer = asyncio.run(run_replay(
+            url, records, args.speed, args.timeout, args.max_in_flight, args.seed
+        ))
+    finally:
+        if server:
+            stop_server(server)
+
+    if not samples:
+        print("No requests completed")
+        return 1
+    summary = summarize(samples, elapsed)
+    offered = len(records) / max(elapsed, 1e-9)
+    print_summary(summary, round(offered, 2), dropped, elapsed)
+    print(
+        f"{replayer.waited} follow-ups waited for their previous turn; "
+        f"{replayer.unlinked} were sent without their conversation (earlier turns missing or failed)"
+    )
+    if args.json:
+        args.json.write_text(json.dumps({
+            "traces": [str(path) for path in args.traces],
+            "speed": args.speed,
+            "workers": args.spawn_workers or None,
+            "dropped": dropped,
+            "waited": replayer.waited,
+            "unlinked": replayer.unlinked,
+            "scenarios": summary
+        }, indent=2) + "\n")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
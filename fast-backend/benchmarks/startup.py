@@ -0,0 +1,78 @@
+"""
+Measure import and worker startup time: python -m benchmarks.startup [--runs N] [--importtime]
+
+Import time is measured in fresh interpreters, so nothing is cached in
+sys.modules; worker startup is the time from launching uvicorn until
+/api/health answers, which includes imports and the lifespan hook.
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from typing import List, Tuple
+
+from benchmarks.loadtest import BACKEND_DIR, spawn_server, stop_server
+
+IMPORT_SNIPPET = "import time; start = time.perf_counter(); import app.main; print(time.perf_counter() - start)"
+
+def measure_import(runs: int) -> List[float]:
+    """Seconds to import app.main in each of `runs` fresh interpreters"""
+    return [
+        float(subprocess.run(
+            [sys.executable, "-c", IMPORT_SNIPPET],
+            cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip())
+        for _ in range(runs)
+    ]
+
+def slowest_imports(count: int) -> List[Tuple[int, str]]:
+    """Modules with the largest self import time (microseconds), from python -X importtime"""
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    ).stderr
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        modules.append((int(self_us), name.strip()))
+    return sorted(modules, reverse=True)[:count]
+
+def measure_worker_startup(runs: int, port: int) -> List[float]:
+    """Seconds from launching a one-worker server until it answers health checks"""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        server = spawn_server(port, 1)
+        times.append(time.perf_counter() - start)
+        stop_server(server)
+    return times
+
+def describe(label: str, seconds: List[float]) -> str:
+    return (
+        f"{label:<16} median {statistics.median(seconds) * 1000:8.1f} ms  "
+        f"min {min(seconds) * 1000:8.1f} ms  max {max(seconds) * 1000:8.1f} ms  ({len(seconds)} runs)"
+    )
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Rxplain backend import and startup time")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8765, help="port for the worker startup runs")
+    parser.add_argument("--importtime", action="store_true", help="also list the slowest imports")
+    parser.add_argument("--skip-server", action="store_true", help="measure imports only")
+    args = parser.parse_args()
+
+    print(describe("import app.main", measure_import(args.runs)))
+    if not args.skip_server:
+        print(describe("worker startup", measure_worker_startup(args.runs, args.port)))
+    if args.importtime:
+        print("Slowest imports (self time):")
+        for self_us, name in slowest_imports(15):
+            print(f"  {self_us / 1000:8.1f} ms  {name}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,11 @@
+"""
+Shared test setup: run from fast-backend with `python -m pytest`
+"""
+
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
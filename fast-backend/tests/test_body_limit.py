@@ -0,0 +1,69 @@
+"""
+Oversized uploads are rejected while the body arrives, before the
+multipart parser has spooled them
+"""
+
+import asyncio
+
+from starlette.types import Message
+
+from app.main import app
+from app.middleware import BodyLimitMiddleware
+
+LIMIT = 1024
+
+def _call(middleware, path, chunks, headers=()):
+    """Send the body in chunks; returns the response status and how many chunks were read"""
+    pending = list(chunks)
+    sent = []
+
+    async def receive() -> Message:
+        body = pending.pop(0) if pending else b""
+        return {"type": "http.request", "body": body, "more_body": bool(pending)}
+
+    async def send(message: Message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "POST", "path": path, "headers": list(headers), "query_string": b""}
+    asyncio.run(middleware(scope, receive, send))
+    status = next(message["status"] for message in sent if message["type"] == "http.response.start")
+    return status, len(chunks) - len(pending)
+
+def _multipart(size):
+    boundary = b"limit"
+    body = (
+        b"--limit\r\nContent-Disposition: form-data; name=\"prompt\"\r\n\r\nWhat is this?\r\n"
+        b"--limit\r\nContent-Disposition: form-data; name=\"image\"; filename=\"a.png\"\r\n"
+        b"Content-Type: image/png\r\n\r\n" + b"\0" * size + b"\r\n--limit--\r\n"
+    )
+    headers = [(b"content-type", b"multipart/form-data; boundary=" + boundary)]
+    return [body[start:start + 256] for start in range(0, len(body), 256)], headers
+
+def test_declared_length_over_the_limit_is_rejected_unread():
+    chunks, headers = _multipart(LIMIT * 4)
+    headers.append((b"content-length", str(sum(map(len, chunks))).encode()))
+    status, read = _call(BodyLimitMiddleware(app, max_bytes=LIMIT), "/api/chat", chunks, headers)
+    assert status == 413
+    assert read == 0
+
+def test_undeclared_length_stops_at_the_limit():
+    chunks, headers = _multipart(LIMIT * 16)
+    status, read = _call(BodyLimitMiddleware(app, max_bytes=LIMIT), "/api/chat", chunks, headers)
+    assert status == 413
+    assert read * 256 <= LIMIT + 256 < sum(map(len, chunks))
+
+def test_other_paths_are_not_limited():
+    seen = []
+
+    async def inner(scope, receive, send):
+        while True:
+            message = await receive()
+            seen.append(message)
+            if not message.get("more_body"):
+                break
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    status, read = _call(BodyLimitMiddleware(inner, max_bytes=LIMIT), "/metrics", [b"x" * 512] * 4)
+    assert status == 200
+    assert read == 4
@@ -0,0 +1,155 @@
+"""
+The in-memory and SQLite conversation stores must behave the same
+"""
+
+import time
+from unittest import mock
+
+import pytest
+
+from app.services.chat_turns import ChatTurnCache
+from app.services.conversation_memory import ConversationMemory, ConversationStore
+from app.services.sqlite_memory import SQLiteConversationMemory
+
+MESSAGES = [
+    ("user", "What is metformin used for?", True),
+    ("assistant", "Metformin treats type 2 diabetes. Common side effects include nausea.", True),
+    ("user", "Can I take it with aspirin for my headache?", True),
+    ("assistant", "Usually yes, but ask your pharmacist about aspirin and bleeding risk.", True),
+    ("user", "How much water should I drink?", False),
+    ("assistant", "About eight glasses a day for most adults.", False),
+    ("user", "I also have hypertension and take lisinopril", True),
+    ("assistant", "Lisinopril lowers blood pressure; dizziness can occur.", True)
+]
+
+@pytest.fixture
+def stores(tmp_path):
+    sqlite_store = SQLiteConversationMemory(str(tmp_path / "conversations.db"))
+    yield ConversationMemory(), sqlite_store
+    sqlite_store.close()
+
+def _fill(store: ConversationStore, messages=MESSAGES) -> str:
+    conversation_id = store.create_conversation(title="New Conversation")
+    for role, content, is_medical_query in messages:
+        assert store.add_message(conversation_id, role, content, "gemini", is_medical_query)
+    return conversation_id
+
+def _contents(messages):
+    return [(message.role, message.content, message.is_medical_query) for message in messages]
+
+def _comparable_summary(summary):
+    return {key: value for key, value in summary.items() if key not in ("id", "created_at", "updated_at")}
+
+def _comparable_context(context):
+    return {key: sorted(value) if isinstance(value, list) else value for key, value in context.items()}
+
+def test_history_and_summary_match(stores):
+    memory, sqlite_store = stores
+    memory_id, sqlite_id = _fill(memory), _fill(sqlite_store)
+
+    for max_messages in (1, 3, 6, 50):
+        assert _contents(memory.get_conversation_history(memory_id, max_messages)) == _contents(
+            sqlite_store.get_conversation_history(sqlite_id, max_messages)
+        )
+    assert _comparable_summary(memory.get_conversation_summary(memory_id)) == _comparable_summary(
+        sqlite_store.get_conversation_summary(sqlite_id)
+    )
+    assert memory.get_conversation_summary(memory_id)["title"] == MESSAGES[0][1]
+    assert _contents(memory.get_conversation(memory_id).messages) == _contents(
+        sqlite_store.get_conversation(sqlite_id).messages
+    )
+
+def test_medical_context_matches(stores):
+    memory, sqlite_store = stores
+    memory_id, sqlite_id = _fill(memory), _fill(sqlite_store)
+
+    memory_context = memory.get_medical_context(memory_id)
+    assert "metformin" in memory_context["medications_mentioned"]
+    assert _comparable_context(memory_context) == _comparable_context(sqlite_store.get_medical_context(sqlite_id))
+
+    for store, conversation_id in ((memory, memory_id), (sqlite_store, sqlite_id)):
+        assert store.update_medical_context(conversation_id, store.get_medical_context(conversation_id))
+    assert _comparable_context(memory.get_conversation_summary(memory_id)["medical_context"]) == _comparable_context(
+        sqlite_store.get_conversation_summary(sqlite_id)["medical_context"]
+    )
+
+def test_trimming_matches(stores):
+    memory, sqlite_store = stores
+    for store in stores:
+        store.max_messages_per_conversation = 3
+    memory_id, sqlite_id = _fill(memory), _fill(sqlite_store)
+
+    assert _contents(memory.get_conversation_history(memory_id, 50)) == MESSAGES[-3:]
+    assert _contents(sqlite_store.get_conversation_history(sqlite_id, 50)) == MESSAGES[-3:]
+    assert memory.get_conversation_summary(memory_id)["message_count"] == 3
+    assert sqlite_store.get_conversation_summary(sqlite_id)["message_count"] == 3
+    # Trimmed messages no longer contribute to the medical context
+    assert _comparable_context(memory.get_medical_context(memory_id)) == _comparable_context(
+        sqlite_store.get_medical_context(sqlite_id)
+    )
+    assert "metformin" not in memory.get_medical_context(memory_id)["medications_mentioned"]
+
+def test_messages_after_cursor_matches(stores):
+    for store in stores:
+        conversation_id = _fill(store)
+        messages = store.get_messages_after(conversation_id, 0)
+        assert _contents(messages) == MESSAGES
+        seqs = [message.seq for message in messages]
+        assert seqs == sorted(seqs) and len(set(seqs)) == len(seqs)
+        assert _contents(store.get_messages_after(conversation_id, messages[2].seq)) == MESSAGES[3:]
+        assert store.get_messages_after(conversation_id, messages[-1].seq) == []
+        assert store.get_messages_after("missing", 0) == []
+
+def test_messages_in_the_same_clock_tick_are_not_skipped(stores):
+    for store in stores:
+        with mock.patch("time.time", return_value=1700000000.0):
+            conversation_id = _fill(store, MESSAGES[:1])
+            turns = ChatTurnCache(token_budget=10000)
+            turns.get_history(conversation_id, store)
+            for role, content, is_medical_query in MESSAGES[1:]:
+                store.add_message(conversation_id, role, content, "gemini", is_medical_query)
+            history = turns.get_history(conversation_id, store, pending_query=False)
+
+        texts = [text for turn in history for text in turn["parts"]]
+        assert [content for _, content, _ in MESSAGES[-6:]] == texts
+
+def test_context_summary_matches(stores):
+    for store in stores:
+        conversation_id = _fill(store)
+        assert store.get_context_summary(conversation_id) == (None, 0)
+        cursor = store.get_messages_after(conversation_id, 0)[3].seq
+        assert store.update_context_summary(conversation_id, "Discussed metformin.", cursor)
+        assert store.get_context_summary(conversation_id) == ("Discussed metformin.", cursor)
+        assert _contents(store.get_messages_after(conversation_id, cursor)) == MESSAGES[4:]
+        assert store.get_conversation(conversation_id).summary == "Discussed metformin."
+        assert not store.update_context_summary("missing", "x", 1)
+
+def test_listing_and_deletion_match(stores):
+    for store in stores:
+        first = _fill(store, MESSAGES[:2])
+        # Distinct update times, so the listing order is well defined
+        time.sleep(0.01)
+        second = _fill(store, MESSAGES[2:4])
+
+        listed = store.get_all_conversations()
+        assert [conversation["id"] for conversation in listed] == [second, first]
+        assert [conversation["title"] for conversation in listed] == [MESSAGES[2][1], MESSAGES[0][1]]
+
+        assert store.delete_conversation(first)
+        assert not store.delete_conversation(first)
+        assert store.get_conversation(first) is None
+        assert store.get_conversation_summary(first) == {}
+        assert store.get_medical_context(first) == {}
+        assert not store.add_message(first, "user", "hello", "gemini")
+        assert [conversation["id"] for conversation in store.get_all_conversations()] == [second]
+        assert store.get_stats()["conversations"] == 1
+        assert store.get_stats()["messages"] == 2
+
+def test_conversation_limit_matches(stores):
+    for store in stores:
+        store.max_conversations = 2
+        ids = []
+        for _ in range(3):
+            ids.append(_fill(store, MESSAGES[:1]))
+            time.sleep(0.01)
+        assert sorted(conversation["id"] for conversation in store.get_all_conversations()) == sorted(ids[1:])
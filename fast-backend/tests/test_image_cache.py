@@ -0,0 +1,55 @@
+"""
+Answers about an uploaded image are cached by the image content and the
+patient's own question, not by the upload's file name
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.main import app
+from app.services import gemini
+from app.services.response_cache import get_response_cache
+
+PNG_BYTES = b"\x89PNG\r\n\x1a\n" + b"\0" * 64
+
+class CountingRouter:
+    calls = 0
+
+    async def generate(self, contents, variant, system_instruction):
+        CountingRouter.calls += 1
+        return f"Answer {CountingRouter.calls}"
+
+@pytest.fixture
+def router(monkeypatch):
+    monkeypatch.setattr(settings, "CHAT_HISTORY_MODE", "prompt")
+    monkeypatch.setattr(settings, "RESPONSE_CACHE_ENABLED", True)
+    monkeypatch.setattr(settings, "IMAGE_PREPROCESS_ENABLED", False)
+    monkeypatch.setattr(gemini, "get_llm_router", CountingRouter)
+    CountingRouter.calls = 0
+    get_response_cache().clear()
+    yield CountingRouter
+    get_response_cache().clear()
+
+def _ask(client, image_bytes, filename):
+    return client.post(
+        "/api/chat",
+        data={"prompt": "What is this prescription for?"},
+        files={"image": (filename, image_bytes, "image/png")}
+    )
+
+def test_same_image_under_another_name_is_served_from_cache(router):
+    client = TestClient(app)
+    first = _ask(client, PNG_BYTES, "IMG_0001.png")
+    second = _ask(client, PNG_BYTES, "prescription.png")
+
+    assert first.status_code == second.status_code == 200
+    assert router.calls == 1
+    assert first.json()["response"] == second.json()["response"]
+
+def test_different_image_is_not_served_from_cache(router):
+    client = TestClient(app)
+    _ask(client, PNG_BYTES, "scan.png")
+    _ask(client, PNG_BYTES + b"\1", "scan.png")
+
+    assert router.calls == 2
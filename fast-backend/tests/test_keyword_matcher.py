@@ -0,0 +1,52 @@
+"""
+KeywordMatcher must match exactly what per-keyword substring checks match
+"""
+
+import random
+
+import pytest
+
+from app.utils.keyword_matcher import KeywordMatcher
+from app.utils.medical_prompts import MEDICAL_KEYWORD_MATCHER, extract_medical_features
+from benchmarks.corpus import make_queries
+
+def substring_matches(keywords, text):
+    """The semantics the matcher replaced: `keyword.lower() in text.lower()` per keyword"""
+    lowered = text.lower()
+    return frozenset(keyword.lower() for keyword in keywords if keyword and keyword.lower() in lowered)
+
+@pytest.mark.parametrize("keywords,text", [
+    (["pain", "chest pain"], "I have chest pain"),
+    (["heart", "heart disease", "disease"], "Family history of HEART DISEASE"),
+    (["a", "aa", "aaa"], "aaaa"),
+    (["ab", "bc", "abc"], "xabcx"),
+    (["side effect", "side effects", "effect"], "What are the side effects?"),
+    (["pill", "pills"], "two pil ls"),
+    (["dose"], ""),
+    ([], "anything"),
+    (["", "flu"], "influenza"),
+    (["c++", "(mg)", "a.b"], "dose (mg) of c++ in a.b and axb")
+])
+def test_matches_substring_semantics(keywords, text):
+    assert KeywordMatcher(keywords).scan(text) == substring_matches(keywords, text)
+
+def test_random_overlapping_vocabularies():
+    rng = random.Random(1234)
+    for _ in range(300):
+        keywords = ["".join(rng.choice("abc ") for _ in range(rng.randint(1, 5))) for _ in range(rng.randint(1, 12))]
+        text = "".join(rng.choice("abcAB ") for _ in range(rng.randint(0, 40)))
+        assert KeywordMatcher(keywords).scan(text) == substring_matches(keywords, text), (keywords, text)
+
+def test_medical_vocabulary_on_the_query_corpus():
+    keywords = MEDICAL_KEYWORD_MATCHER.keywords
+    for query in make_queries(500, 1234):
+        assert extract_medical_features(query) == substring_matches(keywords, query), query
+
+def test_medical_vocabulary_inside_longer_words():
+    keywords = MEDICAL_KEYWORD_MATCHER.keywords
+    rng = random.Random(99)
+    vocabulary = sorted(keywords)
+    for _ in range(200):
+        # Keywords glued together and into other words overlap in every way
+        text = "".join(rng.choice(vocabulary) + rng.choice(["", " ", "s", "x"]) for _ in range(rng.randint(1, 6)))
+        assert MEDICAL_KEYWORD_MATCHER.scan(text.upper()) == substring_matches(keywords, text), text
@@ -0,0 +1,58 @@
+"""
+Follow-up turns are scheduled by the patient's own query, not by the
+conversation context the prompt is wrapped in
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.main import app
+from app.services import gemini
+from app.services.conversation_memory import get_conversation_memory
+
+EMERGENCY_REPLY = "Chest pain can be a heart attack; call emergency services if it is severe."
+FOLLOW_UP = "is it good for weight loss?"
+
+class RecordingScheduler:
+    def __init__(self):
+        self.classes = []
+
+    async def acquire(self, query_class: str):
+        self.classes.append(query_class)
+
+    def release(self):
+        pass
+
+class StubRouter:
+    async def generate(self, contents, variant, system_instruction):
+        return "Walking daily helps."
+
+    async def stream(self, contents, variant, system_instruction):
+        yield "Walking daily helps."
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    scheduler = RecordingScheduler()
+    monkeypatch.setattr(settings, "PRIORITY_SCHEDULER_ENABLED", True)
+    monkeypatch.setattr(settings, "CHAT_HISTORY_MODE", "prompt")
+    monkeypatch.setattr(gemini, "get_priority_scheduler", lambda: scheduler)
+    monkeypatch.setattr(gemini, "get_llm_router", StubRouter)
+    return scheduler
+
+def test_wrapped_follow_up_classifies_as_its_context():
+    assert gemini.get_query_class(FOLLOW_UP, False) == "general_health"
+    assert gemini.get_query_class(f"{EMERGENCY_REPLY}\n\n{FOLLOW_UP}", False) == "emergency"
+
+@pytest.mark.parametrize("path", ["/api/chat", "/api/chat/stream"])
+def test_follow_up_turn_keeps_its_own_class(scheduler, path):
+    memory = get_conversation_memory()
+    conversation_id = memory.create_conversation(title="Chest pain")
+    memory.add_message(conversation_id, "user", "I have chest pain", "gemini", True)
+    memory.add_message(conversation_id, "assistant", EMERGENCY_REPLY, "gemini", True)
+
+    response = TestClient(app).post(path, data={"prompt": FOLLOW_UP, "conversation_id": conversation_id})
+
+    assert response.status_code == 200
+    assert scheduler.classes == ["general_health"]
+    memory.delete_conversation(conversation_id)
@@ -0,0 +1,108 @@
+"""
+Single-flight coalescing and cancellation
+"""
+
+import asyncio
+
+import pytest
+
+from app.services.single_flight import SingleFlight
+
+class Upstream:
+    """A call that blocks until released, counting starts and cancellations"""
+
+    def __init__(self):
+        self.started = 0
+        self.cancelled = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.started += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return "answer"
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+def test_concurrent_callers_share_one_call():
+    async def scenario():
+        flight, upstream = SingleFlight(), Upstream()
+        callers = [asyncio.ensure_future(flight.do("key", upstream)) for _ in range(5)]
+        await asyncio.sleep(0)
+        upstream.release.set()
+        assert await asyncio.gather(*callers) == ["answer"] * 5
+        assert upstream.started == 1
+        assert flight.get_stats()["saved_calls"] == 4
+        assert flight.get_stats()["in_flight"] == 0
+    run(scenario())
+
+def test_cancelled_caller_leaves_the_shared_call_running():
+    async def scenario():
+        flight, upstream = SingleFlight(), Upstream()
+        first = asyncio.ensure_future(flight.do("key", upstream))
+        second = asyncio.ensure_future(flight.do("key", upstream))
+        await asyncio.sleep(0)
+
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        upstream.release.set()
+        assert await second == "answer"
+        assert upstream.cancelled == 0
+    run(scenario())
+
+def test_call_is_cancelled_when_every_caller_is():
+    async def scenario():
+        flight, upstream = SingleFlight(), Upstream()
+        callers = [asyncio.ensure_future(flight.do("key", upstream)) for _ in range(3)]
+        await asyncio.sleep(0)
+
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0)
+        assert upstream.cancelled == 1
+        assert flight.get_stats()["in_flight"] == 0
+
+        # A later caller starts a fresh call rather than joining the cancelled one
+        later = asyncio.ensure_future(flight.do("key", upstream))
+        await asyncio.sleep(0)
+        upstream.release.set()
+        assert await later == "answer"
+        assert upstream.started == 2
+    run(scenario())
+
+def test_failure_is_shared_and_forgotten():
+    async def scenario():
+        flight = SingleFlight()
+        calls = 0
+
+        async def failing():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0)
+            raise RuntimeError("upstream down")
+
+        results = await asyncio.gather(
+            flight.do("key", failing), flight.do("key", failing), return_exceptions=True
+        )
+        assert [str(result) for result in results] == ["upstream down"] * 2
+        assert calls == 1
+        with pytest.raises(RuntimeError):
+            await flight.do("key", failing)
+        assert calls == 2
+    run(scenario())
+
+def test_different_keys_do_not_coalesce():
+    async def scenario():
+        flight, upstream = SingleFlight(), Upstream()
+        callers = [asyncio.ensure_future(flight.do(key, upstream)) for key in ("a", "b")]
+        await asyncio.sleep(0)
+        upstream.release.set()
+        await asyncio.gather(*callers)
+        assert upstream.started == 2
+    run(scenario())
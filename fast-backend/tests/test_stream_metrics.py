@@ -0,0 +1,54 @@
+"""
+Streamed answers are timed and their failures counted like buffered ones
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.main import app
+from app.services import gemini
+from app.services.metrics import STAGE_DURATION, UPSTREAM_ERRORS
+
+PROMPT = "How much water should I drink?"
+
+class StreamingRouter:
+    async def stream(self, contents, variant, system_instruction):
+        yield "About eight "
+        yield "glasses a day."
+
+class FailingRouter:
+    async def stream(self, contents, variant, system_instruction):
+        yield "Partial"
+        raise RuntimeError("upstream reset")
+
+@pytest.fixture(autouse=True)
+def uncached(monkeypatch):
+    monkeypatch.setattr(settings, "RESPONSE_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "PRIORITY_SCHEDULER_ENABLED", False)
+
+def _upstream_observations() -> int:
+    return sum(STAGE_DURATION.labels("upstream_llm").counts)
+
+def test_stream_records_the_upstream_stage(monkeypatch):
+    monkeypatch.setattr(gemini, "get_llm_router", StreamingRouter)
+    errors = UPSTREAM_ERRORS.labels("general_health")
+    observed, failed = _upstream_observations(), errors.value
+
+    response = TestClient(app).post("/api/chat/stream", data={"prompt": PROMPT})
+
+    assert response.status_code == 200
+    assert "glasses a day." in response.text
+    assert _upstream_observations() == observed + 1
+    assert errors.value == failed
+
+def test_failed_stream_is_counted_under_its_class(monkeypatch):
+    monkeypatch.setattr(gemini, "get_llm_router", FailingRouter)
+    errors = UPSTREAM_ERRORS.labels("general_health")
+    failed = errors.value
+
+    response = TestClient(app).post("/api/chat/stream", data={"prompt": PROMPT})
+
+    assert response.status_code == 200
+    assert "event: error" in response.text
+    assert errors.value == failed + 1